@@ -0,0 +1,161 @@
+"""
+Answer cache in front of the LLM call
+
+Entries are keyed by the normalized question, the retrieved chunk IDs, the
+model name and the profile data version, and evicted by LRU plus TTL. An
+in-process tier answers repeat questions without any I/O; an optional Redis
+tier shares answers between workers. Near-duplicate questions ("what are
+your skills?" vs "what skills do you have") can reuse an answer when their
+query embeddings are similar enough and they retrieved the same chunks.
+
+The data version is the twin's content version: a profile reload builds a
+new cache under the new version (see twin_registry.load_twin), so answers
+never outlive the data they were generated from, in either tier.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from async_utils import run_blocking
+from local_vectors import HashingVectorizer
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity for near-duplicate matches; 0 disables them
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.85"))
+REDIS_PREFIX = "digital_twin:answers"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+class AnswerCache:
+    """Two-tier (in-process LRU + optional Redis) cache of generated answers."""
+
+    def __init__(
+        self,
+        data_version: str = "",
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+        redis_client=None
+    ):
+        self.data_version = data_version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.redis_client = redis_client
+        self._vectorizer = HashingVectorizer(dim=512)
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[np.ndarray], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0}
+
+    def _bucket(self, chunk_ids: Sequence[str], model: str) -> str:
+        return f"{self.data_version}|{model}|{','.join(chunk_ids)}"
+
+    def _key(self, question: str, chunk_ids: Sequence[str], model: str) -> str:
+        raw = f"{self._bucket(chunk_ids, model)}|{normalize_question(question)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.similarity_threshold <= 0:
+            return None
+        return self._vectorizer.transform([normalize_question(question)])[0]
+
+    def _get_local(self, key: str, bucket: str, question: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[3]
+                del self._entries[key]
+
+            if self.similarity_threshold <= 0:
+                return None
+            vector = self._embed(question)
+            best_key, best_score = None, self.similarity_threshold
+            for other_key, (expires_at, other_bucket, other_vector, _) in self._entries.items():
+                if other_bucket != bucket or other_vector is None or expires_at <= now:
+                    continue
+                score = float(vector @ other_vector)
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.stats["near_hits"] += 1
+                return self._entries[best_key][3]
+        return None
+
+    def _set_local(self, key: str, bucket: str, question: str, value: Dict[str, Any]) -> None:
+        vector = self._embed(question)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, bucket, vector, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get(self, question: str, chunk_ids: Sequence[str], model: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached answer, checking the local tier then Redis."""
+        key = self._key(question, chunk_ids, model)
+        bucket = self._bucket(chunk_ids, model)
+        value = self._get_local(key, bucket, question)
+        if value is not None:
+            return value
+
+        if self.redis_client is not None:
+            try:
+                raw = self.redis_client.get(f"{REDIS_PREFIX}:{key}")
+            except Exception as e:
+                print(f"⚠️  Answer cache Redis lookup failed: {str(e)}")
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                self._set_local(key, bucket, question, value)
+                self.stats["redis_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, question: str, chunk_ids: Sequence[str], model: str, value: Dict[str, Any]) -> None:
+        """Store an answer in both tiers."""
+        key = self._key(question, chunk_ids, model)
+        self._set_local(key, self._bucket(chunk_ids, model), question, value)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(f"{REDIS_PREFIX}:{key}", json.dumps(value), ex=max(1, int(self.ttl)))
+            except Exception as e:
+                print(f"⚠️  Answer cache Redis write failed: {str(e)}")
+
+    async def get_async(self, question: str, chunk_ids: Sequence[str], model: str) -> Optional[Dict[str, Any]]:
+        """get() for async handlers; Redis I/O runs on the blocking pool."""
+        if self.redis_client is None:
+            return self.get(question, chunk_ids, model)
+        return await run_blocking(self.get, question, chunk_ids, model)
+
+    async def set_async(self, question: str, chunk_ids: Sequence[str], model: str, value: Dict[str, Any]) -> None:
+        """set() for async handlers; Redis I/O runs on the blocking pool."""
+        if self.redis_client is None:
+            self.set(question, chunk_ids, model, value)
+        else:
+            await run_blocking(self.set, question, chunk_ids, model, value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,83 @@
+"""
+Async helpers shared by the MCP and REST servers
+
+Blocking calls (sync SDKs, CPU-bound retrieval over large indexes) are
+offloaded to one bounded thread pool so they never stall the event loop,
+and every pipeline stage runs under its own timeout.
+"""
+
+import os
+import json
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Per-stage timeouts in seconds
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "5"))
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "30"))
+
+# Upper bound on threads used for blocking calls
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "8"))
+
+_blocking_pool: Optional[ThreadPoolExecutor] = None
+
+
+class StageTimeoutError(Exception):
+    """Raised when a pipeline stage exceeds its time budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout:.1f}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _blocking_pool
+    if _blocking_pool is None:
+        _blocking_pool = ThreadPoolExecutor(
+            max_workers=BLOCKING_POOL_SIZE,
+            thread_name_prefix="digitaltwin-blocking"
+        )
+    return _blocking_pool
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking function on the bounded thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), functools.partial(func, *args, **kwargs))
+
+
+async def with_timeout(awaitable: Awaitable[T], timeout: float, stage: str) -> T:
+    """Await a stage, converting asyncio timeouts into StageTimeoutError."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError(stage, timeout) from None
+
+
+async def iterate_with_timeout(items: AsyncIterable[T], timeout: float, stage: str) -> AsyncIterator[T]:
+    """Iterate an async stream, bounding the wait for each item.
+
+    The underlying stream is closed when iteration stops early (timeout,
+    error or the consumer going away).
+    """
+    iterator = items.__aiter__()
+    try:
+        while True:
+            try:
+                item = await with_timeout(iterator.__anext__(), timeout, stage)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
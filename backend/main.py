@@ -1,13 +1,52 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import os
+import sys
 from dotenv import load_dotenv
-from upstash_vector import Index
-from groq import Groq
 import json
 
+# Shared retrieval modules live in the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from async_utils import (
+    with_timeout,
+    iterate_with_timeout,
+    sse_event,
+    StageTimeoutError,
+    RETRIEVAL_TIMEOUT,
+    GENERATION_TIMEOUT
+)
+from context_packer import pack_context
+import clients
+from telemetry import (
+    span,
+    record_context,
+    render_metrics,
+    register_cache_metrics,
+    register_callback,
+    register_gateway_metrics,
+    CachedProbe,
+    TracingMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    RETRIEVED_CHUNKS
+)
+from retrieval import load_local_dense, RETRIEVAL_MODE, MAX_TOP_K
+from retrieval_cache import RETRIEVAL_CACHE_REDIS_URL
+from twin_registry import (
+    DEFAULT_TWIN_ID,
+    NamespacedIndex,
+    Twin,
+    TwinRegistry,
+    UnknownTwinError,
+    discover_profiles,
+    load_twin,
+    twin_namespace
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -21,30 +60,112 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware, service="api")
 
 # Constants
 JSON_FILE = "digitaltwin.json"
 DEFAULT_MODEL = "llama-3.1-8b-instant"
+SYSTEM_PROMPT = "You are an AI digital twin. Answer questions as if you are the person, speaking in first person about your background, skills, and experience."
+DEFAULT_TOP_K = 3
+# "upstash" (hosted embedding + search) or "local" (NumPy vector store)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "upstash").lower()
+# Lexical mode never queries a vector index, hosted or local
+USE_HOSTED_VECTORS = RETRIEVAL_MODE != "lexical" and RETRIEVAL_BACKEND != "local"
 
-# Initialize Groq client
+# Shared Groq client behind the gateway (single-flight, RPM/TPM limits, 429 retries)
 groq_client = None
 try:
-    groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-    print("✅ Groq client initialized successfully!")
+    groq_client = clients.get_async_groq()
+    if groq_client:
+        print("✅ Groq client initialized successfully!")
 except Exception as e:
     print(f"❌ Error initializing Groq client: {str(e)}")
 
-# Initialize Upstash Vector
+# Connect to the hosted vector index (the local store is loaded per twin)
 vector_index = None
+if USE_HOSTED_VECTORS:
+    try:
+        vector_index = clients.get_async_vector_index()
+        print("✅ Connected to Upstash Vector successfully!")
+    except Exception as e:
+        print(f"❌ Error connecting to Upstash Vector: {str(e)}")
+
+# Answer caches are invalidated when a twin's profile data changes
+answer_cache_redis = None
+if os.getenv("ANSWER_CACHE_REDIS_URL"):
+    try:
+        answer_cache_redis = clients.get_redis(os.getenv("ANSWER_CACHE_REDIS_URL"))
+    except Exception as e:
+        print(f"⚠️  Answer cache Redis tier disabled: {str(e)}")
+
+# Query embeddings / ranked results, shared across workers when a Redis URL is set
+retrieval_cache_redis = None
+if RETRIEVAL_CACHE_REDIS_URL:
+    try:
+        retrieval_cache_redis = clients.get_redis(RETRIEVAL_CACHE_REDIS_URL)
+    except Exception as e:
+        print(f"⚠️  Retrieval cache Redis tier disabled: {str(e)}")
+
+def dense_index_for(twin_id: str, path: str):
+    """The twin's vector index: its Upstash namespace, or its local vector store"""
+    if RETRIEVAL_BACKEND == "local":
+        store = load_local_dense(path)
+        print(f"✅ Loaded local vector store for twin {twin_id} ({len(store.ids)} vectors)")
+        return store
+    if vector_index is None:
+        return None
+    # Namespaces are named by embed_profile.py
+    return NamespacedIndex(vector_index, twin_namespace(twin_id))
+
+def _load_twin(twin_id: str, path: str) -> Twin:
+    return load_twin(
+        twin_id, path,
+        dense_factory=dense_index_for,
+        cache_redis=answer_cache_redis,
+        retrieval_redis=retrieval_cache_redis,
+        # Written by `python precomputed_answers.py --pipeline api`
+        answers_pipeline="api",
+        answers_model=DEFAULT_MODEL
+    )
+
+# Retrieval per twin: BM25 over the profile chunks fused with its vector index
+# (RETRIEVAL_MODE=hybrid, the default). RETRIEVAL_MODE=dense is vector search
+# only, as /api/query used to be; lexical skips the vector index.
+# Every digitaltwin*.json in the project root (plus TWIN_PROFILES) is served,
+# selected by "twin_id" on the query; the default twin is loaded up front
+profiles = discover_profiles(PROJECT_ROOT)
+profiles.setdefault(DEFAULT_TWIN_ID, os.path.join(PROJECT_ROOT, JSON_FILE))
+twins = TwinRegistry(profiles, loader=_load_twin)
 try:
-    vector_index = Index.from_env()
-    print("✅ Connected to Upstash Vector successfully!")
+    default_twin = twins.load(DEFAULT_TWIN_ID)
+    print(f"✅ Retrieval pipeline ready ({RETRIEVAL_MODE}, {len(default_twin.chunks)} chunks)")
 except Exception as e:
-    print(f"❌ Error connecting to Upstash Vector: {str(e)}")
+    print(f"❌ Error building retrieval pipeline: {str(e)}")
+
+# Prometheus metrics and cached connectivity state for /metrics and /api/health
+register_cache_metrics(lambda: twins.cache_stats("answer_cache"))
+register_cache_metrics(lambda: twins.cache_stats("retrieval_cache"), prefix="digitaltwin_retrieval_cache")
+register_cache_metrics(lambda: twins.cache_stats("precomputed"), prefix="digitaltwin_precomputed_answers")
+register_gateway_metrics(lambda: groq_client)
+register_callback("digitaltwin_indexed_chunks", "Profile chunks in the search index (loaded twins)",
+                  twins.indexed_chunks)
+register_callback("digitaltwin_twins_loaded", "Twins currently loaded in memory", lambda: len(twins.loaded()))
+register_callback("digitaltwin_twin_events_total", "Twin loads, reloads and evictions",
+                  lambda: dict(twins.stats), kind="counter", label="event")
+# Only the hosted index needs a connectivity check; the local store is in-process
+vector_probe = (
+    CachedProbe("vector_db", vector_index.info, on_failure=clients.async_vector_index.report_failure)
+    if vector_index is not None else None
+)
 
 class QueryRequest(BaseModel):
     question: str
-    top_k: int = 3
+    top_k: int = Field(DEFAULT_TOP_K, ge=1, le=MAX_TOP_K)
+    # Optional filters on chunk type / metadata.category
+    types: Optional[List[str]] = None
+    categories: Optional[List[str]] = None
+    # Which profile to answer as (see /api/twins); the default twin when omitted
+    twin_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
     answer: str
@@ -52,64 +173,186 @@ class QueryResponse(BaseModel):
 
 @app.get("/api/health")
 async def health_check():
+    # Connectivity comes from the cached probe, not a round trip per request
+    vector_status = await vector_probe.status() if vector_probe else {"connected": bool(vector_index)}
     return {
         "status": "ok",
         "services": {
             "groq": bool(groq_client),
-            "vector_db": bool(vector_index)
-        }
+            "vector_db": bool(vector_status["connected"]),
+            "retrieval_backend": RETRIEVAL_BACKEND,
+            "retrieval_mode": RETRIEVAL_MODE
+        },
+        "checks": {"vector_db": vector_status},
+        "twins": {"available": sorted(twins.profiles), "loaded": twins.loaded(), **twins.stats},
+        "llm_gateway": groq_client.metrics() if groq_client else None
     }
 
-def query_vectors(index: Index, query_text: str, top_k: int = 3):
-    """Query Upstash Vector for similar vectors"""
-    if not index:
-        raise HTTPException(status_code=500, detail="Vector database not initialized")
-    
+@app.get("/api/twins")
+async def list_twins():
+    """Twins that can be queried, and which are currently loaded"""
+    loaded = set(twins.loaded())
+    return {
+        "default": DEFAULT_TWIN_ID,
+        "twins": [{"twin_id": twin_id, "loaded": twin_id in loaded} for twin_id in sorted(twins.profiles)]
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, cache hit rates, chunk and token counts"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+async def get_twin(request: QueryRequest) -> Twin:
+    """The twin named by the request, loaded (or reloaded) on demand"""
     try:
-        results = index.query(
-            data=query_text,
-            top_k=top_k,
-            include_metadata=True
-        )
+        return await twins.get(request.twin_id)
+    except UnknownTwinError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading twin: {str(e)}")
+
+async def retrieve_chunks(twin: Twin, request: QueryRequest):
+    """Run the twin's hybrid (keyword + vector) retrieval pipeline"""
+    try:
+        with span("retrieve"):
+            results = await with_timeout(
+                twin.retriever.search(request.question, request.top_k, request.types, request.categories),
+                RETRIEVAL_TIMEOUT,
+                "retrieval"
+            )
+        RETRIEVED_CHUNKS.observe(len(results))
         return results
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying vectors: {str(e)}")
 
-def generate_response_with_groq(prompt: str, model: str = DEFAULT_MODEL):
+def precomputed_answer(twin: Twin, request: QueryRequest) -> Optional[Dict[str, Any]]:
+    """The warm-up job's answer, for a question asked with the default retrieval settings"""
+    if twin.precomputed is None or (request.top_k, request.types, request.categories) != (DEFAULT_TOP_K, None, None):
+        return None
+    return twin.precomputed.get(request.question)
+
+def build_messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+async def generate_response_with_groq(prompt: str, model: str = DEFAULT_MODEL):
     """Generate response using Groq"""
     if not groq_client:
         raise HTTPException(status_code=500, detail="Groq client not initialized")
     
     try:
-        completion = groq_client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an AI digital twin. Answer questions as if you are the person, speaking in first person about your background, skills, and experience."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=500
+        completion = await with_timeout(
+            groq_client.chat.completions.create(
+                model=model,
+                messages=build_messages(prompt),
+                temperature=0.7,
+                max_tokens=500
+            ),
+            GENERATION_TIMEOUT,
+            "generation"
         )
         
         return completion.choices[0].message.content.strip()
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+async def stream_response_with_groq(prompt: str, model: str = DEFAULT_MODEL):
+    """Stream response tokens from Groq as they are generated"""
+    if not groq_client:
+        raise HTTPException(status_code=500, detail="Groq client not initialized")
+    
+    stream = await with_timeout(
+        groq_client.chat.completions.create(
+            model=model,
+            messages=build_messages(prompt),
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        ),
+        GENERATION_TIMEOUT,
+        "generation"
+    )
+    async for chunk in iterate_with_timeout(stream, GENERATION_TIMEOUT, "generation"):
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if token:
+            yield token
+
+def extract_sources(results):
+    """Split retrieved chunks into response sources and prompt documents"""
+    sources = []
+    top_docs = []
+    
+    for result in results or []:
+        chunk = result["metadata"] or {}
+        title = chunk.get('title', 'Information')
+        content = chunk.get('content', '')
+        score = result["score"]
+        
+        sources.append({
+            "title": title,
+            "content": content,
+            "score": score,
+            "type": chunk.get('type', ''),
+            "category": (chunk.get('metadata', {}) or {}).get('category', '')
+        })
+        
+        if content:
+            top_docs.append(f"{title}: {content}")
+    
+    return sources, top_docs
+
+async def generate_answer(question: str, results) -> str:
+    """Pack the retrieved chunks into the model's context budget and generate an answer"""
+    with span("prompt_assembly"):
+        packed = pack_context(question, results, DEFAULT_MODEL)
+        prompt = build_prompt(packed.documents, question)
+    record_context(packed)
+    with span("generate"):
+        return await generate_response_with_groq(prompt)
+
+async def precompute_answer(twin: Twin, question: str, results):
+    """Answer and sources for the warm-up job (precomputed_answers.py), bypassing the caches"""
+    sources, top_docs = extract_sources(results)
+    if not top_docs:
+        return None, sources
+    return await generate_answer(question, results), sources
+
+def build_prompt(top_docs: List[str], question: str) -> str:
+    context = "\n\n".join(top_docs)
+    return f"""Based on the following information about yourself, answer the question.
+Speak in first person as if you are describing your own background.
+
+Your Information:
+{context}
+
+Question: {question}
+
+Provide a helpful, professional response:"""
+
 @app.post("/api/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process RAG query"""
-    if not vector_index:
-        raise HTTPException(status_code=500, detail="Vector database not initialized")
-    
     try:
-        # Step 1: Query vector database
-        results = query_vectors(vector_index, request.question, request.top_k)
+        # Step 1: Answer warmed-up questions from the precomputed store
+        twin = await get_twin(request)
+        precomputed = precomputed_answer(twin, request)
+        if precomputed is not None:
+            return QueryResponse(answer=precomputed["answer"], sources=precomputed["sources"])
+        
+        # Step 2: Retrieve relevant chunks from the requested twin
+        results = await retrieve_chunks(twin, request)
         
         if not results or len(results) == 0:
             return QueryResponse(
@@ -117,26 +360,8 @@ async def process_query(request: QueryRequest):
                 sources=[]
             )
         
-        # Step 2: Extract relevant content
-        sources = []
-        top_docs = []
-        
-        for result in results:
-            metadata = result.metadata or {}
-            title = metadata.get('title', 'Information')
-            content = metadata.get('content', '')
-            score = result.score
-            
-            sources.append({
-                "title": title,
-                "content": content,
-                "score": score,
-                "type": metadata.get('type', ''),
-                "category": metadata.get('category', '')
-            })
-            
-            if content:
-                top_docs.append(f"{title}: {content}")
+        # Step 3: Extract relevant content
+        sources, top_docs = extract_sources(results)
         
         if not top_docs:
             return QueryResponse(
@@ -144,19 +369,16 @@ async def process_query(request: QueryRequest):
                 sources=[]
             )
         
-        # Step 3: Generate response with context
-        context = "\n\n".join(top_docs)
-        prompt = f"""Based on the following information about yourself, answer the question.
-Speak in first person as if you are describing your own background.
-
-Your Information:
-{context}
-
-Question: {request.question}
-
-Provide a helpful, professional response:"""
+        # Step 4: Serve repeat questions from the cache
+        chunk_ids = [result["id"] for result in results]
+        cached = await twin.answer_cache.get_async(request.question, chunk_ids, DEFAULT_MODEL)
+        if cached is not None:
+            return QueryResponse(answer=cached["answer"], sources=sources)
         
-        answer = generate_response_with_groq(prompt)
+        # Step 5: Generate response with context trimmed to the model's budget
+        answer = await generate_answer(request.question, results)
+        if answer:
+            await twin.answer_cache.set_async(request.question, chunk_ids, DEFAULT_MODEL, {"answer": answer})
         
         return QueryResponse(
             answer=answer,
@@ -168,6 +390,68 @@ Provide a helpful, professional response:"""
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """Process RAG query, streaming Server-Sent Events.
+
+    Emits one "sources" event as soon as retrieval finishes, then a "token"
+    event per generated token, then "done" (or "error").
+    """
+    # Unknown twins and retrieval errors still surface as normal HTTP errors
+    twin = await get_twin(request)
+    precomputed = precomputed_answer(twin, request)
+    if precomputed is not None:
+        async def precomputed_events():
+            yield sse_event("sources", {"sources": precomputed["sources"]})
+            yield sse_event("token", {"text": precomputed["answer"]})
+            yield sse_event("done", {})
+        return sse_response(precomputed_events())
+    results = await retrieve_chunks(twin, request)
+    sources, top_docs = extract_sources(results)
+    chunk_ids = [result["id"] for result in results]
+    
+    async def events():
+        yield sse_event("sources", {"sources": sources if top_docs else []})
+        if not top_docs:
+            yield sse_event("token", {"text": "I don't have specific information about that topic."})
+            yield sse_event("done", {})
+            return
+        cached = await twin.answer_cache.get_async(request.question, chunk_ids, DEFAULT_MODEL)
+        if cached is not None:
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {})
+            return
+        with span("prompt_assembly"):
+            packed = pack_context(request.question, results, DEFAULT_MODEL)
+            prompt = build_prompt(packed.documents, request.question)
+        record_context(packed)
+        tokens = []
+        try:
+            with span("generate"):
+                async for token in stream_response_with_groq(prompt):
+                    tokens.append(token)
+                    yield sse_event("token", {"text": token})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+            return
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error generating response: {str(e)}"})
+            return
+        # Only a stream that finished with text is worth replaying
+        answer = "".join(tokens).strip()
+        if answer:
+            await twin.answer_cache.set_async(request.question, chunk_ids, DEFAULT_MODEL, {"answer": answer})
+        yield sse_event("done", {})
+    
+    return sse_response(events())
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,311 @@
+"""
+Retrieval and end-to-end latency benchmark for the Digital Twin
+
+Replays the golden query set (golden_queries.json) against every retrieval
+backend for the bundled profiles, plus synthetic profiles scaled to any
+number of chunks, and reports p50/p95/p99 latency, QPS, index memory and
+recall@k, plus the memory held by each corpus's chunks as parsed JSON dicts
+versus packed into a ChunkStore. Redis and Groq are replaced by the offline stand-ins in
+offline_stubs.py, so the benchmark runs without network access or keys.
+
+    python benchmark.py
+    python benchmark.py --sizes 10000 100000 --queries 500 --json bench.json
+    python benchmark.py --chunks dicts    # backends over plain chunk dicts
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from typing import List, Dict, Any, Callable, Optional, Sequence
+
+import digitaltwin_rag
+from bm25_index import BM25Index
+from chunk_store import ChunkStore
+from context_packer import pack_context
+from local_vectors import LocalVectorStore
+from reranker import Reranker
+from retrieval import HybridRetriever
+from offline_stubs import FakeRedis, StubAsyncGroq
+
+PROFILES = ["digitaltwin.json", "digitaltwin_cedric.json", "digitaltwin_backup.json"]
+GOLDEN_FILE = "golden_queries.json"
+DEFAULT_TOP_K = 3
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: Sequence[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds plus sequential QPS."""
+    total = sum(latencies)
+    return {
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p95_ms": percentile(latencies, 95) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "qps": len(latencies) / total if total else 0.0,
+    }
+
+
+def recall_at_k(retrieved: Sequence[str], expected: Sequence[str], k: int) -> float:
+    """Fraction of expected IDs found in the top k (capped at k expected)."""
+    if not expected:
+        return 0.0
+    hits = len(set(retrieved[:k]) & set(expected))
+    return hits / min(len(expected), k)
+
+
+def load_golden(path: str = GOLDEN_FILE) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)["queries"]
+
+
+def load_chunks(path: str) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)["content_chunks"]
+
+
+def synthetic_chunks(base: Sequence[Dict[str, Any]], count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Scale a profile to `count` chunks by remixing its vocabulary.
+
+    Each synthetic chunk mixes words from the real chunks with a few unique
+    terms, so the vocabulary and postings grow with the corpus size.
+    """
+    rng = random.Random(seed)
+    words = [w for c in base for w in f"{c.get('title', '')} {c.get('content', '')}".split()]
+    types = sorted({c.get('type', '') for c in base})
+    categories = sorted({c.get('metadata', {}).get('category', '') for c in base})
+    chunks = []
+    for i in range(count):
+        body = rng.choices(words, k=60) + [f"term{rng.randrange(count)}" for _ in range(3)]
+        chunks.append({
+            "id": f"synthetic_{i}",
+            "title": " ".join(rng.choices(words, k=4)),
+            "content": " ".join(body),
+            "type": types[i % len(types)],
+            "metadata": {"category": categories[i % len(categories)], "tags": rng.choices(words, k=2)}
+        })
+    return chunks
+
+
+def chunk_memory(chunks: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    """MB held by the chunks as parsed JSON dicts, and packed into a ChunkStore."""
+    raw = json.dumps(list(chunks))
+    tracemalloc.start()
+    as_dicts = json.loads(raw)
+    dicts_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    del as_dicts
+
+    tracemalloc.start()
+    store = ChunkStore(json.loads(raw))
+    store_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    del store
+    return {"chunk_dicts_mb": dicts_mb, "chunk_store_mb": store_mb}
+
+
+# ---------------------------------------------------------------------------
+# Backends: each builder returns search(query, k) -> ranked chunk IDs
+# ---------------------------------------------------------------------------
+
+def build_search_redis(chunks: Sequence[Dict[str, Any]], context: Dict[str, Any]) -> Callable[[str, int], List[str]]:
+    """digitaltwin_rag.search_redis over its in-memory BM25 index."""
+    redis_client = context["redis"]
+    digitaltwin_rag.build_search_index(chunks)
+    return lambda q, k: [r["id"] for r in digitaltwin_rag.search_redis(redis_client, q, k)]
+
+
+def build_vector(chunks: Sequence[Dict[str, Any]], context: Dict[str, Any]) -> Callable[[str, int], List[str]]:
+    """Local NumPy vector store (the offline vector path of backend/main.py)."""
+    store = LocalVectorStore.from_chunks(chunks)
+    context["vector_store"] = store
+    return lambda q, k: [r.id for r in store.query(q, k)]
+
+
+def build_hybrid(chunks: Sequence[Dict[str, Any]], context: Dict[str, Any]) -> Callable[[str, int], List[str]]:
+    """HybridRetriever: BM25 + local vectors fused with RRF."""
+    store = context.get("vector_store") or LocalVectorStore.from_chunks(chunks)
+    retriever = HybridRetriever(chunks, BM25Index.from_chunks(chunks), store)
+    context["retriever"] = retriever
+    loop = context["loop"]
+    return lambda q, k: [r["id"] for r in loop.run_until_complete(retriever.search(q, k))]
+
+
+def build_rerank(chunks: Sequence[Dict[str, Any]], context: Dict[str, Any]) -> Callable[[str, int], List[str]]:
+    """HybridRetriever with the CPU reranker over over-fetched candidates."""
+    store = context.get("vector_store") or LocalVectorStore.from_chunks(chunks)
+    retriever = HybridRetriever(chunks, BM25Index.from_chunks(chunks), store, reranker=Reranker())
+    loop = context["loop"]
+    return lambda q, k: [r["id"] for r in loop.run_until_complete(retriever.search(q, k))]
+
+
+def build_end_to_end(chunks: Sequence[Dict[str, Any]], context: Dict[str, Any]) -> Callable[[str, int], List[str]]:
+    """Hybrid retrieval, context packing and a stub LLM completion."""
+    retriever = context.get("retriever") or HybridRetriever(
+        chunks, BM25Index.from_chunks(chunks), LocalVectorStore.from_chunks(chunks)
+    )
+    llm = StubAsyncGroq(latency=context["llm_latency"])
+    loop = context["loop"]
+
+    async def answer(q: str, k: int) -> List[str]:
+        results = await retriever.search(q, k)
+        prompt_context = pack_context(q, results, digitaltwin_rag.GROQ_MODEL, log=False).text
+        await digitaltwin_rag.generate_response_async(llm, q, prompt_context)
+        return [r["id"] for r in results]
+
+    return lambda q, k: loop.run_until_complete(answer(q, k))
+
+
+BACKENDS = {
+    "search_redis": build_search_redis,
+    "vector": build_vector,
+    "hybrid": build_hybrid,
+    "rerank": build_rerank,
+    "e2e": build_end_to_end,
+}
+
+
+def run_backend(
+    name: str,
+    builder: Callable,
+    chunks: Sequence[Dict[str, Any]],
+    queries: Sequence[Dict[str, Any]],
+    context: Dict[str, Any],
+    top_k: int,
+    replay: int
+) -> Dict[str, Any]:
+    """Build one backend under tracemalloc, then replay queries through it."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    search = builder(chunks, context)
+    build_s = time.perf_counter() - start
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+
+    search(queries[0]["query"], top_k)  # warm-up
+
+    latencies = []
+    recalls = []
+    for i in range(max(replay, len(queries))):
+        item = queries[i % len(queries)]
+        start = time.perf_counter()
+        ids = search(item["query"], top_k)
+        latencies.append(time.perf_counter() - start)
+        if i < len(queries) and item.get("expected"):
+            recalls.append(recall_at_k(ids, item["expected"], top_k))
+
+    result = {"backend": name, "build_s": build_s, "memory_mb": memory_mb, **summarize(latencies)}
+    result[f"recall@{top_k}"] = sum(recalls) / len(recalls) if recalls else None
+    return result
+
+
+def benchmark_corpus(
+    label: str,
+    chunks: Sequence[Dict[str, Any]],
+    queries: Sequence[Dict[str, Any]],
+    backends: Sequence[str],
+    args: argparse.Namespace
+) -> List[Dict[str, Any]]:
+    memory = chunk_memory(chunks)
+    if args.chunks == "store":
+        # As the servers hold profiles loaded from JSON
+        chunks = ChunkStore(chunks)
+    loop = asyncio.new_event_loop()
+    redis_client = FakeRedis(latency=args.redis_latency_ms / 1e3)
+    context = {"redis": redis_client, "loop": loop, "llm_latency": args.llm_latency_ms / 1e3}
+
+    # Bulk load cost against the fake Redis (round trips are what matter remotely)
+    start = time.perf_counter()
+    digitaltwin_rag.initialize_redis_data(redis_client, {"content_chunks": chunks})
+    load_s = time.perf_counter() - start
+
+    rows = []
+    try:
+        for name in backends:
+            row = run_backend(name, BACKENDS[name], chunks, queries, context, args.top_k, args.queries)
+            row.update({"corpus": label, "chunks": len(chunks), "redis_load_s": load_s,
+                        "redis_round_trips": redis_client.round_trips, **memory})
+            rows.append(row)
+    finally:
+        loop.close()
+    return rows
+
+
+def print_table(rows: Sequence[Dict[str, Any]], top_k: int) -> None:
+    recall_key = f"recall@{top_k}"
+    header = f"{'corpus':<26}{'chunks':>9} {'backend':<13}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'QPS':>10}{'mem MB':>9}{'build s':>9}{recall_key:>10}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        recall = f"{r[recall_key]:.3f}" if r[recall_key] is not None else "-"
+        print(f"{r['corpus']:<26}{r['chunks']:>9} {r['backend']:<13}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}"
+              f"{r['p99_ms']:>9.3f}{r['qps']:>10.0f}{r['memory_mb']:>9.2f}{r['build_s']:>9.2f}{recall:>10}")
+
+
+def print_chunk_memory(rows: Sequence[Dict[str, Any]]) -> None:
+    header = f"{'corpus':<26}{'chunks':>9}{'dicts MB':>11}{'store MB':>11}{'saved':>9}"
+    print(header)
+    print("-" * len(header))
+    seen = set()
+    for r in rows:
+        if (r['corpus'], r['chunks']) in seen:
+            continue
+        seen.add((r['corpus'], r['chunks']))
+        saved = 1 - r['chunk_store_mb'] / r['chunk_dicts_mb'] if r['chunk_dicts_mb'] else 0.0
+        print(f"{r['corpus']:<26}{r['chunks']:>9}{r['chunk_dicts_mb']:>11.2f}{r['chunk_store_mb']:>11.2f}{saved:>9.0%}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Digital Twin retrieval offline")
+    parser.add_argument("--profiles", nargs="*", default=PROFILES, help="profile JSON files to benchmark")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[10000], help="synthetic corpus sizes (chunks)")
+    parser.add_argument("--backends", nargs="*", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--queries", type=int, default=200, help="queries replayed per backend")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0, help="simulated Redis round-trip time")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated LLM latency for e2e")
+    parser.add_argument("--chunks", choices=["store", "dicts"], default="store",
+                        help="hand backends a ChunkStore (as the servers do) or plain chunk dicts")
+    parser.add_argument("--golden", default=GOLDEN_FILE)
+    parser.add_argument("--json", dest="json_out", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    golden = load_golden(args.golden)
+    rows = []
+
+    for profile in args.profiles:
+        queries = [q for q in golden if profile in q.get("profiles", [])]
+        if not queries:
+            print(f"⚠️  No golden queries for {profile}; replaying the full set without recall")
+            queries = [{"query": q["query"]} for q in golden]
+        rows += benchmark_corpus(profile, load_chunks(profile), queries, args.backends, args)
+
+    base = load_chunks(args.profiles[0] if args.profiles else PROFILES[0])
+    synthetic_queries = [{"query": q["query"]} for q in golden]
+    for size in args.sizes:
+        rows += benchmark_corpus("synthetic", synthetic_chunks(base, size), synthetic_queries, args.backends, args)
+
+    print()
+    print_table(rows, args.top_k)
+    print("\n📦 Chunk memory")
+    print_chunk_memory(rows)
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📝 Results written to {args.json_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
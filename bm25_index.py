@@ -0,0 +1,134 @@
+"""
+In-memory inverted index with BM25 ranking for Digital Twin content chunks
+"""
+
+import re
+import math
+import heapq
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Sequence, Optional, Set
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.+#]+[a-z0-9]+)*[+#]*")
+
+STOPWORDS = frozenset("""
+a about an and any are as at be been but by can did do does for from had has
+have how i i'm in is it its me my of on or our so that the their them there
+these they this to was we were what when where which who why will with you
+your yours tell
+""".split())
+
+# BM25 tuning parameters (Robertson/Sparck Jones defaults)
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+
+def normalize_term(term: str) -> str:
+    """Fold simple English plurals so "projects" matches "project"."""
+    if len(term) > 4 and term.isalpha():
+        if term.endswith('ies'):
+            return term[:-3] + 'y'
+        if term.endswith('s') and not term.endswith('ss'):
+            return term[:-1]
+    return term
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into search terms, dropping stopwords."""
+    return [
+        normalize_term(t)
+        for t in TOKEN_PATTERN.findall(text.lower())
+        if t not in STOPWORDS
+    ]
+
+
+def chunk_search_text(chunk: Dict[str, Any]) -> str:
+    """Build the text that gets indexed for a content chunk."""
+    metadata = chunk.get('metadata', {}) or {}
+    parts = [
+        chunk.get('title', ''),
+        chunk.get('content', ''),
+        chunk.get('type', ''),
+        str(metadata.get('category', '')).replace('_', ' ')
+    ]
+    for field in ('tags', 'technologies'):
+        values = metadata.get(field, [])
+        if isinstance(values, list):
+            parts.extend(str(v) for v in values)
+    return " ".join(parts)
+
+
+def bm25_idf(total: int, doc_freq: int) -> float:
+    """Okapi BM25 idf of a term found in doc_freq of total documents."""
+    return math.log(1 + (total - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+class BM25Index:
+    """Inverted index mapping terms to (doc index, term frequency) postings."""
+
+    def __init__(
+        self,
+        doc_ids: Sequence[str],
+        doc_lengths: Sequence[int],
+        postings: Dict[str, Tuple[Sequence[int], Sequence[int]]],
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+        idf: Optional[Dict[str, float]] = None
+    ):
+        self.doc_ids = list(doc_ids)
+        self.doc_lengths = list(doc_lengths)
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+
+        total = len(self.doc_ids)
+        self.avg_doc_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.idf = idf if idf is not None else {
+            term: bm25_idf(total, len(docs)) for term, (docs, _) in postings.items()
+        }
+        # Length normalisation is query independent, so compute it once
+        self._norms = [
+            k1 * (1 - b + b * (length / self.avg_doc_length if self.avg_doc_length else 0))
+            for length in self.doc_lengths
+        ]
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[Dict[str, Any]], **kwargs) -> "BM25Index":
+        """Build an index from digitaltwin.json content chunks."""
+        doc_ids = []
+        doc_lengths = []
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+
+        for i, chunk in enumerate(chunks):
+            tokens = tokenize(chunk_search_text(chunk))
+            doc_ids.append(str(chunk.get('id', f"chunk:{i}")))
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                docs, freqs = postings.setdefault(term, ([], []))
+                docs.append(i)
+                freqs.append(tf)
+
+        return cls(doc_ids, doc_lengths, postings, **kwargs)
+
+    def search(self, query: str, top_k: int = 3, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Return up to top_k (doc index, BM25 score) pairs, best first.
+
+        If allowed is given, only those doc indexes are scored.
+        """
+        scores: Dict[int, float] = {}
+        k1 = self.k1
+        norms = self._norms
+
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            idf = self.idf[term]
+            docs, freqs = entry
+            for doc, tf in zip(docs, freqs):
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norms[doc])
+
+        if allowed is not None:
+            scores = {doc: score for doc, score in scores.items() if doc in allowed}
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
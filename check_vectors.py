@@ -1,10 +1,7 @@
-﻿from upstash_vector import Index
-from dotenv import load_dotenv
-
-load_dotenv()
+﻿import clients
 
 try:
-    index = Index.from_env()
+    index = clients.get_vector_index()
     info = index.info()
     print(f'Vector count: {info.vector_count if hasattr(info, "vector_count") else "N/A"}')
 except Exception as e:
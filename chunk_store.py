@@ -0,0 +1,253 @@
+"""
+Compact, columnar store for profile content chunks
+
+A profile loaded as a list of dicts costs a dict, a nested metadata dict, a
+tags list and several strings per chunk, which dominates memory once a
+process holds tens of thousands of chunks across several twins. ChunkStore
+keeps the same chunks as columns instead:
+
+- titles, contents and any remaining metadata in one shared UTF-8 buffer,
+  addressed by an offsets array
+- types and categories interned to small integer IDs
+- tags as integer IDs into one tag vocabulary (CSR offsets + IDs)
+- an ID -> position dict, plus per-type and per-category position arrays,
+  so lookups by ID, type or category are O(1)
+
+It is a read-only Sequence of chunk dicts, rebuilt on access, so code that
+indexes or iterates content_chunks works unchanged; hot paths can read
+single fields (content(i), category_of(i), ...) without building a dict.
+Chunks can be appended.
+
+Rebuilt chunks equal the originals: a field only goes into a column when it
+is present with the column's type (a string, or a list of string tags), and
+per-chunk presence flags keep absent fields absent and empty ones empty.
+Anything else is kept verbatim with the extra fields.
+"""
+
+import sys
+import json
+from array import array
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Presence flags: which fields a chunk has in the columns
+_ID, _TITLE, _CONTENT, _TYPE, _METADATA, _CATEGORY, _TAGS = (1 << i for i in range(7))
+_STRING_FIELDS = (("title", _TITLE), ("content", _CONTENT), ("type", _TYPE))
+
+
+class MappedSequence(Sequence):
+    """Read-only sequence that builds items on access."""
+
+    def __init__(self, length: int, getter: Callable[[int], Any]):
+        self._length = length
+        self._getter = getter
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._getter(i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._getter(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self._getter(i) for i in range(self._length))
+
+
+class Interner:
+    """Dense integer IDs for repeated strings (types, categories, tags)."""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def id_for(self, name: str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return name_id
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class ChunkStore(Sequence):
+    """Append-only columnar store of content chunks (a Sequence of chunk dicts)."""
+
+    def __init__(self, chunks: Iterable[Dict[str, Any]] = ()):
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.types = Interner()
+        self.categories = Interner()
+        self.tags = Interner()
+        # Three spans per chunk in the buffer: title, content, extra fields (JSON)
+        self._buffer = bytearray()
+        self._offsets = array('q', [0])
+        self._type_ids = array('I')
+        self._category_ids = array('I')
+        self._tag_offsets = array('I', [0])
+        self._tag_ids = array('I')
+        self._flags = array('B')
+        # Positions per type / category ID
+        self._by_type: List[array] = []
+        self._by_category: List[array] = []
+        for chunk in chunks:
+            self.append(chunk)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict[str, Any]]) -> "ChunkStore":
+        return chunks if isinstance(chunks, cls) else cls(chunks)
+
+    # --- building ------------------------------------------------------------
+
+    def _add_span(self, text: str) -> None:
+        self._buffer += text.encode('utf-8')
+        self._offsets.append(len(self._buffer))
+
+    @staticmethod
+    def _add_position(index: List[array], name_id: int, position: int) -> None:
+        while len(index) <= name_id:
+            index.append(array('I'))
+        index[name_id].append(position)
+
+    def append(self, chunk: Dict[str, Any]) -> None:
+        position = len(self.ids)
+        flags = 0
+        # Everything not held in a column, kept verbatim
+        extra_chunk = dict(chunk)
+        extra_metadata: Dict[str, Any] = {}
+
+        doc_id = chunk.get('id')
+        if isinstance(doc_id, str):
+            flags |= _ID
+            del extra_chunk['id']
+        doc_id = str(doc_id) if 'id' in chunk else f"chunk:{position}"
+        fields = {}
+        for name, flag in _STRING_FIELDS:
+            value = chunk.get(name)
+            if isinstance(value, str):
+                flags |= flag
+                fields[name] = value
+                del extra_chunk[name]
+
+        category, tags = "", []
+        metadata = chunk.get('metadata')
+        if isinstance(metadata, dict):
+            flags |= _METADATA
+            del extra_chunk['metadata']
+            extra_metadata = dict(metadata)
+            if isinstance(metadata.get('category'), str):
+                flags |= _CATEGORY
+                category = extra_metadata.pop('category')
+            value = metadata.get('tags')
+            if isinstance(value, list) and all(isinstance(tag, str) for tag in value):
+                flags |= _TAGS
+                tags = extra_metadata.pop('tags')
+
+        self.ids.append(doc_id)
+        self.positions[doc_id] = position
+        self._flags.append(flags)
+        self._add_span(fields.get('title', ''))
+        self._add_span(fields.get('content', ''))
+        self._add_span(
+            json.dumps([extra_chunk, extra_metadata], ensure_ascii=False, separators=(',', ':'))
+            if extra_chunk or extra_metadata else ""
+        )
+        type_id = self.types.id_for(fields.get('type', ''))
+        category_id = self.categories.id_for(category)
+        self._type_ids.append(type_id)
+        self._category_ids.append(category_id)
+        self._add_position(self._by_type, type_id, position)
+        self._add_position(self._by_category, category_id, position)
+        self._tag_ids.extend(self.tags.id_for(tag) for tag in tags)
+        self._tag_offsets.append(len(self._tag_ids))
+
+    def extend(self, chunks: Iterable[Dict[str, Any]]) -> None:
+        for chunk in chunks:
+            self.append(chunk)
+
+    # --- field access --------------------------------------------------------
+
+    def _span(self, span: int) -> str:
+        start, end = self._offsets[span], self._offsets[span + 1]
+        return self._buffer[start:end].decode('utf-8')
+
+    def title(self, position: int) -> str:
+        return self._span(3 * position)
+
+    def content(self, position: int) -> str:
+        return self._span(3 * position + 1)
+
+    def type_of(self, position: int) -> str:
+        return self.types.names[self._type_ids[position]]
+
+    def category_of(self, position: int) -> str:
+        return self.categories.names[self._category_ids[position]]
+
+    def tags_of(self, position: int) -> List[str]:
+        start, end = self._tag_offsets[position], self._tag_offsets[position + 1]
+        return [self.tags.names[tag_id] for tag_id in self._tag_ids[start:end]]
+
+    def position(self, doc_id: str) -> Optional[int]:
+        return self.positions.get(doc_id)
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """The chunk with this ID, or None."""
+        position = self.positions.get(doc_id)
+        return self[position] if position is not None else None
+
+    def with_type(self, chunk_type: str) -> Sequence:
+        """Positions of the chunks of one type."""
+        type_id = self.types.ids.get(chunk_type)
+        return self._by_type[type_id] if type_id is not None else ()
+
+    def in_category(self, category: str) -> Sequence:
+        """Positions of the chunks in one metadata category."""
+        category_id = self.categories.ids.get(category)
+        return self._by_category[category_id] if category_id is not None else ()
+
+    # --- Sequence of chunk dicts ---------------------------------------------
+
+    def _chunk(self, position: int) -> Dict[str, Any]:
+        flags = self._flags[position]
+        extra = self._span(3 * position + 2)
+        extra_chunk, extra_metadata = json.loads(extra) if extra else ({}, {})
+        chunk: Dict[str, Any] = {}
+        if flags & _ID:
+            chunk['id'] = self.ids[position]
+        if flags & _TITLE:
+            chunk['title'] = self.title(position)
+        if flags & _CONTENT:
+            chunk['content'] = self.content(position)
+        if flags & _TYPE:
+            chunk['type'] = self.type_of(position)
+        if flags & _METADATA:
+            metadata = {}
+            if flags & _CATEGORY:
+                metadata['category'] = self.category_of(position)
+            if flags & _TAGS:
+                metadata['tags'] = self.tags_of(position)
+            metadata.update(extra_metadata)
+            chunk['metadata'] = metadata
+        chunk.update(extra_chunk)
+        return chunk
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._chunk(i) for i in range(*index.indices(len(self.ids)))]
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError(index)
+        return self._chunk(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._chunk(i) for i in range(len(self.ids)))
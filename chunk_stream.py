@@ -0,0 +1,301 @@
+"""
+Streaming ingestion of content chunks
+
+Reads `content_chunks` incrementally from a profile JSON file (without
+loading the whole document) or from a JSON-Lines file with one chunk per
+line, and feeds fixed-size batches through a bounded queue to concurrent
+store writers. Peak memory depends on the batch and queue sizes, not on the
+corpus size.
+
+    python chunk_stream.py corpus.jsonl            # read throughput only
+    python chunk_stream.py corpus.jsonl --redis    # stream into Redis
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, TypeVar
+
+from async_utils import run_blocking
+
+T = TypeVar("T")
+
+READ_BLOCK_SIZE = 64 * 1024
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+# Batches buffered between the reader and the writers
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class _IncrementalJSONReader:
+    """Decodes consecutive JSON values from a file, one buffered block at a time."""
+
+    def __init__(self, f: TextIO, block_size: int = READ_BLOCK_SIZE):
+        self._file = f
+        self._block_size = block_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Read more input, dropping what has been consumed. False at EOF."""
+        if self._eof:
+            return False
+        # Grow reads with the pending value so huge values decode in O(n)
+        pending = len(self._buffer) - self._pos
+        data = self._file.read(max(self._block_size, pending))
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        if not data:
+            self._eof = True
+        return bool(data)
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or "" at end of input."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON: expected '{char}', found '{found or 'end of file'}'")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may have been cut short, even
+            # mid-fraction or mid-exponent ("0." decodes as 0)
+            if (
+                isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                and (end == len(self._buffer) or self._buffer[end] in _NUMBER_CHARS)
+                and self._fill()
+            ):
+                continue
+            self._pos = end
+            return obj
+
+    def array_items(self) -> Iterator[Any]:
+        """Yield the elements of the array starting at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_json_chunks(f: TextIO, key: str = "content_chunks") -> Iterator[Dict[str, Any]]:
+    """Stream the `key` array out of a top-level JSON object (or a bare array)."""
+    reader = _IncrementalJSONReader(f)
+    if reader.peek() == "[":
+        yield from reader.array_items()
+        return
+
+    reader.expect("{")
+    while True:
+        char = reader.peek()
+        if char == "}" or char == "":
+            raise ValueError(f"No {key} found in profile data")
+        if char == ",":
+            reader.expect(",")
+            continue
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            yield from reader.array_items()
+            return
+        reader.value()  # skip other sections (personal, experience, ...)
+
+
+def read_json_profile(
+    f: TextIO,
+    pack: Callable[[Iterator[Any]], Any] = list,
+    key: str = "content_chunks"
+) -> Dict[str, Any]:
+    """Decode a profile object, streaming its `key` array through pack().
+
+    pack receives the array's elements one at a time (e.g. ChunkStore), so
+    the chunks are never all held as parsed dicts; other sections are
+    decoded whole.
+    """
+    reader = _IncrementalJSONReader(f)
+    reader.expect("{")
+    data: Dict[str, Any] = {}
+    while True:
+        char = reader.peek()
+        if char == "}":
+            reader.expect("}")
+            break
+        if char == "":
+            raise ValueError("Malformed JSON: expected '}', found 'end of file'")
+        if char == ",":
+            reader.expect(",")
+            continue
+        name = reader.value()
+        reader.expect(":")
+        data[name] = pack(reader.array_items()) if name == key and reader.peek() == "[" else reader.value()
+    if reader.peek():
+        raise ValueError("Malformed JSON: extra data after the profile object")
+    if key not in data:
+        raise ValueError(f"No {key} found in profile data")
+    return data
+
+
+def iter_jsonl_chunks(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """Stream chunks from a JSON-Lines file, skipping blank lines."""
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_no}: {str(e)}") from None
+
+
+def iter_chunks(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream content chunks from a .json profile or a .jsonl/.ndjson file."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(JSONL_SUFFIXES):
+            yield from iter_jsonl_chunks(f)
+        else:
+            yield from iter_json_chunks(f)
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group an iterable into lists of at most `size` items."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Throughput:
+    """Counts items over wall-clock time and reports items per second."""
+
+    def __init__(self, unit: str = "chunks"):
+        self.unit = unit
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def add(self, n: int) -> None:
+        self.count += n
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.count} {self.unit} in {self.elapsed:.2f}s ({self.rate:,.0f} {self.unit}/s)"
+
+
+_DONE = object()
+
+
+async def ingest(
+    batches: Iterator[List[T]],
+    sink: Callable[[List[T]], Awaitable[None]],
+    queue_size: int = INGEST_QUEUE_SIZE,
+    workers: int = INGEST_WORKERS
+) -> int:
+    """Feed batches from a (blocking) iterator to concurrent async writers.
+
+    The iterator is advanced on the blocking pool, so file reading and
+    enrichment overlap with writes. At most queue_size batches wait in the
+    queue and one more is held per writer. Returns the number of batches.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    workers = max(1, workers)
+    written = 0
+
+    async def produce() -> None:
+        while True:
+            batch = await run_blocking(next, batches, _DONE)
+            if batch is _DONE:
+                break
+            await queue.put(batch)
+        for _ in range(workers):
+            await queue.put(_DONE)
+
+    async def consume() -> None:
+        nonlocal written
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                return
+            await sink(batch)
+            written += 1
+
+    tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(consume()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream content chunks from a profile or JSON-Lines corpus")
+    parser.add_argument("path", help="profile .json or chunk .jsonl file")
+    parser.add_argument("--redis", action="store_true", help="sync the chunks into Redis")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--namespace", help="Redis key namespace (default: derived from the file name)")
+    args = parser.parse_args(argv)
+
+    if args.redis:
+        import digitaltwin_rag
+        from namespaces import namespace_for
+        namespace = namespace_for(args.path) if args.namespace is None else args.namespace
+        redis_client = digitaltwin_rag.setup_redis_client()
+        try:
+            asyncio.run(digitaltwin_rag.stream_redis_data(redis_client, args.path, args.batch_size, namespace))
+        finally:
+            redis_client.close()
+        return 0
+
+    meter = Throughput()
+    for batch in batched(iter_chunks(args.path), args.batch_size):
+        meter.add(len(batch))
+    print(f"✅ Read {meter}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
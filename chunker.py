@@ -0,0 +1,350 @@
+"""
+Chunking engine for structured profiles and Markdown documents
+
+Turns professional_profile.json-style JSON (nested sections, lists of
+experience/projects/questions) and Markdown files (e.g. job-postings/) into
+retrieval chunks shaped like the hand-written `content_chunks`: id, title,
+content, type and metadata with a category. Sections are split into
+token-bounded windows that overlap, and IDs are derived from the section
+path, so they stay stable when unrelated parts of a file change. Files are
+chunked in parallel with a process pool.
+
+    python chunker.py professional_profile.json job-postings/ -o chunks.jsonl
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "0")) or None
+
+# List fields whose values become metadata tags (searched by BM25)
+TAG_FIELDS = {"tags", "technologies", "technical_skills_used", "frameworks"}
+# Fields used, in order, to name an item inside a list
+NAME_FIELDS = ("name", "company", "title", "language", "degree", "university", "weakness", "question")
+
+_TOKEN = re.compile(r"\S+")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_SLUG = re.compile(r"[^a-z0-9]+")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_MARKDOWN_EMPHASIS = re.compile(r"[*_`]+")
+
+Section = Tuple[List[Tuple[str, str]], str, List[str]]  # (path of (slug, label), text, tags)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (whitespace-delimited words)."""
+    return len(_TOKEN.findall(text))
+
+
+def _slug(text: str) -> str:
+    return _SLUG.sub("_", text.lower()).strip("_")
+
+
+def _label(key: str) -> str:
+    return key.replace("_", " ").strip().title()
+
+
+# ---------------------------------------------------------------------------
+# Token-bounded windows
+# ---------------------------------------------------------------------------
+
+def _units(text: str, max_tokens: int) -> List[str]:
+    """Split text into lines, then sentences, then word runs that fit max_tokens."""
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if count_tokens(line) <= max_tokens:
+            units.append(line)
+            continue
+        for sentence in _SENTENCE_BREAK.split(line):
+            words = sentence.split()
+            units.extend(" ".join(words[i:i + max_tokens]) for i in range(0, len(words), max_tokens))
+    return units
+
+
+def split_windows(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Pack lines/sentences into windows of at most max_tokens.
+
+    Each window after the first repeats trailing units of the previous one,
+    up to `overlap` tokens, so facts on a boundary appear in both.
+    """
+    units = _units(text, max_tokens)
+    sizes = [count_tokens(u) for u in units]
+    windows: List[str] = []
+    start = 0
+    while start < len(units):
+        end, total = start, 0
+        while end < len(units) and total + sizes[end] <= max_tokens:
+            total += sizes[end]
+            end += 1
+        end = max(end, start + 1)
+        windows.append("\n".join(units[start:end]))
+        if end >= len(units):
+            break
+        # Step back over trailing units that fit in the overlap budget
+        next_start, carried = end, 0
+        while next_start - 1 > start and carried + sizes[next_start - 1] <= overlap:
+            next_start -= 1
+            carried += sizes[next_start]
+        start = next_start
+    return windows
+
+
+# ---------------------------------------------------------------------------
+# Structured JSON
+# ---------------------------------------------------------------------------
+
+def _is_simple(value: Any) -> bool:
+    if isinstance(value, (dict, list)):
+        return isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value)
+    return True
+
+
+def _render(key: str, value: Any) -> str:
+    if isinstance(value, list):
+        items = [str(v) for v in value]
+        if any(count_tokens(item) > 6 for item in items):
+            return f"{_label(key)}:\n" + "\n".join(f"- {item}" for item in items)
+        return f"{_label(key)}: {', '.join(items)}"
+    if isinstance(value, bool):
+        value = "Yes" if value else "No"
+    return f"{_label(key)}: {value}"
+
+
+def _content_name(item: Any) -> str:
+    """Short hash of a list item's content, stable when items are inserted or reordered."""
+    return hashlib.sha1(json.dumps(item, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:8]
+
+
+def _item_name(item: Any) -> str:
+    if isinstance(item, dict):
+        for field in NAME_FIELDS:
+            if isinstance(item.get(field), str) and item[field]:
+                return item[field]
+    return _content_name(item)
+
+
+def _walk_json(value: Any, path: List[Tuple[str, str]]) -> Iterator[Section]:
+    """Yield one section per object level: its scalar fields, then nested parts."""
+    if isinstance(value, dict):
+        lines, tags = [], []
+        for key, item in value.items():
+            if _is_simple(item):
+                lines.append(_render(key, item))
+                if key in TAG_FIELDS and isinstance(item, list):
+                    tags.extend(str(v) for v in item)
+        if lines:
+            yield path, "\n".join(lines), tags
+        for key, item in value.items():
+            if not _is_simple(item):
+                yield from _walk_json(item, path + [(_slug(key), _label(key))])
+    elif isinstance(value, list):
+        seen: Dict[str, int] = {}
+        for item in value:
+            name = _item_name(item)
+            slug = _slug(name) or _content_name(item)
+            # Repeated names are numbered by occurrence, not list position
+            seen[slug] = seen.get(slug, 0) + 1
+            if seen[slug] > 1:
+                slug = f"{slug}_{seen[slug]}"
+            yield from _walk_json(item, path + [(slug, name)])
+    else:
+        yield path, str(value), []
+
+
+def json_sections(data: Dict[str, Any]) -> Iterator[Section]:
+    for key, value in data.items():
+        yield from _walk_json(value, [(_slug(key), _label(key))])
+
+
+# ---------------------------------------------------------------------------
+# Markdown
+# ---------------------------------------------------------------------------
+
+def markdown_sections(text: str) -> Iterator[Section]:
+    """Yield one section per heading, with the full heading path."""
+    stack: List[Tuple[int, str, str]] = []  # (level, slug, label)
+    body: List[str] = []
+
+    def flush():
+        content = "\n".join(body).strip()
+        if content:
+            yield [(slug, label) for _, slug, label in stack], content, []
+
+    in_fence = False
+    for line in text.splitlines():
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING.match(line)
+        if not match:
+            body.append(line)
+            continue
+        yield from flush()
+        body = []
+        level = len(match.group(1))
+        label = _MARKDOWN_EMPHASIS.sub("", match.group(2)).strip()
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, _slug(label), label))
+    yield from flush()
+
+
+# ---------------------------------------------------------------------------
+# Files
+# ---------------------------------------------------------------------------
+
+def _document_type(path: str) -> str:
+    """Chunk type from the containing folder: job-postings/x.md -> "job_posting"."""
+    folder = _slug(os.path.basename(os.path.dirname(path)))
+    if not folder:
+        return "document"
+    return folder[:-1] if folder.endswith("s") else folder
+
+
+def _windowed_chunks(
+    prefix: str,
+    sections: Iterator[Section],
+    chunk_type: Optional[str],
+    source: str,
+    max_tokens: int,
+    overlap: int,
+    skip_levels: int = 0
+) -> List[Dict[str, Any]]:
+    chunks = []
+    seen_ids = set()
+    for path, text, tags in sections:
+        labels = [label for _, label in path]
+        # Markdown paths start with the document title, which the file prefix already covers
+        slugs = [slug for slug, _ in path[skip_levels:]] or ["root"]
+        category = slugs[0]
+        base_id = f"{prefix}:{'.'.join(slugs)}"
+        while base_id in seen_ids:
+            base_id += "_"
+        seen_ids.add(base_id)
+        title = " › ".join(labels) or prefix
+        for n, window in enumerate(split_windows(text, max_tokens, overlap)):
+            chunks.append({
+                "id": f"{base_id}:{n}",
+                "title": title,
+                "content": window,
+                "type": chunk_type or category,
+                "metadata": {
+                    "category": category,
+                    "tags": list(dict.fromkeys(tags)) or labels[skip_levels:],
+                    "source": source,
+                    "section": labels,
+                    "chunk_index": n,
+                    "tokens": count_tokens(window)
+                }
+            })
+    return chunks
+
+
+def _split_existing(chunks: Sequence[Dict[str, Any]], max_tokens: int, overlap: int) -> List[Dict[str, Any]]:
+    """Pass hand-written content_chunks through, splitting only oversized ones."""
+    result = []
+    for chunk in chunks:
+        windows = split_windows(chunk.get('content', ''), max_tokens, overlap)
+        if len(windows) <= 1:
+            result.append(chunk)
+            continue
+        for n, window in enumerate(windows):
+            part = dict(chunk, id=f"{chunk['id']}:{n}", content=window)
+            part["metadata"] = dict(chunk.get('metadata', {}) or {}, chunk_index=n)
+            result.append(part)
+    return result
+
+
+def chunk_file(path: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
+    """Chunk one .json or .md file."""
+    prefix = _slug(os.path.splitext(os.path.basename(path))[0])
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            if isinstance(data, dict) and "content_chunks" in data:
+                return _split_existing(data["content_chunks"], max_tokens, overlap)
+            return _windowed_chunks(prefix, json_sections(data), None, path, max_tokens, overlap)
+        sections = markdown_sections(f.read())
+    return _windowed_chunks(prefix, sections, _document_type(path), path, max_tokens, overlap, skip_levels=1)
+
+
+def expand_paths(paths: Sequence[str]) -> List[str]:
+    """Files as given, plus every .json/.md file under given directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith((".json", ".md")))
+        else:
+            files.append(path)
+    return files
+
+
+def chunk_files(
+    paths: Sequence[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap: int = CHUNK_OVERLAP_TOKENS,
+    workers: Optional[int] = CHUNK_WORKERS
+) -> List[Dict[str, Any]]:
+    """Chunk many files, in parallel across processes when there are several."""
+    files = expand_paths(paths)
+    if len(files) <= 1 or workers == 1:
+        results = [chunk_file(p, max_tokens, overlap) for p in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(chunk_file, files, [max_tokens] * len(files), [overlap] * len(files)))
+    return [chunk for chunks in results for chunk in chunks]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Split profiles and Markdown documents into retrieval chunks")
+    parser.add_argument("paths", nargs="+", help="JSON/Markdown files or directories")
+    parser.add_argument("-o", "--output", help="write chunks here (.jsonl, or .json with content_chunks)")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--workers", type=int, default=CHUNK_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.overlap >= args.max_tokens:
+        print("❌ --overlap must be smaller than --max-tokens")
+        return 2
+
+    start = time.perf_counter()
+    chunks = chunk_files(args.paths, args.max_tokens, args.overlap, args.workers)
+    elapsed = time.perf_counter() - start
+
+    ids = [c["id"] for c in chunks]
+    if len(ids) != len(set(ids)):
+        print("⚠️  Duplicate chunk IDs across files; give them distinct file names")
+    sizes = [count_tokens(c.get("content", "")) for c in chunks]
+    print(f"✅ {len(chunks)} chunks from {len(expand_paths(args.paths))} files in {elapsed:.2f}s")
+    if sizes:
+        print(f"📊 Tokens per chunk: avg {sum(sizes) / len(sizes):.0f}, max {max(sizes)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            if args.output.lower().endswith((".jsonl", ".ndjson")):
+                for chunk in chunks:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            else:
+                json.dump({"content_chunks": chunks}, f, indent=2, ensure_ascii=False)
+        print(f"📝 Chunks written to {args.output}")
+    else:
+        for chunk in chunks:
+            print(f"  {chunk['id']:<60} {chunk['metadata'].get('tokens', ''):>4}  {chunk['title']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
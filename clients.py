@@ -0,0 +1,353 @@
+"""
+Shared, pooled clients for Redis, Upstash Vector and Groq
+
+Every module gets its clients from here instead of building its own. Clients
+are created lazily on first use and shared process-wide:
+
+- Redis uses a blocking connection pool with TCP keep-alive, idle-connection
+  health checks and reconnect-with-backoff on connection errors
+- Upstash Vector and Groq use keep-alive httpx sessions with a bounded
+  connection pool, so concurrent requests reuse warm TLS connections; a
+  reset closes the session it replaces
+
+A client that has been closed, or reported unhealthy via report_failure(),
+is rebuilt on its next use. Pool sizes and timeouts come from the environment.
+"""
+
+import os
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional, Set
+
+import httpx
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from dotenv import load_dotenv
+from groq import Groq, AsyncGroq
+from upstash_vector.core.index_operations import AsyncIndexOperations, IndexOperations
+from upstash_vector.http import execute_with_parameters, execute_with_parameters_async, generate_headers
+
+from llm_gateway import AsyncLLMGateway, LLMGateway
+
+load_dotenv()
+
+# Redis
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "20"))
+# Seconds to wait for a free pooled connection before failing
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+# Idle connections older than this are pinged before reuse
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES", "3"))
+
+# HTTP clients (Upstash Vector, Groq)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+VECTOR_HTTP_TIMEOUT = float(os.getenv("VECTOR_HTTP_TIMEOUT", "30"))
+# upstash_vector's own retry defaults
+VECTOR_RETRIES = int(os.getenv("VECTOR_RETRIES", "3"))
+VECTOR_RETRY_INTERVAL = float(os.getenv("VECTOR_RETRY_INTERVAL", "1"))
+GROQ_HTTP_TIMEOUT = float(os.getenv("GROQ_HTTP_TIMEOUT", "60"))
+
+
+class LazyClient:
+    """A client built on first use, rebuilt if closed, reset when reported unhealthy.
+
+    `reset` replaces the client's connections in place (rather than the
+    client object), so modules holding a reference pick up fresh connections.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        is_open: Optional[Callable[[Any], bool]] = None,
+        reset: Optional[Callable[[Any], None]] = None
+    ):
+        self.name = name
+        self.factory = factory
+        self.is_open = is_open
+        self.reset = reset
+        self._client = None
+        self._built = False
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reconnects": 0}
+
+    def _usable(self) -> bool:
+        if not self._built:
+            return False
+        return self._client is None or self.is_open is None or self.is_open(self._client)
+
+    def get(self):
+        if self._usable():
+            return self._client
+        with self._lock:
+            if not self._usable():
+                if self._built:
+                    self.stats["reconnects"] += 1
+                    print(f"⚠️  Reconnecting {self.name} client")
+                self._client = self.factory()
+                self._built = True
+                self.stats["created"] += 1
+            return self._client
+
+    def install(self, client) -> None:
+        """Serve `client` instead of building one (e.g. offline stand-ins in loadtest.py)."""
+        with self._lock:
+            self._client = client
+            self._built = True
+            self.is_open = None
+            self.reset = None
+
+    def report_failure(self, error: Optional[Exception] = None) -> None:
+        """Drop the client's connections after a failed health check."""
+        with self._lock:
+            if self._client is None or self.reset is None:
+                return
+            self.stats["reconnects"] += 1
+            print(f"⚠️  Reconnecting {self.name} client" + (f": {error}" if error else ""))
+            self.reset(self._client)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _http_timeout(timeout: float) -> httpx.Timeout:
+    return httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT)
+
+
+# --- Redis -------------------------------------------------------------------
+
+def _redis_options() -> Dict[str, Any]:
+    return {
+        "max_connections": REDIS_POOL_SIZE,
+        "timeout": REDIS_POOL_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_keepalive": True,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "retry": Retry(ExponentialBackoff(cap=2.0, base=0.1), REDIS_RETRIES),
+        "retry_on_error": [redis.ConnectionError, redis.TimeoutError],
+    }
+
+
+def _build_upstash_redis() -> redis.Redis:
+    url = os.getenv('UPSTASH_REDIS_REST_URL')
+    token = os.getenv('UPSTASH_REDIS_REST_TOKEN')
+    if not url or not token:
+        raise ValueError("Missing Redis URL or token in .env file")
+    pool = redis.BlockingConnectionPool(
+        connection_class=redis.SSLConnection,
+        host=url.replace('https://', '').split(':')[0].rstrip('/'),
+        port=REDIS_PORT,
+        password=token,
+        ssl_cert_reqs=None,
+        ssl_check_hostname=False,
+        **_redis_options()
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def _build_redis_from_url(url: str) -> redis.Redis:
+    return redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(url, **_redis_options()))
+
+
+def _reset_redis(client: redis.Redis) -> None:
+    # Pooled sockets reconnect (with backoff) on their next use
+    client.connection_pool.disconnect()
+
+
+_redis_clients: Dict[str, LazyClient] = {}
+_redis_lock = threading.Lock()
+
+
+def redis_holder(url: Optional[str] = None) -> LazyClient:
+    """The shared holder for Upstash Redis, or for a redis:// / rediss:// URL."""
+    key = url or ""
+    with _redis_lock:
+        if key not in _redis_clients:
+            factory = (lambda: _build_redis_from_url(url)) if url else _build_upstash_redis
+            _redis_clients[key] = LazyClient("Redis", factory, reset=_reset_redis)
+        return _redis_clients[key]
+
+
+def get_redis(url: Optional[str] = None) -> redis.Redis:
+    return redis_holder(url).get()
+
+
+# --- Upstash Vector ----------------------------------------------------------
+
+def _vector_credentials():
+    url = os.getenv("UPSTASH_VECTOR_REST_URL")
+    token = os.getenv("UPSTASH_VECTOR_REST_TOKEN")
+    if not url or not token:
+        raise ValueError("Missing UPSTASH_VECTOR_REST_URL or UPSTASH_VECTOR_REST_TOKEN in .env file")
+    return url, token
+
+
+def _vector_session(asynchronous: bool = False):
+    session = httpx.AsyncClient if asynchronous else httpx.Client
+    return session(limits=_http_limits(), timeout=_http_timeout(VECTOR_HTTP_TIMEOUT))
+
+
+# upstash_vector's Index / AsyncIndex build their own unpooled HTTP client
+# with no way to pass one in. These implement the same operations (all of
+# which go through the SDK's _execute_request hook, see upstash-vector's
+# IndexOperations, pinned in requirements.txt) over a session they own.
+
+class PooledIndex(IndexOperations):
+    """upstash_vector Index over a pooled keep-alive session."""
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        retries: int = VECTOR_RETRIES,
+        retry_interval: float = VECTOR_RETRY_INTERVAL
+    ):
+        self.url = url
+        self.headers = generate_headers(token, True)
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.session = _vector_session()
+
+    def _execute_request(self, payload: Any = "", path: str = ""):
+        return execute_with_parameters(
+            url=f"{self.url}{path}",
+            client=self.session,
+            headers=self.headers,
+            retries=self.retries,
+            retry_interval=self.retry_interval,
+            payload=payload
+        )
+
+    def reset_session(self) -> None:
+        """Swap in a fresh session, closing the old one's connections."""
+        old, self.session = self.session, _vector_session()
+        old.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncPooledIndex(AsyncIndexOperations):
+    """upstash_vector AsyncIndex over a pooled keep-alive session."""
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        retries: int = VECTOR_RETRIES,
+        retry_interval: float = VECTOR_RETRY_INTERVAL
+    ):
+        self.url = url
+        self.headers = generate_headers(token, True)
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.session = _vector_session(asynchronous=True)
+        # Close tasks for replaced sessions, referenced until they finish
+        self._closing: Set[asyncio.Task] = set()
+
+    async def _execute_request_async(self, payload: Any = "", path: str = ""):
+        return await execute_with_parameters_async(
+            client=self.session,
+            url=f"{self.url}{path}",
+            headers=self.headers,
+            retries=self.retries,
+            retry_interval=self.retry_interval,
+            payload=payload
+        )
+
+    def reset_session(self) -> None:
+        """Swap in a fresh session and close the old one (in the background on a running loop)."""
+        old, self.session = self.session, _vector_session(asynchronous=True)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(old.aclose())
+            return
+        task = loop.create_task(old.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self) -> None:
+        await self.session.aclose()
+
+
+def _build_vector_index() -> PooledIndex:
+    return PooledIndex(*_vector_credentials())
+
+
+def _build_async_vector_index() -> AsyncPooledIndex:
+    return AsyncPooledIndex(*_vector_credentials())
+
+
+def _session_open(index) -> bool:
+    return not index.session.is_closed
+
+
+vector_index = LazyClient("Upstash Vector", _build_vector_index, _session_open, reset=PooledIndex.reset_session)
+async_vector_index = LazyClient(
+    "Upstash Vector", _build_async_vector_index, _session_open, reset=AsyncPooledIndex.reset_session
+)
+
+
+def get_vector_index() -> PooledIndex:
+    return vector_index.get()
+
+
+def get_async_vector_index() -> AsyncPooledIndex:
+    return async_vector_index.get()
+
+
+# --- Groq ----------------------------------------------------------------------
+
+def groq_api_key() -> Optional[str]:
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key or api_key == 'your_groq_api_key':
+        print("⚠️  GROQ_API_KEY not set or using default value")
+        return None
+    return api_key
+
+
+def _build_groq() -> Optional[LLMGateway]:
+    api_key = groq_api_key()
+    if not api_key:
+        return None
+    http_client = httpx.Client(limits=_http_limits(), timeout=_http_timeout(GROQ_HTTP_TIMEOUT))
+    return LLMGateway(Groq(api_key=api_key, http_client=http_client))
+
+
+def _build_async_groq() -> Optional[AsyncLLMGateway]:
+    api_key = groq_api_key()
+    if not api_key:
+        return None
+    http_client = httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout(GROQ_HTTP_TIMEOUT))
+    return AsyncLLMGateway(AsyncGroq(api_key=api_key, http_client=http_client))
+
+
+def _groq_open(gateway) -> bool:
+    return not gateway.client._client.is_closed
+
+
+groq_client = LazyClient("Groq", _build_groq, _groq_open)
+async_groq_client = LazyClient("Groq", _build_async_groq, _groq_open)
+
+
+def get_groq() -> Optional[LLMGateway]:
+    """Shared Groq client behind the LLM gateway, or None without an API key."""
+    return groq_client.get()
+
+
+def get_async_groq() -> Optional[AsyncLLMGateway]:
+    """Shared AsyncGroq client behind the LLM gateway, or None without an API key."""
+    return async_groq_client.get()
@@ -0,0 +1,183 @@
+"""
+Context assembly: fit retrieved chunks into a per-model token budget
+
+Sits between retrieval and generation. Near-duplicate chunks are dropped,
+long chunks are cut down to the sentences most relevant to the question,
+and the result is packed (best-ranked first) under the token budget for the
+model being called. Prompt-size and estimated latency savings are logged for
+every request.
+"""
+
+import os
+import re
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from bm25_index import tokenize
+
+# Context token budget and rough prompt-processing speed per model
+MODEL_PROFILES: Dict[str, Dict[str, float]] = {
+    "mixtral-8x7b-32768": {"budget": 3000, "prefill_tokens_per_s": 4000},
+    "llama-3.1-8b-instant": {"budget": 1500, "prefill_tokens_per_s": 12000},
+}
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")) or None
+FALLBACK_CONTEXT_BUDGET = 2000
+# Word-shingle Jaccard similarity above which a chunk counts as a duplicate
+DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.8"))
+CONTEXT_LOGGING = os.getenv("CONTEXT_LOGGING", "true").lower() == "true"
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])(?<!\b[A-Z]\.)\s+|\n+")
+_WORD = re.compile(r"\w+")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count: words and punctuation, plus ~30% for subwords."""
+    return math.ceil(len(_TOKEN.findall(text)) * 1.3)
+
+
+def context_budget(model: str) -> int:
+    """Token budget for the context section of a prompt to `model`."""
+    if DEFAULT_CONTEXT_BUDGET:
+        return DEFAULT_CONTEXT_BUDGET
+    return int(MODEL_PROFILES.get(model, {}).get("budget", FALLBACK_CONTEXT_BUDGET))
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_sentences(text: str, query_terms: Set[str], max_tokens: int) -> str:
+    """Keep the sentences of `text` that best match the query, within max_tokens.
+
+    Sentences are ranked by how many query terms they contain (ties keep
+    document order) and emitted in their original order.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text.strip()
+    sentences = [s.strip() for s in _SENTENCE_BREAK.split(text) if s.strip()]
+    if not sentences:
+        return ""
+    sizes = [count_tokens(s) for s in sentences]
+
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_terms.intersection(tokenize(sentences[i]))), i)
+    )
+    chosen, used = [], 0
+    for i in ranked:
+        if used + sizes[i] <= max_tokens:
+            chosen.append(i)
+            used += sizes[i]
+    if not chosen:
+        # Even the best sentence is too long: truncate it by words
+        words = sentences[ranked[0]].split()
+        return " ".join(words[:max(1, int(max_tokens / 1.3))])
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+@dataclass
+class PackedContext:
+    """The assembled context plus what it cost compared to the raw chunks."""
+    documents: List[str] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+    tokens_before: int = 0
+    tokens_after: int = 0
+    duplicates_removed: int = 0
+    chunks_trimmed: int = 0
+    chunks_dropped: int = 0
+    budget: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self.documents)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+
+def pack_context(
+    query: str,
+    results: Sequence[Dict[str, Any]],
+    model: str,
+    budget: Optional[int] = None,
+    log: bool = CONTEXT_LOGGING
+) -> PackedContext:
+    """Build the prompt context for `query` from ranked retrieval results.
+
+    results are {"id", "score", "metadata": chunk} dicts, best first; each
+    document is rendered as "title: content".
+    """
+    start = time.perf_counter()
+    budget = budget or context_budget(model)
+    packed = PackedContext(budget=budget)
+    query_terms = set(tokenize(query))
+
+    # Drop empty and near-duplicate chunks, keeping the better-ranked copy
+    candidates = []
+    kept_shingles: List[Set[tuple]] = []
+    for result in results:
+        chunk = result.get("metadata") or {}
+        content = chunk.get("content", "")
+        if not content:
+            continue
+        title = chunk.get("title", "Information")
+        packed.tokens_before += count_tokens(f"{title}: {content}")
+        shingles = _shingles(content)
+        if any(_jaccard(shingles, other) >= DUPLICATE_SIMILARITY for other in kept_shingles):
+            packed.duplicates_removed += 1
+            continue
+        kept_shingles.append(shingles)
+        candidates.append((str(result.get("id", "")), title, content))
+
+    # Give each remaining chunk an equal share of what is left; unused
+    # tokens roll over to lower-ranked chunks
+    remaining = budget
+    for position, (chunk_id, title, content) in enumerate(candidates):
+        title_tokens = count_tokens(f"{title}: ")
+        share = remaining // (len(candidates) - position) - title_tokens
+        if share <= 0:
+            packed.chunks_dropped += len(candidates) - position
+            break
+        text = select_sentences(content, query_terms, share)
+        if not text:
+            packed.chunks_dropped += 1
+            continue
+        if text != content.strip():
+            packed.chunks_trimmed += 1
+        document = f"{title}: {text}"
+        tokens = count_tokens(document)
+        packed.documents.append(document)
+        packed.chunk_ids.append(chunk_id)
+        packed.tokens_after += tokens
+        remaining -= tokens
+
+    packed.elapsed_ms = (time.perf_counter() - start) * 1e3
+    if log:
+        log_savings(packed, model)
+    return packed
+
+
+def log_savings(packed: PackedContext, model: str) -> None:
+    prefill_rate = MODEL_PROFILES.get(model, {}).get("prefill_tokens_per_s")
+    saved_ms = f", ~{1e3 * packed.tokens_saved / prefill_rate:.0f} ms prefill saved" if prefill_rate else ""
+    percent = 100 * packed.tokens_saved / packed.tokens_before if packed.tokens_before else 0.0
+    print(
+        f"📦 Context for {model}: {packed.tokens_before} → {packed.tokens_after} tokens "
+        f"({percent:.0f}% saved{saved_ms}; {packed.duplicates_removed} duplicates, "
+        f"{packed.chunks_trimmed} trimmed, {packed.chunks_dropped} dropped, "
+        f"budget {packed.budget}) in {packed.elapsed_ms:.2f} ms"
+    )
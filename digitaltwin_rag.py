@@ -1,30 +1,68 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import hashlib
+from typing import List, Dict, Any, Optional, Sequence, Tuple, AsyncIterator
 from dotenv import load_dotenv
-import redis
-from groq import Groq
+from groq import Groq, AsyncGroq
+import clients
+from async_utils import (
+    run_blocking,
+    with_timeout,
+    iterate_with_timeout,
+    StageTimeoutError,
+    GENERATION_TIMEOUT
+)
+from bm25_index import BM25Index
+from chunk_store import ChunkStore
+from chunk_stream import (
+    INGEST_BATCH_SIZE,
+    JSONL_SUFFIXES,
+    Throughput,
+    batched,
+    ingest,
+    iter_chunks,
+    read_json_profile
+)
+from context_packer import pack_context
+from index_artifact import open_artifact
 
 # Load environment variables
 load_dotenv()
 
+GROQ_MODEL = "mixtral-8x7b-32768"
+
+# Fixed replies used when generation is unavailable; never cached
+NOT_CONFIGURED_RESPONSE = "I'm sorry, I couldn't process your request. The AI service is not configured."
+ERROR_RESPONSE = "I'm sorry, I encountered an error while processing your request."
+TIMEOUT_RESPONSE = "I'm sorry, the AI service took too long to respond. Please try again."
+FALLBACK_RESPONSES = frozenset([NOT_CONFIGURED_RESPONSE, ERROR_RESPONSE, TIMEOUT_RESPONSE])
+
+# Redis keys (the default twin; other twins get a namespaced copy, see redis_keys)
+CHUNKS_KEY = "digital_twin:chunks"
+CHUNK_HASHES_KEY = "digital_twin:chunk_hashes"
+MANIFEST_KEY = "digital_twin:manifest"
+INITIALIZED_KEY = "digital_twin:initialized"
+
+def redis_keys(namespace: str = "") -> Dict[str, str]:
+    """Redis keys for one twin's chunks: digital_twin:<namespace>:chunks etc."""
+    keys = {
+        "chunks": CHUNKS_KEY,
+        "hashes": CHUNK_HASHES_KEY,
+        "manifest": MANIFEST_KEY,
+        "initialized": INITIALIZED_KEY
+    }
+    if not namespace:
+        return keys
+    return {name: key.replace("digital_twin:", f"digital_twin:{namespace}:", 1) for name, key in keys.items()}
+
+# In-memory search state, built once by load_profile_data()
+search_index: Optional[BM25Index] = None
+indexed_chunks: Sequence[Dict[str, Any]] = []
+
 def setup_redis_client():
-    """Initialize and return a Redis client."""
+    """Return the shared, pooled Redis client (see clients.py)."""
     try:
-        url = os.getenv('UPSTASH_REDIS_REST_URL')
-        token = os.getenv('UPSTASH_REDIS_REST_TOKEN')
-        
-        if not url or not token:
-            raise ValueError("Missing Redis URL or token in .env file")
-            
-        # Connect to Redis
-        r = redis.Redis(
-            host=url.replace('https://', '').split(':')[0],
-            port=6379,
-            password=token,
-            ssl=True,
-            ssl_cert_reqs=None
-        )
+        r = clients.get_redis()
         
         # Test connection
         if not r.ping():
@@ -37,95 +75,268 @@ def setup_redis_client():
         print(f"❌ Error setting up Redis: {str(e)}")
         raise
 
+def build_search_index(chunks: List[Dict[str, Any]]) -> BM25Index:
+    """Build the in-memory BM25 index used by search_redis."""
+    global search_index, indexed_chunks
+    indexed_chunks = ChunkStore.from_chunks(chunks)
+    search_index = BM25Index.from_chunks(indexed_chunks)
+    return search_index
+
+def read_profile(file_path: str = "digitaltwin.json") -> Tuple[Dict[str, Any], BM25Index, str]:
+    """Load profile data with its BM25 index and content version.
+
+    If a fresh compiled artifact exists (see index_artifact.py) it is mmapped
+    instead, which skips both json.load and index building. Otherwise the
+    chunks are packed into a ChunkStore. Module state is left alone, so the
+    twin registry can load several profiles side by side.
+    """
+    artifact = open_artifact(file_path)
+    if artifact is not None:
+        print(f"✅ Using compiled index artifact {artifact.version}")
+        return artifact.profile_data(), artifact.search_index(), artifact.version
+
+    # Chunks are streamed into the ChunkStore (see chunk_stream.py), so the
+    # file is never held whole, as text or as parsed dicts
+    if file_path.lower().endswith(JSONL_SUFFIXES):
+        data = {"content_chunks": ChunkStore(iter_chunks(file_path))}
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = read_json_profile(f, pack=ChunkStore)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return data, BM25Index.from_chunks(data['content_chunks']), digest.hexdigest()[:16]
+
 def load_profile_data(file_path: str = "digitaltwin.json") -> Dict[str, Any]:
-    """Load profile data from JSON file."""
+    """Load profile data and build the module-level search index."""
+    global search_index, indexed_chunks
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            if 'content_chunks' not in data:
-                raise ValueError("No content_chunks found in profile data")
-            return data
+        data, search_index, _ = read_profile(file_path)
+        indexed_chunks = data['content_chunks']
+        return data
     except Exception as e:
         print(f"❌ Error loading profile data: {str(e)}")
         raise
 
-def initialize_redis_data(redis_client, profile_data: Dict[str, Any]):
-    """Initialize Redis with profile data if not already present."""
+def _hash_text(text: str) -> str:
+    """Return a stable content hash for change detection."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+def _serialize_chunk(position: int, chunk: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(chunk ID, stored JSON, content hash) for one chunk."""
+    serialized = json.dumps(chunk, sort_keys=True)
+    return str(chunk.get('id', f"chunk:{position}")), serialized, _hash_text(serialized)
+
+def _manifest_hash(hashes: Dict[str, str]) -> str:
+    return _hash_text("\n".join(f"{k}:{hashes[k]}" for k in sorted(hashes)))
+
+def initialize_redis_data(
+    redis_client,
+    profile_data: Dict[str, Any],
+    namespace: str = ""
+) -> Dict[str, int]:
+    """Sync profile data into Redis, rewriting only chunks that changed.
+
+    Each chunk is stored with a content hash, and the whole file with a
+    manifest hash. When the manifest matches, startup costs one round trip;
+    otherwise changed chunks are written and deleted chunks removed in a
+    single pipelined transaction. `namespace` selects a twin's keys.
+    """
+    keys = redis_keys(namespace)
     try:
-        # Check if data already exists
-        if redis_client.exists("digital_twin:initialized"):
-            print("✅ Redis already initialized with profile data")
-            return
-            
-        print("📝 Loading profile data into Redis...")
-        
-        # Store each content chunk
-        for i, chunk in enumerate(profile_data.get('content_chunks', [])):
-            chunk_id = f"chunk:{i}"
-            redis_client.hset(f"digital_twin:chunks", chunk_id, json.dumps(chunk))
-            
-        # Mark as initialized
-        redis_client.set("digital_twin:initialized", "true")
-        print(f"✅ Loaded {len(profile_data.get('content_chunks', []))} chunks into Redis")
+        chunks = profile_data.get('content_chunks', [])
+        serialized = {}
+        hashes = {}
+        for i, chunk in enumerate(chunks):
+            chunk_id, text, digest = _serialize_chunk(i, chunk)
+            serialized[chunk_id] = text
+            hashes[chunk_id] = digest
+        manifest = _manifest_hash(hashes)
+
+        # Read current state in one round trip
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(keys["manifest"])
+        pipe.hgetall(keys["hashes"])
+        pipe.hkeys(keys["chunks"])
+        stored_manifest, stored_hashes, stored_ids = pipe.execute()
+
+        if _decode(stored_manifest) == manifest:
+            print("✅ Redis already in sync with profile data")
+            stats = {"written": 0, "removed": 0, "unchanged": len(hashes)}
+        else:
+            stored_hashes = {_decode(k): _decode(v) for k, v in stored_hashes.items()}
+            changed = [cid for cid, h in hashes.items() if stored_hashes.get(cid) != h]
+            removed = ({_decode(k) for k in stored_ids} | set(stored_hashes)) - set(hashes)
+
+            print(f"📝 Syncing profile data into Redis ({len(changed)} changed, {len(removed)} removed)...")
+            pipe = redis_client.pipeline(transaction=True)
+            if changed:
+                pipe.hset(keys["chunks"], mapping={cid: serialized[cid] for cid in changed})
+                pipe.hset(keys["hashes"], mapping={cid: hashes[cid] for cid in changed})
+            if removed:
+                pipe.hdel(keys["chunks"], *removed)
+                pipe.hdel(keys["hashes"], *removed)
+            pipe.set(keys["manifest"], manifest)
+            pipe.set(keys["initialized"], "true")
+            pipe.execute()
+
+            stats = {
+                "written": len(changed),
+                "removed": len(removed),
+                "unchanged": len(hashes) - len(changed)
+            }
+            print(f"✅ Synced {len(hashes)} chunks into Redis")
+
+        return stats
         
     except Exception as e:
         print(f"❌ Error initializing Redis data: {str(e)}")
         raise
 
+async def stream_redis_data(
+    redis_client,
+    file_path: str,
+    batch_size: int = INGEST_BATCH_SIZE,
+    namespace: str = ""
+) -> Dict[str, int]:
+    """Sync a large profile or .jsonl corpus into Redis without loading it whole.
+
+    Chunks are read incrementally, and changed ones are written in pipelined
+    batches (one round trip each) by concurrent writers behind a bounded
+    queue. The manifest is written last, so an interrupted run is redone.
+    Uses the same keys and hashes as initialize_redis_data; `namespace`
+    selects a twin's keys.
+    """
+    keys = redis_keys(namespace)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(keys["manifest"])
+        pipe.hgetall(keys["hashes"])
+        stored_manifest, stored_hashes = await run_blocking(pipe.execute)
+        stored_hashes = {_decode(k): _decode(v) for k, v in stored_hashes.items()}
+
+        hashes: Dict[str, str] = {}
+        meter = Throughput()
+
+        def changed_chunks():
+            for i, chunk in enumerate(iter_chunks(file_path)):
+                chunk_id, serialized, digest = _serialize_chunk(i, chunk)
+                hashes[chunk_id] = digest
+                meter.add(1)
+                if stored_hashes.get(chunk_id) != digest:
+                    yield chunk_id, serialized, digest
+
+        def write_batch(batch) -> None:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hset(keys["chunks"], mapping={cid: serialized for cid, serialized, _ in batch})
+            pipe.hset(keys["hashes"], mapping={cid: digest for cid, _, digest in batch})
+            pipe.execute()
+
+        written = 0
+
+        async def sink(batch) -> None:
+            nonlocal written
+            await run_blocking(write_batch, batch)
+            written += len(batch)
+
+        print(f"📝 Streaming {file_path} into Redis...")
+        await ingest(batched(changed_chunks(), batch_size), sink)
+
+        removed = [cid for cid in stored_hashes if cid not in hashes]
+        manifest = _manifest_hash(hashes)
+        pipe = redis_client.pipeline(transaction=True)
+        for ids in batched(removed, batch_size):
+            pipe.hdel(keys["chunks"], *ids)
+            pipe.hdel(keys["hashes"], *ids)
+        if _decode(stored_manifest) != manifest:
+            pipe.set(keys["manifest"], manifest)
+        pipe.set(keys["initialized"], "true")
+        await run_blocking(pipe.execute)
+
+        print(f"✅ Streamed {meter}: {written} written, {len(removed)} removed")
+        return {"written": written, "removed": len(removed), "unchanged": len(hashes) - written}
+
+    except Exception as e:
+        print(f"❌ Error streaming data into Redis: {str(e)}")
+        raise
+
 def search_redis(redis_client, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-    """Search for relevant content chunks in Redis."""
+    """Search for relevant content chunks, ranked by BM25 relevance.
+
+    Uses the in-memory index built by load_profile_data(), so no Redis round
+    trips are made. When no index exists yet, the chunks are read from the
+    Redis hash once (hgetall) and indexed in memory for later searches.
+    """
     try:
-        # In a real implementation, you would use Redis Search or another
-        # search mechanism. For now, we'll do a simple keyword search.
-        results = []
-        for chunk_id in redis_client.hkeys("digital_twin:chunks"):
-            chunk = json.loads(redis_client.hget("digital_twin:chunks", chunk_id))
-            content = f"{chunk.get('title', '')} {chunk.get('content', '')}".lower()
-            if query.lower() in content:
-                results.append({
-                    "id": chunk_id.decode() if isinstance(chunk_id, bytes) else chunk_id,
-                    "score": 1.0,  # Simple match score
-                    "metadata": chunk
-                })
-        
-        # Sort by score (descending) and limit to top_k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:top_k]
+        if search_index is not None:
+            return [
+                {
+                    "id": search_index.doc_ids[doc],
+                    "score": score,
+                    "metadata": indexed_chunks[doc]
+                }
+                for doc, score in search_index.search(query, top_k)
+            ]
+
+        # No local index: load the chunks once and index them
+        chunks = [
+            json.loads(value)
+            for _, value in sorted(redis_client.hgetall(CHUNKS_KEY).items())
+        ]
+        if not chunks:
+            return []
+        build_search_index(chunks)
+        return search_redis(redis_client, query, top_k)
         
     except Exception as e:
         print(f"❌ Error searching Redis: {str(e)}")
         raise
 
 def setup_groq_client():
-    """Initialize and return a Groq client."""
+    """Return the shared Groq client behind the rate-limited gateway."""
     try:
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key or api_key == 'your_groq_api_key':
-            print("⚠️  GROQ_API_KEY not set or using default value")
-            return None
-        return Groq(api_key=api_key)
+        return clients.get_groq()
     except Exception as e:
         print(f"❌ Error setting up Groq client: {str(e)}")
         return None
 
+def setup_async_groq_client():
+    """Return the shared AsyncGroq client for the servers.
+
+    The client is wrapped in AsyncLLMGateway, so identical concurrent
+    prompts share one completion and calls respect the Groq quotas.
+    """
+    try:
+        return clients.get_async_groq()
+    except Exception as e:
+        print(f"❌ Error setting up async Groq client: {str(e)}")
+        return None
+
+def _build_messages(query: str, context: str) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful assistant that answers questions based on the provided context."
+        },
+        {
+            "role": "user",
+            "content": f"Context: {context}\n\nQuestion: {query}\n\nAnswer:"
+        }
+    ]
+
 def generate_response(groq_client: Optional[Groq], query: str, context: str) -> str:
     """Generate a response using Groq's language model."""
     if not groq_client:
-        return "I'm sorry, I couldn't process your request. The AI service is not configured."
+        return NOT_CONFIGURED_RESPONSE
     
     try:
         chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that answers questions based on the provided context."
-                },
-                {
-                    "role": "user",
-                    "content": f"Context: {context}\n\nQuestion: {query}\n\nAnswer:"
-                }
-            ],
-            model="mixtral-8x7b-32768",
+            messages=_build_messages(query, context),
+            model=GROQ_MODEL,
             temperature=0.7,
             max_tokens=1024,
             top_p=1
@@ -133,7 +344,63 @@ def generate_response(groq_client: Optional[Groq], query: str, context: str) ->
         return chat_completion.choices[0].message.content
     except Exception as e:
         print(f"❌ Error generating response: {str(e)}")
-        return "I'm sorry, I encountered an error while processing your request."
+        return ERROR_RESPONSE
+
+async def generate_response_async(groq_client: Optional[AsyncGroq], query: str, context: str) -> str:
+    """Generate a response with AsyncGroq, bounded by GENERATION_TIMEOUT."""
+    if not groq_client:
+        return NOT_CONFIGURED_RESPONSE
+
+    try:
+        chat_completion = await with_timeout(
+            groq_client.chat.completions.create(
+                messages=_build_messages(query, context),
+                model=GROQ_MODEL,
+                temperature=0.7,
+                max_tokens=1024,
+                top_p=1
+            ),
+            GENERATION_TIMEOUT,
+            "generation"
+        )
+        return chat_completion.choices[0].message.content
+    except StageTimeoutError as e:
+        print(f"❌ Error generating response: {str(e)}")
+        return TIMEOUT_RESPONSE
+    except Exception as e:
+        print(f"❌ Error generating response: {str(e)}")
+        return ERROR_RESPONSE
+
+async def generate_response_stream(groq_client: Optional[AsyncGroq], query: str, context: str) -> AsyncIterator[str]:
+    """Stream response tokens from AsyncGroq as they are generated.
+
+    GENERATION_TIMEOUT bounds the wait for the first token and for each
+    following token, rather than the whole completion.
+    """
+    if not groq_client:
+        yield NOT_CONFIGURED_RESPONSE
+        return
+
+    try:
+        stream = await with_timeout(
+            groq_client.chat.completions.create(
+                messages=_build_messages(query, context),
+                model=GROQ_MODEL,
+                temperature=0.7,
+                max_tokens=1024,
+                top_p=1,
+                stream=True
+            ),
+            GENERATION_TIMEOUT,
+            "generation"
+        )
+        async for chunk in iterate_with_timeout(stream, GENERATION_TIMEOUT, "generation"):
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                yield token
+    except Exception as e:
+        print(f"❌ Error streaming response: {str(e)}")
+        raise
 
 def main():
     """Main function to test the RAG functionality."""
@@ -163,7 +430,7 @@ def main():
                 continue
                 
             # Generate response
-            context = "\n\n".join([r["metadata"].get("content", "") for r in results])
+            context = pack_context(query, results, GROQ_MODEL).text
             response = generate_response(groq_client, query, context)
             
             print("\n" + "="*50)
@@ -1,111 +1,276 @@
 """
 Embed Digital Twin profile data into Upstash Vector database
+
+Syncs incrementally and without prompts: each chunk's enriched text and
+metadata are hashed and compared with a local manifest of what was last
+uploaded, so only new or changed chunks are re-embedded and chunks that
+disappeared from the profile are deleted. Upload batches run concurrently
+with retry and exponential backoff. Each digitaltwin*.json variant syncs
+into its own namespace (digitaltwin.json uses the default namespace).
+Chunks are streamed from disk (see chunk_stream.py), so large profiles and
+.jsonl corpora sync in flat memory.
+
+    python embed_profile.py                      # sync digitaltwin.json
+    python embed_profile.py --all                # sync every digitaltwin*.json
+    python embed_profile.py digitaltwin_backup.json --dry-run
+    python embed_profile.py --full               # reset namespace, re-embed all
 """
 import os
+import sys
+import glob
 import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+
 from dotenv import load_dotenv
-from upstash_vector import Index
+
+import clients
+from chunk_stream import Throughput, batched, ingest, iter_chunks
+from local_vectors import chunk_embedding_text, chunk_vector_metadata
+from namespaces import namespace_for
+from retrieval_cache import RETRIEVAL_CACHE_REDIS_URL, bump_index_version
 
 # Load environment variables
 load_dotenv()
 
-def main():
-    print("🤖 Digital Twin Embedding Script")
-    print("=" * 50)
-    
-    # Initialize Upstash Vector
+DEFAULT_PROFILE = "digitaltwin.json"
+MANIFEST_FILE = os.getenv("EMBED_MANIFEST", os.path.join("index", "embed_manifest.json"))
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "0.5"))
+# Seconds between manifest checkpoints during a sync
+MANIFEST_SAVE_INTERVAL = float(os.getenv("EMBED_MANIFEST_SAVE_INTERVAL", "5"))
+
+VectorEntry = Tuple[str, str, Dict[str, Any]]
+
+
+def enrich_chunks(content_chunks: Iterable[Dict[str, Any]]) -> Iterator[VectorEntry]:
+    """(id, enriched text, metadata) for each chunk, produced lazily."""
+    for chunk in content_chunks:
+        chunk_id = str(chunk['id'])
+        yield chunk_id, chunk_embedding_text(chunk), chunk_vector_metadata(chunk)
+
+
+def vector_hash(entry: VectorEntry) -> str:
+    """Content hash of what gets embedded and stored for a chunk."""
+    _, text, metadata = entry
+    payload = json.dumps([text, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_manifest(path: str = MANIFEST_FILE) -> Dict[str, Any]:
+    """Manifest entries keyed by namespace ("" is the default namespace)."""
     try:
-        index = Index.from_env()
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"namespaces": {}}
+
+    # Older manifests keyed the default namespace as "default"
+    namespaces = manifest.setdefault("namespaces", {})
+    legacy = namespaces.get("default")
+    if legacy is not None and "" not in namespaces and namespace_for(legacy.get("source", "")) == "":
+        namespaces[""] = namespaces.pop("default")
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Any], path: str = MANIFEST_FILE) -> None:
+    """Write the manifest atomically so an interrupted run can't corrupt it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+async def with_retries(operation, description: str, retries: int = MAX_RETRIES, base_delay: float = BACKOFF_BASE):
+    """Await operation(), retrying with exponential backoff and full jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = random.uniform(0, base_delay * (2 ** attempt))
+            print(f"  ⚠️  {description} failed ({str(e)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def sync_profile(
+    index,
+    profile_path: str,
+    manifest: Dict[str, Any],
+    namespace: Optional[str] = None,
+    full: bool = False,
+    dry_run: bool = False,
+    batch_size: int = BATCH_SIZE,
+    concurrency: int = CONCURRENCY,
+    manifest_path: str = MANIFEST_FILE
+) -> Dict[str, int]:
+    """Bring one namespace in line with a profile or .jsonl chunk file.
+
+    Chunks are streamed from disk, enriched lazily and uploaded through a
+    bounded queue, so memory stays flat regardless of corpus size. The
+    manifest is saved periodically and at the end, so a failed run resumes
+    close to where it stopped.
+    """
+    namespace = namespace_for(profile_path) if namespace is None else namespace
+    label = namespace or "default"
+    print(f"\n📝 Streaming {profile_path} → namespace '{label}'...")
+
+    index_url = os.getenv("UPSTASH_VECTOR_REST_URL", "")
+    entry = manifest.setdefault("namespaces", {}).get(namespace)
+    if entry is None or entry.get("index") != index_url or full:
+        # Unknown state (first run, different index, or forced): start clean
+        previous: Dict[str, str] = {}
+    else:
+        previous = dict(entry.get("chunks", {}))
+
+    seen: Set[str] = set()
+    meter = Throughput()
+
+    def changed_entries() -> Iterator[Tuple[VectorEntry, str]]:
+        for vector in enrich_chunks(iter_chunks(profile_path)):
+            meter.add(1)
+            if vector[0] in seen:
+                print(f"⚠️  Duplicate chunk id '{vector[0]}', keeping the first one")
+                continue
+            seen.add(vector[0])
+            digest = vector_hash(vector)
+            if previous.get(vector[0]) != digest:
+                yield vector, digest
+
+    if dry_run:
+        changed = [vector[0] for vector, _ in changed_entries()]
+        removed = [doc_id for doc_id in previous if doc_id not in seen]
+        for doc_id in changed:
+            print(f"  + {doc_id}")
+        for doc_id in removed:
+            print(f"  - {doc_id}")
+        print(f"✅ Read {meter}")
+        return {"upserted": len(changed), "deleted": len(removed), "unchanged": len(seen) - len(changed)}
+
+    synced = dict(previous)
+    manifest["namespaces"][namespace] = {"index": index_url, "source": profile_path, "chunks": synced}
+
+    if full:
+        print(f"🗑️  Resetting namespace '{label}'...")
+        await with_retries(lambda: index.reset(namespace=namespace), "reset")
+        save_manifest(manifest, manifest_path)
+
+    last_save = time.monotonic()
+    upserted = 0
+
+    def checkpoint() -> None:
+        nonlocal last_save
+        if time.monotonic() - last_save >= MANIFEST_SAVE_INTERVAL:
+            save_manifest(manifest, manifest_path)
+            last_save = time.monotonic()
+
+    async def upsert_batch(batch: List[Tuple[VectorEntry, str]]) -> None:
+        nonlocal upserted
+        vectors = [vector for vector, _ in batch]
+        await with_retries(lambda: index.upsert(vectors=vectors, namespace=namespace), "upsert batch")
+        synced.update((vector[0], digest) for vector, digest in batch)
+        upserted += len(batch)
+        checkpoint()
+        print(f"  ✓ Uploaded {len(batch)} vectors ({upserted} so far)")
+
+    try:
+        await ingest(batched(changed_entries(), batch_size), upsert_batch, workers=concurrency)
+
+        removed = [doc_id for doc_id in previous if doc_id not in seen]
+
+        async def delete_batch(ids: List[str]) -> None:
+            await with_retries(lambda: index.delete(ids=ids, namespace=namespace), "delete")
+            for doc_id in ids:
+                synced.pop(doc_id, None)
+            checkpoint()
+            print(f"  ✓ Deleted {len(ids)} vectors")
+
+        await ingest(batched(removed, batch_size), delete_batch, workers=concurrency)
+    finally:
+        save_manifest(manifest, manifest_path)
+
+    print(f"✅ Read {meter}")
+    if upserted or removed or full:
+        announce_reembed(namespace)
+    return {"upserted": upserted, "deleted": len(removed), "unchanged": len(seen) - upserted}
+
+
+def announce_reembed(namespace: str) -> None:
+    """Bump the namespace's index version so servers drop cached retrieval results."""
+    try:
+        version = bump_index_version(clients.get_redis(RETRIEVAL_CACHE_REDIS_URL), namespace)
+        print(f"📝 Index version for namespace '{namespace or 'default'}' is now {version}")
+    except Exception as e:
+        print(f"⚠️  Could not bump the index version (cached retrieval expires with its TTL): {str(e)}")
+
+
+def find_profiles() -> List[str]:
+    return sorted(glob.glob("digitaltwin*.json"))
+
+
+async def run(args: argparse.Namespace) -> int:
+    profiles = find_profiles() if args.all else (args.profiles or [DEFAULT_PROFILE])
+    if args.namespace is not None and len(profiles) > 1:
+        print("❌ --namespace can only be used with a single profile")
+        return 2
+
+    index = None
+    if not args.dry_run:
+        index = clients.get_async_vector_index()
         print("✅ Connected to Upstash Vector successfully!")
-        
-        # Check current vector count
-        info = index.info()
-        current_count = getattr(info, 'vector_count', 0)
-        print(f"📊 Current vectors in database: {current_count}")
-        
-        # Ask user if they want to reset
-        if current_count > 0:
-            reset = input(f"\n⚠️  Database has {current_count} vectors. Reset and re-embed? (yes/no): ")
-            if reset.lower() == 'yes':
-                print("🗑️  Resetting database...")
-                index.reset()
-                print("✅ Database reset complete!")
-        
-        # Load profile data
-        print("\n📝 Loading digitaltwin.json...")
-        with open("digitaltwin.json", "r", encoding="utf-8") as f:
-            profile_data = json.load(f)
-        
-        content_chunks = profile_data.get('content_chunks', [])
-        if not content_chunks:
-            print("❌ No content chunks found in profile data!")
-            return
-        
-        print(f"✅ Loaded {len(content_chunks)} content chunks")
-        
-        # Prepare vectors for upload
-        print("\n🔄 Preparing vectors for upload...")
-        vectors = []
-        
-        for chunk in content_chunks:
-            # Create enriched text for better semantic search
-            title = chunk.get('title', '')
-            content = chunk.get('content', '')
-            chunk_type = chunk.get('type', '')
-            
-            # Combine title and content for embedding
-            enriched_text = f"{title}: {content}"
-            
-            # Create vector entry
-            vectors.append((
-                chunk['id'],
-                enriched_text,
-                {
-                    "title": title,
-                    "content": content,
-                    "type": chunk_type,
-                    "category": chunk.get('metadata', {}).get('category', ''),
-                    "tags": str(chunk.get('metadata', {}).get('tags', []))
-                }
-            ))
-        
-        # Upload vectors in batches
-        print(f"\n📤 Uploading {len(vectors)} vectors to Upstash...")
-        batch_size = 100
-        
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i+batch_size]
-            index.upsert(vectors=batch)
-            print(f"  ✓ Uploaded batch {i//batch_size + 1} ({len(batch)} vectors)")
-        
-        print(f"\n✅ Successfully embedded {len(vectors)} content chunks!")
-        
-        # Verify upload
-        info = index.info()
-        final_count = getattr(info, 'vector_count', 0)
-        print(f"📊 Final vector count: {final_count}")
-        
-        # Test search
-        print("\n🔍 Testing semantic search...")
-        test_query = "What are the technical skills?"
-        results = index.query(
-            data=test_query,
-            top_k=3,
-            include_metadata=True
-        )
-        
-        print(f"\nTest Query: '{test_query}'")
-        print(f"Found {len(results)} results:")
-        for i, result in enumerate(results, 1):
-            print(f"\n  {i}. {result.metadata.get('title', 'Unknown')} (Score: {result.score:.3f})")
-            print(f"     {result.metadata.get('content', '')[:100]}...")
-        
+
+    manifest = load_manifest(args.manifest)
+    failed = False
+    for profile_path in profiles:
+        try:
+            stats = await sync_profile(
+                index, profile_path, manifest,
+                namespace=args.namespace,
+                full=args.full,
+                dry_run=args.dry_run,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                manifest_path=args.manifest
+            )
+            verb = "Would sync" if args.dry_run else "Synced"
+            print(f"✅ {verb} {profile_path}: {stats['upserted']} upserted, "
+                  f"{stats['deleted']} deleted, {stats['unchanged']} unchanged")
+        except Exception as e:
+            failed = True
+            print(f"\n❌ Error syncing {profile_path}: {str(e)}")
+
+    if not args.dry_run and not failed:
+        info = await index.info()
+        print(f"\n📊 Final vector count: {getattr(info, 'vector_count', 0)}")
         print("\n🎉 Embedding complete! Your Digital Twin is ready!")
-        
-    except Exception as e:
-        print(f"\n❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    print("🤖 Digital Twin Embedding Script")
+    print("=" * 50)
+
+    parser = argparse.ArgumentParser(description="Incrementally sync profile chunks into Upstash Vector")
+    parser.add_argument("profiles", nargs="*", help=f"profile JSON files (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--all", action="store_true", help="sync every digitaltwin*.json in the current directory")
+    parser.add_argument("--namespace", help="override the namespace derived from the file name")
+    parser.add_argument("--full", action="store_true", help="reset the namespace and re-embed every chunk")
+    parser.add_argument("--dry-run", action="store_true", help="show what would change without uploading")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="local manifest of uploaded chunk hashes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    return asyncio.run(run(args))
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,450 @@
+"""
+Compiled, memory-mapped index artifact for Digital Twin profiles
+
+`python index_artifact.py compile digitaltwin.json` turns content_chunks into
+one binary file holding a chunk-text blob with offsets, per-chunk metadata
+rows with offsets, the BM25 postings and the local vector matrix. Servers mmap the file read-only,
+so cold start skips json.load and index building, and every worker shares
+the same pages through the OS page cache.
+
+Artifacts are versioned by content hash. A small "<stem>.current" pointer
+file names the live version and is replaced atomically, so a new artifact
+can be swapped in while servers are running.
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import numpy as np
+
+from bm25_index import BM25Index, bm25_idf
+from chunk_store import MappedSequence
+from local_vectors import (
+    LocalVectorStore,
+    HashingVectorizer,
+    chunk_vector_metadata,
+    DEFAULT_DIM
+)
+
+MAGIC = b"DTIDX002"
+ALIGNMENT = 64
+ARTIFACT_SUFFIX = ".dtidx"
+KEEP_VERSIONS = 2
+
+
+def default_index_dir(json_path: str) -> str:
+    """Artifacts live in an index/ directory next to the profile JSON."""
+    return os.getenv(
+        "DIGITAL_TWIN_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(json_path)), "index")
+    )
+
+
+def _stem(json_path: str) -> str:
+    return os.path.splitext(os.path.basename(json_path))[0]
+
+
+def pointer_path(json_path: str, index_dir: Optional[str] = None) -> str:
+    return os.path.join(index_dir or default_index_dir(json_path), f"{_stem(json_path)}.current")
+
+
+def content_version(raw: bytes, dim: int) -> str:
+    """Artifact version: hash of the profile file's bytes and the vector dimension."""
+    return hashlib.sha256(raw + f"|dim={dim}".encode()).hexdigest()[:16]
+
+
+def _offsets(blobs: List[bytes]) -> np.ndarray:
+    """Start offsets of each blob in their concatenation, plus the total length."""
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    return offsets
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------------------
+# Compile
+# ---------------------------------------------------------------------------
+
+def compile_artifact(json_path: str, index_dir: Optional[str] = None, dim: int = DEFAULT_DIM) -> str:
+    """Compile json_path into a versioned artifact and make it current."""
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    profile = json.loads(raw)
+    chunks = profile.get('content_chunks', [])
+    if not chunks:
+        raise ValueError("No content_chunks found in profile data")
+
+    version = content_version(raw, dim)
+    index_dir = index_dir or default_index_dir(json_path)
+    os.makedirs(index_dir, exist_ok=True)
+    file_name = f"{_stem(json_path)}-{version}{ARTIFACT_SUFFIX}"
+    artifact_path = os.path.join(index_dir, file_name)
+
+    # Chunk text blob and offsets
+    encoded = [c.get('content', '').encode('utf-8') for c in chunks]
+    text_offsets = _offsets(encoded)
+
+    # Metadata rows (everything except the content text), one JSON document per
+    # chunk so a row is decoded only when its chunk is read
+    rows = [json.dumps({k: v for k, v in c.items() if k != 'content'}).encode('utf-8') for c in chunks]
+    metadata_offsets = _offsets(rows)
+
+    # BM25 postings, flattened into term-ordered arrays
+    bm25 = BM25Index.from_chunks(chunks)
+    terms = sorted(bm25.postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(bm25.postings[t][0]) for t in terms], out=term_offsets[1:])
+    post_docs = np.fromiter(
+        (d for t in terms for d in bm25.postings[t][0]), dtype=np.int32, count=int(term_offsets[-1])
+    )
+    post_tfs = np.fromiter(
+        (f for t in terms for f in bm25.postings[t][1]), dtype=np.int32, count=int(term_offsets[-1])
+    )
+
+    # Vector matrix
+    store = LocalVectorStore.from_chunks(chunks, dim)
+
+    sections = {
+        "text": b"".join(encoded),
+        "text_offsets": text_offsets,
+        "metadata": b"".join(rows),
+        "metadata_offsets": metadata_offsets,
+        "terms": json.dumps(terms).encode('utf-8'),
+        "term_offsets": term_offsets,
+        "post_docs": post_docs,
+        "post_tfs": post_tfs,
+        "doc_lengths": np.array(bm25.doc_lengths, dtype=np.int32),
+        "vectors": store.matrix,
+        "vector_idf": store.vectorizer.idf.astype(np.float32),
+    }
+
+    source_stat = os.stat(json_path)
+    header = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": os.path.basename(json_path),
+        "source_size": source_stat.st_size,
+        "source_mtime_ns": source_stat.st_mtime_ns,
+        "profile": {k: v for k, v in profile.items() if k != 'content_chunks'},
+        "doc_ids": bm25.doc_ids,
+        "bm25": {"k1": bm25.k1, "b": bm25.b},
+        "sections": {},
+    }
+
+    # Lay sections out on aligned offsets after the (padded) header
+    payload = []
+    offset = 0
+    for name, value in sections.items():
+        data = value.tobytes() if isinstance(value, np.ndarray) else value
+        padding = (-offset) % ALIGNMENT
+        payload.append(b"\0" * padding + data)
+        offset += padding
+        header["sections"][name] = {
+            "offset": offset,
+            "length": len(data),
+            "dtype": str(value.dtype) if isinstance(value, np.ndarray) else "bytes",
+            "shape": list(value.shape) if isinstance(value, np.ndarray) else [len(data)],
+        }
+        offset += len(data)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    base = len(MAGIC) + 4 + len(header_bytes)
+    base += (-base) % ALIGNMENT
+    prefix = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+    prefix += b"\0" * (base - len(prefix))
+
+    _atomic_write(artifact_path, prefix + b"".join(payload))
+    _atomic_write(pointer_path(json_path, index_dir), file_name.encode('utf-8'))
+    _prune_versions(json_path, index_dir, keep=file_name)
+    return artifact_path
+
+
+def _prune_versions(json_path: str, index_dir: str, keep: str) -> None:
+    """Remove all but the most recent artifacts for this profile."""
+    prefix = f"{_stem(json_path)}-"
+    versions = sorted(
+        (f for f in os.listdir(index_dir) if f.startswith(prefix) and f.endswith(ARTIFACT_SUFFIX) and f != keep),
+        key=lambda f: os.path.getmtime(os.path.join(index_dir, f)),
+        reverse=True
+    )
+    for stale in versions[KEEP_VERSIONS - 1:]:
+        try:
+            os.remove(os.path.join(index_dir, stale))
+        except OSError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Load
+# ---------------------------------------------------------------------------
+
+class _ArtifactPostings:
+    """Mapping of term -> (doc indices, term freqs), sliced from the mmap on lookup."""
+
+    def __init__(self, term_ids: Dict[str, int], offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        self._term_ids = term_ids
+        self._offsets = offsets
+        self._docs = docs
+        self._tfs = tfs
+
+    def get(self, term: str, default=None) -> Optional[Tuple[List[int], List[int]]]:
+        idx = self._term_ids.get(term)
+        if idx is None:
+            return default
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return self._docs[start:end].tolist(), self._tfs[start:end].tolist()
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._term_ids
+
+    def __len__(self) -> int:
+        return len(self._term_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._term_ids)
+
+    def items(self):
+        return ((term, self.get(term)) for term in self._term_ids)
+
+
+class _ArtifactIdf:
+    """Mapping of term -> BM25 idf, computed from the term's posting count on lookup."""
+
+    def __init__(self, term_ids: Dict[str, int], offsets: np.ndarray, total: int):
+        self._term_ids = term_ids
+        self._offsets = offsets
+        self._total = total
+
+    def __getitem__(self, term: str) -> float:
+        idx = self._term_ids[term]
+        return bm25_idf(self._total, int(self._offsets[idx + 1] - self._offsets[idx]))
+
+    def get(self, term: str, default=None) -> Optional[float]:
+        return self[term] if term in self._term_ids else default
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._term_ids
+
+    def __len__(self) -> int:
+        return len(self._term_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._term_ids)
+
+
+class IndexArtifact:
+    """A read-only, memory-mapped view of a compiled artifact.
+
+    Close it (or use it as a context manager) to unmap the file; chunks,
+    indexes and arrays obtained from it must not be used afterwards.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            # Includes artifacts in an older layout; recompile them
+            raise ValueError(f"Not a Digital Twin index artifact (or an older format): {path}")
+        (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[start:start + header_len])
+        self._base = start + header_len + (-(start + header_len)) % ALIGNMENT
+
+        self.version: str = self.header["version"]
+        self.doc_ids: List[str] = self.header["doc_ids"]
+        self._text_offsets = self._array("text_offsets")
+        self._metadata_offsets = self._array("metadata_offsets")
+        self.chunks = MappedSequence(len(self.doc_ids), self.chunk)
+        self._search_index: Optional[BM25Index] = None
+        self._vector_store: Optional[LocalVectorStore] = None
+        # Source (size, mtime_ns) last confirmed to match by content hash
+        self._verified_stat: Optional[Tuple[int, int]] = None
+
+    def __enter__(self) -> "IndexArtifact":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Drop the views into the mapping and unmap the file."""
+        self._search_index = None
+        self._vector_store = None
+        self._text_offsets = self._metadata_offsets = None
+        if not self._mmap.closed:
+            self._mmap.close()
+
+    def _section(self, name: str) -> Dict[str, Any]:
+        return self.header["sections"][name]
+
+    def _bytes(self, name: str) -> bytes:
+        section = self._section(name)
+        start = self._base + section["offset"]
+        return self._mmap[start:start + section["length"]]
+
+    def _array(self, name: str) -> np.ndarray:
+        section = self._section(name)
+        array = np.frombuffer(
+            self._mmap,
+            dtype=np.dtype(section["dtype"]),
+            count=int(np.prod(section["shape"])),
+            offset=self._base + section["offset"]
+        )
+        return array.reshape(section["shape"])
+
+    def is_fresh(self, json_path: str) -> bool:
+        """True if json_path's content is what this artifact was compiled from.
+
+        The file is only hashed when its size or mtime differ from the
+        compiled source's, so a checkout, copy or touch that leaves the
+        content alone keeps the artifact in use.
+        """
+        try:
+            stat = os.stat(json_path)
+        except OSError:
+            return True
+        current = (stat.st_size, stat.st_mtime_ns)
+        if current in ((self.header["source_size"], self.header["source_mtime_ns"]), self._verified_stat):
+            return True
+        if stat.st_size != self.header["source_size"]:
+            return False
+        try:
+            with open(json_path, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return False
+        if content_version(raw, self._section("vector_idf")["shape"][0]) != self.version:
+            return False
+        self._verified_stat = current
+        return True
+
+    def _item(self, name: str, offsets: np.ndarray, index: int) -> bytes:
+        start = self._base + self._section(name)["offset"]
+        a, b = offsets[index], offsets[index + 1]
+        return self._mmap[start + a:start + b]
+
+    def chunk_text(self, index: int) -> str:
+        return self._item("text", self._text_offsets, index).decode('utf-8')
+
+    def chunk(self, index: int) -> Dict[str, Any]:
+        """Rebuild a content chunk dict, decoding its metadata row and text from the blobs."""
+        row = json.loads(self._item("metadata", self._metadata_offsets, index))
+        row['content'] = self.chunk_text(index)
+        return row
+
+    def profile_data(self) -> Dict[str, Any]:
+        """Profile data shaped like load_profile_data()'s JSON result."""
+        return {**self.header["profile"], "content_chunks": self.chunks}
+
+    def search_index(self) -> BM25Index:
+        """BM25 index backed by the mmapped postings."""
+        if self._search_index is None:
+            terms = json.loads(self._bytes("terms"))
+            term_ids = {term: i for i, term in enumerate(terms)}
+            term_offsets = self._array("term_offsets")
+            postings = _ArtifactPostings(term_ids, term_offsets, self._array("post_docs"), self._array("post_tfs"))
+            self._search_index = BM25Index(
+                self.doc_ids,
+                self._array("doc_lengths").tolist(),
+                postings,
+                idf=_ArtifactIdf(term_ids, term_offsets, len(self.doc_ids)),
+                **self.header["bm25"]
+            )
+        return self._search_index
+
+    def vector_store(self) -> LocalVectorStore:
+        """Local vector store backed by the mmapped matrix."""
+        if self._vector_store is None:
+            idf = self._array("vector_idf")
+            self._vector_store = LocalVectorStore(
+                self.doc_ids,
+                MappedSequence(len(self.doc_ids), lambda i: chunk_vector_metadata(self.chunk(i))),
+                self._array("vectors"),
+                HashingVectorizer(idf.shape[0], idf)
+            )
+        return self._vector_store
+
+
+def current_artifact_path(json_path: str, index_dir: Optional[str] = None) -> Optional[str]:
+    """Resolve the live artifact for json_path through its pointer file."""
+    pointer = pointer_path(json_path, index_dir)
+    try:
+        with open(pointer, 'r', encoding='utf-8') as f:
+            file_name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(os.path.dirname(pointer), file_name)
+    return path if os.path.exists(path) else None
+
+
+def open_artifact(json_path: str, index_dir: Optional[str] = None) -> Optional[IndexArtifact]:
+    """Open the current artifact for json_path if one exists and is fresh."""
+    path = current_artifact_path(json_path, index_dir)
+    if not path:
+        return None
+    try:
+        artifact = IndexArtifact(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring unreadable index artifact {path}: {str(e)}")
+        return None
+    if not artifact.is_fresh(json_path):
+        print(f"⚠️  Index artifact {artifact.version} is older than {json_path}; re-run the compile step")
+        artifact.close()
+        return None
+    return artifact
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile or inspect Digital Twin index artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = subparsers.add_parser("compile", help="compile a profile JSON into an artifact")
+    compile_parser.add_argument("json_files", nargs="+")
+    compile_parser.add_argument("--index-dir", default=None)
+    compile_parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+
+    info_parser = subparsers.add_parser("info", help="show the current artifact for a profile")
+    info_parser.add_argument("json_file")
+    info_parser.add_argument("--index-dir", default=None)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        for json_file in args.json_files:
+            path = compile_artifact(json_file, args.index_dir, args.dim)
+            print(f"✅ Compiled {json_file} -> {path} ({os.path.getsize(path)} bytes)")
+        return 0
+
+    path = current_artifact_path(args.json_file, args.index_dir)
+    if not path:
+        print(f"❌ No compiled artifact for {args.json_file}")
+        return 1
+    with IndexArtifact(path) as artifact:
+        print(f"📦 {path}")
+        print(f"   version:  {artifact.version}")
+        print(f"   created:  {artifact.header['created_at']}")
+        print(f"   chunks:   {len(artifact.doc_ids)}")
+        print(f"   fresh:    {artifact.is_fresh(args.json_file)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
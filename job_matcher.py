@@ -0,0 +1,235 @@
+"""
+Job posting match scoring against the Digital Twin profile
+
+Parses Markdown job postings (see job-postings/) into essential and
+desirable criteria, embeds every criterion of every posting in one batch,
+and scores them against all profile chunks with a single similarity matrix.
+Each criterion gets its best evidence chunks; each posting gets an overall
+fit score weighted towards essential criteria.
+
+    python job_matcher.py job-postings/ --profile digitaltwin.json --details
+"""
+
+import os
+import re
+import sys
+import json
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from async_utils import run_blocking
+from local_vectors import LocalVectorStore
+
+JOB_POSTINGS_DIR = os.getenv("JOB_POSTINGS_DIR", "job-postings")
+# Cosine similarity at which a criterion counts as met
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", "0.12"))
+# Similarity treated as full coverage when scoring a criterion
+MATCH_FULL_SCORE = float(os.getenv("MATCH_FULL_SCORE", "0.3"))
+ESSENTIAL_WEIGHT = 0.75
+EVIDENCE_PER_CRITERION = 2
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(.*)$")
+_ESSENTIAL = re.compile(r"essential|required|requirements|must[- ]have|qualifications", re.IGNORECASE)
+_DESIRABLE = re.compile(r"desirable|nice[- ]to[- ]have|preferred|bonus|plus", re.IGNORECASE)
+_EMPHASIS = re.compile(r"[*_`]+")
+
+
+@dataclass
+class JobPosting:
+    """A job posting reduced to its criteria."""
+    id: str
+    title: str
+    essential: List[str] = field(default_factory=list)
+    desirable: List[str] = field(default_factory=list)
+    source: str = ""
+
+
+def parse_posting(text: str, posting_id: str = "posting", source: str = "") -> JobPosting:
+    """Extract the title and bulleted essential/desirable criteria from Markdown."""
+    posting = JobPosting(id=posting_id, title=posting_id, source=source)
+    target: Optional[List[str]] = None
+    for line in text.splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            label = _EMPHASIS.sub("", heading.group(2)).strip()
+            if len(heading.group(1)) == 1 and posting.title == posting_id:
+                posting.title = label
+                target = None
+            elif _DESIRABLE.search(label):
+                target = posting.desirable
+            elif _ESSENTIAL.search(label):
+                target = posting.essential
+            else:
+                target = None
+            continue
+        bullet = _BULLET.match(line)
+        if target is not None and bullet:
+            criterion = _EMPHASIS.sub("", bullet.group(1)).strip()
+            if criterion:
+                target.append(criterion)
+    return posting
+
+
+def load_posting(path: str) -> JobPosting:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_posting(f.read(), os.path.splitext(os.path.basename(path))[0], path)
+
+
+def find_postings(paths: Sequence[str]) -> List[str]:
+    """Markdown files as given, plus every .md file under given directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".md")
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+class JobMatcher:
+    """Scores postings against profile chunks held in a LocalVectorStore."""
+
+    def __init__(
+        self,
+        store: LocalVectorStore,
+        threshold: float = MATCH_THRESHOLD,
+        full_score: float = MATCH_FULL_SCORE,
+        evidence: int = EVIDENCE_PER_CRITERION
+    ):
+        self.store = store
+        self.threshold = threshold
+        self.full_score = full_score
+        self.evidence = evidence
+
+    @classmethod
+    def from_profile(cls, json_path: str = "digitaltwin.json", **kwargs) -> "JobMatcher":
+        from retrieval import load_local_dense
+        return cls(load_local_dense(json_path), **kwargs)
+
+    def score(self, postings: Sequence[JobPosting]) -> List[Dict[str, Any]]:
+        """Score every criterion of every posting in one matrix product.
+
+        Returns one result per posting, best fit first.
+        """
+        criteria = [
+            (p, kind, text)
+            for p in postings
+            for kind, items in (("essential", p.essential), ("desirable", p.desirable))
+            for text in items
+        ]
+        results = {p.id: self._empty_result(p) for p in postings}
+        if not criteria or not self.store.ids:
+            for result in results.values():
+                self._summarize(result)
+            return list(results.values())
+
+        # (criteria x chunks) cosine similarities
+        similarity = self.store.vectorizer.transform([text for _, _, text in criteria]) @ self.store.matrix.T
+        k = min(self.evidence, similarity.shape[1])
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        best = similarity.max(axis=1)
+        coverage = np.clip(best / self.full_score, 0.0, 1.0)
+
+        for row, (posting, kind, text) in enumerate(criteria):
+            ordered = top[row][np.argsort(-similarity[row, top[row]])]
+            results[posting.id]["criteria"].append({
+                "criterion": text,
+                "kind": kind,
+                "score": round(float(best[row]), 4),
+                "met": bool(best[row] >= self.threshold),
+                "coverage": float(coverage[row]),
+                "evidence": [
+                    {
+                        "id": self.store.ids[i],
+                        "title": self.store.metadata[i].get("title", ""),
+                        "score": round(float(similarity[row, i]), 4)
+                    }
+                    for i in ordered
+                    if similarity[row, i] > 0
+                ]
+            })
+
+        for result in results.values():
+            self._summarize(result)
+        return sorted(results.values(), key=lambda r: r["fit_score"], reverse=True)
+
+    @staticmethod
+    def _empty_result(posting: JobPosting) -> Dict[str, Any]:
+        return {"id": posting.id, "title": posting.title, "source": posting.source, "criteria": []}
+
+    @staticmethod
+    def _summarize(result: Dict[str, Any]) -> None:
+        def part(kind: str):
+            items = [c for c in result["criteria"] if c["kind"] == kind]
+            coverage = sum(c.pop("coverage") for c in items) / len(items) if items else None
+            return items, coverage
+
+        essential, essential_coverage = part("essential")
+        desirable, desirable_coverage = part("desirable")
+        if essential_coverage is None and desirable_coverage is None:
+            fit = 0.0
+        elif desirable_coverage is None:
+            fit = essential_coverage
+        elif essential_coverage is None:
+            fit = desirable_coverage
+        else:
+            fit = ESSENTIAL_WEIGHT * essential_coverage + (1 - ESSENTIAL_WEIGHT) * desirable_coverage
+        result["fit_score"] = round(100 * fit, 1)
+        result["essential_met"] = f"{sum(c['met'] for c in essential)}/{len(essential)}"
+        result["desirable_met"] = f"{sum(c['met'] for c in desirable)}/{len(desirable)}"
+
+
+async def match_postings(matcher: JobMatcher, paths: Sequence[str]) -> List[Dict[str, Any]]:
+    """Load and parse posting files concurrently, then score them in one batch."""
+    postings = await asyncio.gather(*(run_blocking(load_posting, p) for p in paths))
+    return await run_blocking(matcher.score, postings)
+
+
+def print_results(results: Sequence[Dict[str, Any]], details: bool = False) -> None:
+    print(f"\n{'fit':>6}  {'essential':>9}  {'desirable':>9}  posting")
+    print("-" * 60)
+    for r in results:
+        print(f"{r['fit_score']:>6.1f}  {r['essential_met']:>9}  {r['desirable_met']:>9}  {r['title']}")
+        if not details:
+            continue
+        for c in r["criteria"]:
+            mark = "✅" if c["met"] else "❌"
+            evidence = ", ".join(e["id"] for e in c["evidence"]) or "no evidence"
+            print(f"          {mark} [{c['kind']}] {c['criterion']} ({c['score']:.2f}: {evidence})")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score job postings against the Digital Twin profile")
+    parser.add_argument("paths", nargs="*", default=[JOB_POSTINGS_DIR], help="posting .md files or directories")
+    parser.add_argument("--profile", default="digitaltwin.json", help="profile JSON with content_chunks")
+    parser.add_argument("--top", type=int, default=0, help="only show the N best postings")
+    parser.add_argument("--details", action="store_true", help="show per-criterion evidence")
+    parser.add_argument("--json", dest="json_out", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    files = find_postings(args.paths)
+    if not files:
+        print("❌ No job postings found")
+        return 1
+
+    matcher = JobMatcher.from_profile(args.profile)
+    results = asyncio.run(match_postings(matcher, files))
+    print(f"✅ Scored {len(results)} postings against {len(matcher.store.ids)} profile chunks")
+    print_results(results[:args.top] if args.top else results, args.details)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n📝 Results written to {args.json_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""
+Generation gateway in front of the Groq client
+
+Wraps a Groq/AsyncGroq client behind the same `chat.completions.create`
+interface and adds, per model:
+
+- single-flight: identical in-flight (non-streaming) requests share one
+  completion instead of each calling the provider
+- callers that time out or disconnect give back their concurrency slot
+  and token reservation
+- a token-bucket limiter for the provider's requests-per-minute and
+  tokens-per-minute quotas, plus a cap on concurrent calls
+- retry of 429 responses with jittered exponential backoff (honouring
+  Retry-After when the provider sends it)
+
+Queue depth, wait times and retry counts are available from metrics().
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from context_packer import count_tokens
+
+# Provider quotas per model: (requests per minute, tokens per minute)
+MODEL_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    "mixtral-8x7b-32768": (30, 5000),
+    "llama-3.1-8b-instant": (30, 6000),
+}
+DEFAULT_RATE_LIMITS = (30, 6000)
+GROQ_RPM = int(os.getenv("GROQ_RPM", "0")) or None
+GROQ_TPM = int(os.getenv("GROQ_TPM", "0")) or None
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "20"))
+DEFAULT_MAX_TOKENS = 1024
+
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute buckets with reservations.
+
+    reserve() books capacity immediately and returns how long the caller
+    must wait before using it; buckets may go negative, so callers are
+    served in arrival order. Thread-safe.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._requests = min(self.request_capacity, self._requests + elapsed * self.request_rate)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_rate)
+        self._updated = now
+
+    def reserve(self, tokens: int) -> float:
+        """Book one request and `tokens` tokens; return seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._requests -= 1
+            self._tokens -= tokens
+            return max(0.0, -self._requests / self.request_rate, -self._tokens / self.token_rate)
+
+    def cancel(self, tokens: int) -> None:
+        """Return an unused reservation (the caller gave up while queued)."""
+        with self._lock:
+            self._requests = min(self.request_capacity, self._requests + 1)
+            self._tokens = min(self.token_capacity, self._tokens + tokens)
+
+    def adjust(self, tokens: int) -> None:
+        """Correct a reservation once actual usage is known (negative refunds)."""
+        with self._lock:
+            self._tokens = min(self.token_capacity, self._tokens - tokens)
+
+    def penalize(self, seconds: float) -> None:
+        """Empty the request bucket for `seconds` after the provider says 429."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._requests = min(self._requests, -seconds * self.request_rate)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _GatewayBase:
+    """Limiter registry, request keys and metrics shared by both gateways."""
+
+    def __init__(
+        self,
+        client,
+        max_concurrency: int = GROQ_MAX_CONCURRENCY,
+        max_retries: int = GROQ_MAX_RETRIES,
+        rate_limits: Optional[Dict[str, Tuple[int, int]]] = None
+    ):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.rate_limits = dict(MODEL_RATE_LIMITS if rate_limits is None else rate_limits)
+        self._limiters: Dict[str, TokenBucketLimiter] = {}
+        self._limiters_lock = threading.Lock()
+        self._waits: deque = deque(maxlen=1024)
+        self.stats = {
+            "requests": 0, "coalesced": 0, "retries": 0, "rate_limited": 0,
+            "failures": 0, "queue_depth": 0, "in_flight": 0,
+            "prompt_tokens": 0, "completion_tokens": 0
+        }
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def limiter(self, model: str) -> TokenBucketLimiter:
+        with self._limiters_lock:
+            if model not in self._limiters:
+                rpm, tpm = self.rate_limits.get(model, DEFAULT_RATE_LIMITS)
+                self._limiters[model] = TokenBucketLimiter(GROQ_RPM or rpm, GROQ_TPM or tpm)
+            return self._limiters[model]
+
+    @staticmethod
+    def _estimate_tokens(messages: List[Dict[str, str]], params: Dict[str, Any]) -> int:
+        prompt = sum(count_tokens(m.get("content", "")) for m in messages)
+        return prompt + int(params.get("max_tokens") or DEFAULT_MAX_TOKENS)
+
+    @staticmethod
+    def _request_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        raw = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * (2 ** attempt)))
+        return delay
+
+    def _record_usage(self, model: str, estimated: int, completion: Any) -> None:
+        usage = getattr(completion, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if actual is not None:
+            self.limiter(model).adjust(int(actual) - estimated)
+            self.stats["prompt_tokens"] += int(getattr(usage, "prompt_tokens", 0) or 0)
+            self.stats["completion_tokens"] += int(getattr(usage, "completion_tokens", 0) or 0)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters plus queue wait statistics (seconds) over recent calls."""
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            **self.stats,
+            "wait_p50_s": round(pct(0.50), 4),
+            "wait_p95_s": round(pct(0.95), 4),
+            "wait_max_s": round(waits[-1], 4) if waits else 0.0,
+        }
+
+
+class _SlotStream:
+    """Provider stream that holds a gateway concurrency slot until it ends.
+
+    The slot is released exactly once: when the stream is exhausted, fails,
+    is cancelled or closed, or is garbage-collected without ever having
+    been iterated. Streams carry no usage block, so each content chunk
+    counts as one completion token.
+    """
+
+    def __init__(self, gateway: "AsyncLLMGateway", stream):
+        self._gateway = gateway
+        self._stream = stream
+        self._iterator = None
+        self._released = False
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._gateway._release()
+
+    def __aiter__(self) -> "_SlotStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._released:
+            raise StopAsyncIteration
+        if self._iterator is None:
+            self._iterator = self._stream.__aiter__()
+        try:
+            chunk = await self._iterator.__anext__()
+        except BaseException:
+            # End of stream, provider error or cancellation
+            self._release()
+            raise
+        if getattr(chunk, "choices", None) and chunk.choices[0].delta.content:
+            self._gateway.stats["completion_tokens"] += 1
+        return chunk
+
+    async def aclose(self) -> None:
+        try:
+            close = getattr(self._stream, "aclose", None) or getattr(self._stream, "close", None)
+            if close is not None:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+        finally:
+            self._release()
+
+    def __del__(self) -> None:
+        self._release()
+
+
+class AsyncLLMGateway(_GatewayBase):
+    """Gateway for groq.AsyncGroq; `chat.completions.create` is a coroutine."""
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def _acquire(self, model: str, tokens: int) -> None:
+        """Wait for rate-limit capacity and a concurrency slot.
+
+        If the caller is cancelled while queued, the reservation is returned.
+        """
+        start = time.monotonic()
+        limiter = self.limiter(model)
+        self.stats["queue_depth"] += 1
+        try:
+            wait = limiter.reserve(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            await self._semaphore.acquire()
+        except BaseException:
+            limiter.cancel(tokens)
+            raise
+        finally:
+            self.stats["queue_depth"] -= 1
+        self._waits.append(time.monotonic() - start)
+        self.stats["in_flight"] += 1
+
+    def _release(self) -> None:
+        self.stats["in_flight"] -= 1
+        self._semaphore.release()
+
+    async def _call(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any], stream: bool):
+        estimated = self._estimate_tokens(messages, params)
+        for attempt in range(self.max_retries + 1):
+            reserved = estimated if attempt == 0 else 0
+            await self._acquire(model, reserved)
+            try:
+                response = await self.client.chat.completions.create(
+                    model=model, messages=messages, stream=stream, **params
+                )
+            except asyncio.CancelledError:
+                # Timed out or the client went away: free the slot and refund the tokens
+                self._release()
+                self.limiter(model).adjust(-reserved)
+                raise
+            except Exception as e:
+                self._release()
+                if not _is_rate_limited(e) or attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["rate_limited"] += 1
+                self.stats["retries"] += 1
+                delay = self._backoff(attempt, e)
+                self.limiter(model).penalize(delay)
+                continue
+            if stream:
+                self.stats["prompt_tokens"] += estimated - int(params.get("max_tokens") or DEFAULT_MAX_TOKENS)
+                return _SlotStream(self, response)
+            self._release()
+            self._record_usage(model, estimated, response)
+            return response
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **params):
+        """Drop-in for AsyncGroq.chat.completions.create."""
+        self.stats["requests"] += 1
+        if stream:
+            return await self._call(model, messages, params, stream=True)
+
+        key = self._request_key(model, messages, params)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._call(model, messages, params, stream=False))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shielded so one caller timing out doesn't cancel the shared call
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # Nobody is waiting any more: stop the call and free its slot
+                task.cancel()
+
+
+class LLMGateway(_GatewayBase):
+    """Gateway for the synchronous groq.Groq client (thread-safe)."""
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any], stream: bool):
+        estimated = self._estimate_tokens(messages, params)
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            with self._lock:
+                self.stats["queue_depth"] += 1
+            wait = self.limiter(model).reserve(estimated if attempt == 0 else 0)
+            if wait:
+                time.sleep(wait)
+            with self._semaphore:
+                with self._lock:
+                    self.stats["queue_depth"] -= 1
+                    self.stats["in_flight"] += 1
+                self._waits.append(time.monotonic() - start)
+                try:
+                    response = self.client.chat.completions.create(
+                        model=model, messages=messages, stream=stream, **params
+                    )
+                    if not stream:
+                        self._record_usage(model, estimated, response)
+                    return response
+                except Exception as e:
+                    if not _is_rate_limited(e) or attempt == self.max_retries:
+                        self.stats["failures"] += 1
+                        raise
+                    self.stats["rate_limited"] += 1
+                    self.stats["retries"] += 1
+                    delay = self._backoff(attempt, e)
+                    self.limiter(model).penalize(delay)
+                finally:
+                    with self._lock:
+                        self.stats["in_flight"] -= 1
+
+    def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **params):
+        """Drop-in for Groq.chat.completions.create."""
+        with self._lock:
+            self.stats["requests"] += 1
+        if stream:
+            return self._call(model, messages, params, stream=True)
+
+        key = self._request_key(model, messages, params)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._call(model, messages, params, stream=False))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
@@ -0,0 +1,325 @@
+"""
+Offline load test for the Digital Twin servers
+
+Drives the ASGI apps in-process (backend/main.py and mcp_server.py) through
+httpx's ASGI transport, with Redis, Upstash Vector and Groq replaced by the
+stand-ins in offline_stubs.py. Concurrency is ramped in stages; each stage
+runs closed-loop workers for a fixed time and reports throughput and
+p50/p95/p99 latency per endpoint.
+
+Results can be saved as a baseline and later runs checked against it: the
+run fails (exit code 1) when an endpoint's p99 rises, or its QPS falls, by
+more than the allowed tolerance at any concurrency level. Runs that
+should exercise the fake Upstash index but never query it also fail.
+
+    python loadtest.py
+    python loadtest.py --concurrency 1 8 32 128 --duration 5 --llm-latency-ms 300
+    python loadtest.py --json baseline.json
+    python loadtest.py --retrieval-mode dense --vector-latency-ms 80
+    python loadtest.py --baseline baseline.json --p99-tolerance 0.25 --qps-tolerance 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import importlib
+import importlib.util
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_FILE = os.path.join(PROJECT_ROOT, "golden_queries.json")
+DEFAULT_CONCURRENCY = [1, 4, 16, 64]
+# Same default as llm_gateway.py, which can't be imported before configure_environment()
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+
+
+def _mcp_query(question: str) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "workspace/executeCommand",
+        "params": {"command": "digitaltwin.query", "arguments": [{"query": question}]}
+    }
+
+
+def _api_ok(response: httpx.Response) -> bool:
+    return response.status_code == 200
+
+
+def _stream_ok(response: httpx.Response) -> bool:
+    return response.status_code == 200 and "event: error" not in response.text
+
+
+def _mcp_ok(response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return False
+    body = response.json()
+    return not body.get("error") and "error" not in (body.get("result") or {})
+
+
+# Endpoint name -> (app, path, request body for a question, success check)
+ENDPOINTS: Dict[str, Tuple[str, str, Callable[[str], Dict[str, Any]], Callable[[httpx.Response], bool]]] = {
+    "api_query": ("api", "/api/query", lambda q: {"question": q}, _api_ok),
+    "api_stream": ("api", "/api/query/stream", lambda q: {"question": q}, _stream_ok),
+    "mcp_query": ("mcp", "/mcp", _mcp_query, _mcp_ok),
+}
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Settings the app modules read at import time, so set before importing them."""
+    os.environ.update({
+        "RETRIEVAL_BACKEND": args.vector_backend,
+        "RETRIEVAL_MODE": args.retrieval_mode,
+        # Measure the servers, not the provider quota the gateway enforces
+        "GROQ_RPM": str(args.groq_rpm),
+        "GROQ_TPM": str(args.groq_rpm * 1000),
+        "TRACE_LOGGING": "false",
+        "CONTEXT_LOGGING": "false",
+    })
+    if args.answer_cache:
+        os.environ["ANSWER_CACHE_REDIS"] = "true"
+        os.environ["ANSWER_CACHE_REDIS_URL"] = "redis://loadtest"
+    else:
+        # Every request goes through generation
+        os.environ["ANSWER_CACHE_SIZE"] = "0"
+        os.environ["ANSWER_CACHE_REDIS"] = "false"
+        os.environ.pop("ANSWER_CACHE_REDIS_URL", None)
+    os.environ["RETRIEVAL_CACHE"] = "false" if args.no_retrieval_cache else "true"
+    # Measure the query pipeline, not answers left behind by a warm-up run
+    os.environ["PRECOMPUTED_ANSWERS"] = "false"
+
+
+def install_stubs(args: argparse.Namespace) -> Dict[str, Any]:
+    """Point the shared client holders at the offline stand-ins."""
+    import clients
+    from llm_gateway import AsyncLLMGateway
+    from offline_stubs import FakeRedis, FakeVectorIndex, StubAsyncGroq
+    from retrieval import load_local_dense
+
+    redis_client = FakeRedis(latency=args.redis_latency_ms / 1e3)
+    llm = StubAsyncGroq(latency=args.llm_latency_ms / 1e3, token_latency=args.token_latency_ms / 1e3)
+    vector_index = FakeVectorIndex(
+        load_local_dense(os.path.join(PROJECT_ROOT, "digitaltwin.json")), latency=args.vector_latency_ms / 1e3
+    )
+    clients.redis_holder().install(redis_client)
+    clients.redis_holder("redis://loadtest").install(redis_client)
+    clients.async_groq_client.install(AsyncLLMGateway(llm, max_concurrency=args.groq_concurrency))
+    clients.async_vector_index.install(vector_index)
+    return {"redis": redis_client, "llm": llm, "vector": vector_index}
+
+
+def load_apps(names: Sequence[str]) -> Dict[str, Any]:
+    """Import the requested ASGI apps ("api", "mcp"); both load their profile on import."""
+    apps = {}
+    cwd = os.getcwd()
+    # The MCP server resolves its profile files relative to the working directory
+    os.chdir(PROJECT_ROOT)
+    try:
+        if "api" in names:
+            spec = importlib.util.spec_from_file_location(
+                "backend_main", os.path.join(PROJECT_ROOT, "backend", "main.py")
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            apps["api"] = module.app
+        if "mcp" in names:
+            apps["mcp"] = importlib.import_module("mcp_server").app
+    finally:
+        os.chdir(cwd)
+    return apps
+
+
+async def run_stage(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    concurrency: int,
+    duration: float,
+    questions: Sequence[str]
+) -> Dict[str, Any]:
+    """Closed-loop workers hammer one endpoint for `duration` seconds."""
+    # Imported late: benchmark pulls in the app modules (see configure_environment)
+    from benchmark import percentile
+
+    _, path, body, ok = ENDPOINTS[endpoint]
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(offset: int) -> None:
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body(questions[i % len(questions)]))
+                success = ok(response)
+            except Exception:
+                success = False
+            latencies.append(time.perf_counter() - start)
+            errors += not success
+            i += concurrency
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p95_ms": percentile(latencies, 95) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "max_ms": max(latencies, default=0.0) * 1e3,
+    }
+
+
+async def run_load(
+    apps: Dict[str, Any],
+    endpoints: Sequence[str],
+    levels: Sequence[int],
+    duration: float,
+    questions: Sequence[str]
+) -> List[Dict[str, Any]]:
+    rows = []
+    for endpoint in endpoints:
+        app_name, path, body, _ = ENDPOINTS[endpoint]
+        transport = httpx.ASGITransport(app=apps[app_name])
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            await client.post(path, json=body(questions[0]))  # warm-up
+            for concurrency in levels:
+                row = await run_stage(client, endpoint, concurrency, duration, questions)
+                rows.append(row)
+                print(f"📊 {endpoint:<11} c={concurrency:<4} {row['qps']:>8.1f} QPS  "
+                      f"p99 {row['p99_ms']:>8.1f} ms  errors {row['errors']}")
+    return rows
+
+
+def check_regressions(
+    rows: Sequence[Dict[str, Any]],
+    baseline: Sequence[Dict[str, Any]],
+    p99_tolerance: float,
+    qps_tolerance: float
+) -> List[str]:
+    """Compare rows with a baseline run at matching (endpoint, concurrency)."""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline}
+    failures = []
+    for row in rows:
+        base = previous.get((row["endpoint"], row["concurrency"]))
+        if base is None:
+            continue
+        label = f"{row['endpoint']} c={row['concurrency']}"
+        if base["p99_ms"] and row["p99_ms"] > base["p99_ms"] * (1 + p99_tolerance):
+            failures.append(f"{label}: p99 {row['p99_ms']:.1f} ms vs baseline {base['p99_ms']:.1f} ms")
+        if base["qps"] and row["qps"] < base["qps"] * (1 - qps_tolerance):
+            failures.append(f"{label}: {row['qps']:.1f} QPS vs baseline {base['qps']:.1f} QPS")
+    return failures
+
+
+def check_limits(rows: Sequence[Dict[str, Any]], max_p99_ms: Optional[float], min_qps: Optional[float]) -> List[str]:
+    """Absolute limits: p99 at every level, and the peak QPS of each endpoint."""
+    failures = []
+    for row in rows:
+        if row["errors"]:
+            failures.append(f"{row['endpoint']} c={row['concurrency']}: {row['errors']} failed requests")
+        if max_p99_ms is not None and row["p99_ms"] > max_p99_ms:
+            failures.append(f"{row['endpoint']} c={row['concurrency']}: p99 {row['p99_ms']:.1f} ms > {max_p99_ms} ms")
+    if min_qps is not None:
+        for endpoint in dict.fromkeys(r["endpoint"] for r in rows):
+            peak = max(r["qps"] for r in rows if r["endpoint"] == endpoint)
+            if peak < min_qps:
+                failures.append(f"{endpoint}: peak {peak:.1f} QPS < {min_qps} QPS")
+    return failures
+
+
+def print_table(rows: Sequence[Dict[str, Any]]) -> None:
+    header = f"{'endpoint':<12}{'conc':>6}{'requests':>10}{'errors':>8}{'QPS':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['endpoint']:<12}{r['concurrency']:>6}{r['requests']:>10}{r['errors']:>8}{r['qps']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the Digital Twin servers offline")
+    parser.add_argument("--endpoints", nargs="*", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="*", type=int, default=DEFAULT_CONCURRENCY,
+                        help="concurrent clients per stage")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per stage")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="stub Groq time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=5.0, help="stub Groq per streamed token")
+    parser.add_argument("--vector-latency-ms", type=float, default=30.0, help="fake Upstash Vector query time")
+    parser.add_argument("--redis-latency-ms", type=float, default=1.0, help="fake Redis round-trip time")
+    parser.add_argument("--vector-backend", choices=["upstash", "local"], default="upstash",
+                        help="backend/main.py retrieval backend")
+    parser.add_argument("--retrieval-mode", choices=["hybrid", "dense", "lexical"], default="hybrid",
+                        help="RETRIEVAL_MODE for both servers")
+    parser.add_argument("--groq-rpm", type=int, default=1_000_000, help="gateway requests-per-minute limit")
+    parser.add_argument("--groq-concurrency", type=int, default=GROQ_MAX_CONCURRENCY,
+                        help="gateway cap on concurrent Groq calls")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer caches on")
+    parser.add_argument("--no-retrieval-cache", action="store_true",
+                        help="turn the retrieval caches off, so every request embeds and searches")
+    parser.add_argument("--golden", default=GOLDEN_FILE, help="questions to replay")
+    parser.add_argument("--json", dest="json_out", help="write results (usable as a baseline) to this file")
+    parser.add_argument("--baseline", help="results of an earlier run to check for regressions")
+    parser.add_argument("--p99-tolerance", type=float, default=0.25, help="allowed p99 increase vs baseline")
+    parser.add_argument("--qps-tolerance", type=float, default=0.20, help="allowed QPS drop vs baseline")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if any stage's p99 exceeds this")
+    parser.add_argument("--min-qps", type=float, help="fail if an endpoint's peak QPS is below this")
+    args = parser.parse_args(argv)
+
+    # Only the REST endpoints query the (fake) Upstash index; the MCP server uses the local store
+    expect_vector_calls = (
+        args.vector_backend == "upstash" and args.retrieval_mode != "lexical"
+        and any(ENDPOINTS[e][0] == "api" for e in args.endpoints)
+    )
+    if not expect_vector_calls:
+        print("⚠️  The fake Upstash index is not queried in this configuration; --vector-latency-ms has no effect")
+
+    configure_environment(args)
+    sys.path.insert(0, PROJECT_ROOT)
+    stubs = install_stubs(args)
+    apps = load_apps({ENDPOINTS[e][0] for e in args.endpoints})
+
+    with open(args.golden, 'r', encoding='utf-8') as f:
+        questions = [q["query"] for q in json.load(f)["queries"]]
+
+    print(f"\n📊 Ramping {', '.join(args.endpoints)} through concurrency {args.concurrency} "
+          f"({args.duration:g}s per stage, LLM {args.llm_latency_ms:g} ms)")
+    rows = asyncio.run(run_load(apps, args.endpoints, args.concurrency, args.duration, questions))
+
+    print()
+    print_table(rows)
+    print(f"\nStub calls: {stubs['llm'].calls} LLM, {stubs['vector'].calls} vector, "
+          f"{stubs['redis'].round_trips} Redis round trips")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📝 Results written to {args.json_out}")
+
+    failures = check_limits(rows, args.max_p99_ms, args.min_qps)
+    if expect_vector_calls and not stubs['vector'].calls:
+        failures.append("the fake Upstash index was never queried, so the vector settings measured nothing")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            failures += check_regressions(rows, json.load(f), args.p99_tolerance, args.qps_tolerance)
+    if failures:
+        print("\n❌ Load test regressions:")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+Local embedding engine and NumPy vector store for Digital Twin content chunks
+
+An offline alternative to Upstash Vector: chunk text is embedded with a
+hashing TF-IDF vectorizer and kept in one contiguous float32 matrix, saved as
+an .npy file next to the profile JSON. Queries are answered with a single
+matrix product plus argpartition, with no network hop.
+
+query() accepts upstash_vector's `filter` expressions of the form the
+retriever builds (`field IN ('a', 'b')` or `field = 'a'`, joined by AND) and
+rejects anything else; a store holds one namespace and rejects queries for
+any other.
+"""
+
+import os
+import re
+import json
+import math
+import zlib
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from bm25_index import tokenize
+from chunk_store import ChunkStore, MappedSequence
+
+DEFAULT_DIM = 2048
+# Cached boolean row masks, one per distinct filter expression
+FILTER_CACHE_SIZE = 64
+
+_FILTER_CLAUSE = re.compile(
+    r"^\s*(\w+)\s*(?:=\s*('(?:[^'\\]|\\.)*')|IN\s*\(((?:\s*'(?:[^'\\]|\\.)*'\s*,?)*)\))\s*$",
+    re.IGNORECASE
+)
+_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+@dataclass
+class VectorResult:
+    """A single search hit, shaped like upstash_vector's QueryResult."""
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class VectorStoreInfo:
+    """Index statistics, shaped like upstash_vector's InfoResult."""
+    vector_count: int
+    dimension: int
+
+
+def parse_filter(expression: str) -> List[Tuple[str, Set[str]]]:
+    """Split a metadata filter into (field, allowed values) clauses.
+
+    Raises ValueError for syntax the local store can't evaluate.
+    """
+    clauses = []
+    # Split on AND outside quoted values
+    for part in re.split(r"\s+AND\s+(?=(?:[^']*'[^']*')*[^']*$)", expression.strip(), flags=re.IGNORECASE):
+        match = _FILTER_CLAUSE.match(part)
+        if not match:
+            raise ValueError(f"Unsupported vector filter for the local store: {expression!r}")
+        field_name, single, listed = match.groups()
+        quoted = single if single is not None else listed
+        values = {value.replace("\\'", "'") for value in _QUOTED.findall(quoted)}
+        clauses.append((field_name, values))
+    return clauses
+
+
+def chunk_embedding_text(chunk: Dict[str, Any]) -> str:
+    """Combine title and content, as embed_profile.py does for Upstash."""
+    return f"{chunk.get('title', '')}: {chunk.get('content', '')}"
+
+
+def chunk_vector_metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata stored alongside each vector."""
+    metadata = chunk.get('metadata', {}) or {}
+    return {
+        "title": chunk.get('title', ''),
+        "content": chunk.get('content', ''),
+        "type": chunk.get('type', ''),
+        "category": metadata.get('category', ''),
+        "tags": list(metadata.get('tags', []))
+    }
+
+
+class HashingVectorizer:
+    """TF-IDF vectorizer over hashed unigram and bigram features."""
+
+    def __init__(self, dim: int = DEFAULT_DIM, idf: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.idf = idf if idf is not None else np.ones(dim, dtype=np.float32)
+
+    def _features(self, text: str) -> Counter:
+        tokens = tokenize(text)
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return Counter(zlib.crc32(term.encode('utf-8')) % self.dim for term in terms)
+
+    def fit(self, texts: Sequence[str]) -> "HashingVectorizer":
+        """Learn smoothed inverse document frequencies from the corpus."""
+        df = np.zeros(self.dim, dtype=np.float32)
+        for text in texts:
+            df[list(self._features(text))] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into an L2-normalised float32 matrix."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, tf in self._features(text).items():
+                matrix[row, bucket] = 1 + math.log(tf)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+
+def vector_paths(json_path: str) -> Dict[str, str]:
+    """Return the .npy paths (and source hash) stored next to a profile JSON file."""
+    stem = os.path.splitext(json_path)[0]
+    return {"vectors": f"{stem}.vectors.npy", "idf": f"{stem}.idf.npy", "version": f"{stem}.vectors.sha256"}
+
+
+def source_version(chunks: Sequence[Dict[str, Any]], dim: int) -> str:
+    """Hash of what the vectors are built from: chunk IDs, embedded text and dimension."""
+    digest = hashlib.sha256(f"dim={dim}".encode())
+    for doc_id, chunk in zip(_chunk_ids(chunks), chunks):
+        digest.update(b"\x1e" + doc_id.encode("utf-8") + b"\x1f" + chunk_embedding_text(chunk).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _chunk_ids(chunks: Sequence[Dict[str, Any]]) -> List[str]:
+    if isinstance(chunks, ChunkStore):
+        return chunks.ids
+    return [str(c.get('id', f"chunk:{i}")) for i, c in enumerate(chunks)]
+
+
+def vector_metadata(chunks: Sequence[Dict[str, Any]]) -> Sequence[Dict[str, Any]]:
+    """Per-vector metadata; built on access for a ChunkStore rather than copied."""
+    if isinstance(chunks, ChunkStore):
+        return MappedSequence(len(chunks), lambda i: chunk_vector_metadata(chunks[i]))
+    return [chunk_vector_metadata(c) for c in chunks]
+
+
+class LocalVectorStore:
+    """In-memory vector index with an upstash_vector compatible query()."""
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        metadata: Sequence[Dict[str, Any]],
+        matrix: np.ndarray,
+        vectorizer: HashingVectorizer,
+        namespace: str = ""
+    ):
+        self.ids = list(ids)
+        self.metadata = metadata if isinstance(metadata, Sequence) else list(metadata)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.vectorizer = vectorizer
+        self.namespace = namespace
+        self._filter_masks: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[Dict[str, Any]], dim: int = DEFAULT_DIM) -> "LocalVectorStore":
+        """Embed content chunks into a new store."""
+        texts = [chunk_embedding_text(c) for c in chunks]
+        vectorizer = HashingVectorizer(dim).fit(texts)
+        return cls(_chunk_ids(chunks), vector_metadata(chunks), vectorizer.transform(texts), vectorizer)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        json_path: str = "digitaltwin.json",
+        dim: int = DEFAULT_DIM,
+        chunks: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> "LocalVectorStore":
+        """Load vectors saved next to json_path, re-embedding if they are stale.
+
+        Saved vectors are used only if the hash stored with them matches the
+        chunks' content, so edits are caught whatever the files' mtimes.
+        chunks, when given, are json_path's already loaded content chunks.
+        """
+        if chunks is None:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                chunks = ChunkStore(json.load(f).get('content_chunks', []))
+
+        paths = vector_paths(json_path)
+        try:
+            with open(paths["version"], 'r', encoding='utf-8') as f:
+                saved_version = f.read().strip()
+            idf = np.load(paths["idf"])
+            if saved_version == source_version(chunks, idf.shape[0]):
+                matrix = np.load(paths["vectors"])
+                if matrix.shape == (len(chunks), idf.shape[0]):
+                    return cls(
+                        _chunk_ids(chunks), vector_metadata(chunks), matrix, HashingVectorizer(idf.shape[0], idf)
+                    )
+        except (OSError, ValueError):
+            pass
+
+        store = cls.from_chunks(chunks, dim)
+        store.save(json_path, source_version(chunks, dim))
+        return store
+
+    def save(self, json_path: str, version: str = "") -> None:
+        """Write the vector matrix and IDF weights next to json_path.
+
+        version is the source_version() of the embedded chunks; without it
+        the next load_or_build() re-embeds.
+        """
+        paths = vector_paths(json_path)
+        # Drop the old hash first so a half-written save is never trusted
+        try:
+            os.remove(paths["version"])
+        except FileNotFoundError:
+            pass
+        np.save(paths["vectors"], self.matrix)
+        np.save(paths["idf"], self.vectorizer.idf)
+        with open(paths["version"], 'w', encoding='utf-8') as f:
+            f.write(version)
+
+    def info(self) -> VectorStoreInfo:
+        return VectorStoreInfo(vector_count=len(self.ids), dimension=self.vectorizer.dim)
+
+    def query_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 3,
+        mask: Optional[np.ndarray] = None
+    ) -> List[List[VectorResult]]:
+        """Answer several queries with one matrix product.
+
+        mask is an optional boolean row filter; rows where it is False are
+        never returned.
+        """
+        if not queries:
+            return []
+        return self.query_vectors(self.embed(queries), top_k, mask)
+
+    def embed(self, queries: Sequence[str]) -> np.ndarray:
+        """Query embeddings, one row per query."""
+        return self.vectorizer.transform(queries)
+
+    def query_vectors(
+        self,
+        vectors: np.ndarray,
+        top_k: int = 3,
+        mask: Optional[np.ndarray] = None
+    ) -> List[List[VectorResult]]:
+        """query_batch() for queries that are already embedded."""
+        k = min(top_k, len(self.ids))
+        if k < 1 or len(vectors) == 0:
+            return [[] for _ in range(len(vectors))]
+
+        scores = vectors @ self.matrix.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        batches = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            batches.append([
+                VectorResult(self.ids[i], float(scores[row, i]), self.metadata[i])
+                for i in ordered
+                if scores[row, i] > 0
+            ])
+        return batches
+
+    def filter_mask(self, expression: str) -> Optional[np.ndarray]:
+        """Boolean row mask for a metadata filter expression (None when empty)."""
+        if not expression or not expression.strip():
+            return None
+        mask = self._filter_masks.get(expression)
+        if mask is None:
+            clauses = parse_filter(expression)
+            mask = np.ones(len(self.ids), dtype=bool)
+            for i, metadata in enumerate(self.metadata):
+                for field_name, values in clauses:
+                    value = metadata.get(field_name)
+                    matched = (
+                        any(str(v) in values for v in value) if isinstance(value, list)
+                        else value is not None and str(value) in values
+                    )
+                    if not matched:
+                        mask[i] = False
+                        break
+            if len(self._filter_masks) >= FILTER_CACHE_SIZE:
+                self._filter_masks.pop(next(iter(self._filter_masks)))
+            self._filter_masks[expression] = mask
+        return mask
+
+    def query(
+        self,
+        data: str,
+        top_k: int = 3,
+        include_metadata: bool = True,
+        filter: str = "",
+        namespace: str = "",
+        **kwargs
+    ) -> List[VectorResult]:
+        """Search for the chunks most similar to data (upstash_vector signature).
+
+        Raises ValueError for a namespace this store doesn't hold or a filter
+        it can't evaluate.
+        """
+        if (namespace or "") != self.namespace:
+            raise ValueError(
+                f"Namespace {namespace!r} not in this local vector store (holds {self.namespace!r})"
+            )
+        return self.query_batch([data], top_k, self.filter_mask(filter))[0]
+
+
+if __name__ == "__main__":
+    with open("digitaltwin.json", 'r', encoding='utf-8') as f:
+        chunks = json.load(f).get('content_chunks', [])
+    store = LocalVectorStore.from_chunks(chunks)
+    store.save("digitaltwin.json", source_version(chunks, store.vectorizer.dim))
+    print(f"✅ Embedded {len(store.ids)} chunks into {vector_paths('digitaltwin.json')['vectors']}")
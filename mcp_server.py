@@ -6,17 +6,47 @@ Implements the MCP protocol for VS Code integration using Redis
 import os
 import json
 import asyncio
-from typing import Dict, Any, List, Optional
+import contextvars
+from typing import Dict, Any, List, Optional, Callable, Awaitable
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import clients
 from digitaltwin_rag import (
     setup_redis_client,
-    load_profile_data,
     initialize_redis_data,
-    search_redis,
-    setup_groq_client,
-    generate_response
+    setup_async_groq_client,
+    generate_response_async,
+    generate_response_stream,
+    GROQ_MODEL,
+    FALLBACK_RESPONSES
+)
+from async_utils import run_blocking, StageTimeoutError, sse_event
+from context_packer import pack_context
+from retrieval import MAX_TOP_K
+from local_vectors import LocalVectorStore
+from job_matcher import JobMatcher, JOB_POSTINGS_DIR, find_postings, load_posting, parse_posting
+from telemetry import (
+    span,
+    record_context,
+    render_metrics,
+    register_cache_metrics,
+    register_callback,
+    register_gateway_metrics,
+    CachedProbe,
+    TracingMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    RETRIEVED_CHUNKS
+)
+from twin_registry import (
+    DEFAULT_TWIN_ID,
+    Twin,
+    TwinRegistry,
+    UnknownTwinError,
+    discover_profiles,
+    load_twin,
+    twin_namespace
 )
 
 # Initialize FastAPI app
@@ -30,20 +60,61 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware, service="mcp")
 
 # Initialize global clients
-groq_client = setup_groq_client()
+groq_client = setup_async_groq_client()
 redis_client = setup_redis_client()
 
-# Load and initialize profile data
+JSON_FILE = "digitaltwin.json"
+
+# Answer and retrieval caches: in-process tier, plus a shared Redis tier when enabled
+ANSWER_CACHE_REDIS = os.getenv("ANSWER_CACHE_REDIS", "true").lower() == "true"
+RETRIEVAL_CACHE_REDIS = os.getenv("RETRIEVAL_CACHE_REDIS", "true").lower() == "true"
+
+def _load_twin(twin_id: str, path: str) -> Twin:
+    """Load a twin's retriever and sync its chunks into its Redis namespace"""
+    def sync_redis(twin_id: str, profile_data: Dict[str, Any]) -> None:
+        if redis_client:
+            initialize_redis_data(redis_client, profile_data, namespace=twin_namespace(twin_id))
+
+    return load_twin(
+        twin_id, path,
+        cache_redis=redis_client if ANSWER_CACHE_REDIS else None,
+        on_load=sync_redis,
+        retrieval_redis=redis_client if RETRIEVAL_CACHE_REDIS else None,
+        # Written by `python precomputed_answers.py --pipeline mcp`
+        answers_pipeline="mcp",
+        answers_model=GROQ_MODEL
+    )
+
+# Every digitaltwin*.json (plus TWIN_PROFILES) is served, selected by the
+# "twin_id" command argument; the default twin is loaded up front
+profiles = discover_profiles()
+profiles.setdefault(DEFAULT_TWIN_ID, JSON_FILE)
+twins = TwinRegistry(profiles, loader=_load_twin)
 try:
-    profile_data = load_profile_data()
-    initialize_redis_data(redis_client, profile_data)
+    twins.load(DEFAULT_TWIN_ID)
     print("✅ Profile data loaded and initialized in Redis")
 except Exception as e:
     print(f"❌ Failed to initialize profile data: {str(e)}")
     redis_client = None
 
+# Prometheus metrics and cached connectivity state for /metrics and /health
+register_cache_metrics(lambda: twins.cache_stats("answer_cache"))
+register_cache_metrics(lambda: twins.cache_stats("retrieval_cache"), prefix="digitaltwin_retrieval_cache")
+register_cache_metrics(lambda: twins.cache_stats("precomputed"), prefix="digitaltwin_precomputed_answers")
+register_gateway_metrics(lambda: groq_client)
+register_callback("digitaltwin_indexed_chunks", "Profile chunks in the search index (loaded twins)",
+                  twins.indexed_chunks)
+register_callback("digitaltwin_twins_loaded", "Twins currently loaded in memory", lambda: len(twins.loaded()))
+register_callback("digitaltwin_twin_events_total", "Twin loads, reloads and evictions",
+                  lambda: dict(twins.stats), kind="counter", label="event")
+redis_probe = (
+    CachedProbe("redis", lambda: redis_client.ping(), on_failure=clients.redis_holder().report_failure)
+    if redis_client else None
+)
+
 # MCP Protocol Models
 class MCPRequest(BaseModel):
     method: str
@@ -64,15 +135,78 @@ async def handle_initialize(params: Dict[str, Any]) -> Dict[str, Any]:
         "capabilities": {
             "completionProvider": {},
             "executeCommandProvider": {
-                "commands": ["digitaltwin.query"]
+                "commands": ["digitaltwin.query", "digitaltwin.matchJobs"]
             }
         }
     }
 
+def _command_args(params: Dict[str, Any]) -> Dict[str, Any]:
+    return params.get("arguments", [{}])[0] if params.get("arguments") else {}
+
+# Retrieval results fetched up front for every query in a JSON-RPC batch, by (twin_id, query)
+_prefetched_results: contextvars.ContextVar[Dict[tuple, List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "prefetched_results", default={}
+)
+
+DEFAULT_TOP_K = 3
+
+def _retrieval_options(args: Dict[str, Any]) -> Dict[str, Any]:
+    """top_k (clamped to 1..MAX_TOP_K) and type/category filters from digitaltwin.query arguments"""
+    return {
+        "top_k": min(max(int(args.get("top_k") or DEFAULT_TOP_K), 1), MAX_TOP_K),
+        "types": args.get("types") or None,
+        "categories": args.get("categories") or None,
+    }
+
+def _uses_default_retrieval(args: Dict[str, Any]) -> bool:
+    return _retrieval_options(args) == {"top_k": DEFAULT_TOP_K, "types": None, "categories": None}
+
+def precomputed_answer(twin: Twin, query: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The warm-up job's answer, for a query with the default retrieval settings"""
+    if twin.precomputed is None or not _uses_default_retrieval(args):
+        return None
+    return twin.precomputed.get(query)
+
+async def retrieve(twin: Twin, query: str, args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run the twin's hybrid retrieval pipeline, reusing batch-prefetched results"""
+    if _uses_default_retrieval(args):
+        prefetched = _prefetched_results.get().get((twin.twin_id, query))
+        if prefetched is not None:
+            RETRIEVED_CHUNKS.observe(len(prefetched))
+            return prefetched
+    with span("retrieve"):
+        results = await twin.retriever.search(query, **_retrieval_options(args))
+    RETRIEVED_CHUNKS.observe(len(results))
+    return results
+
+def assemble_context(query: str, results: List[Dict[str, Any]]) -> str:
+    """Pack retrieved chunks into the model's context budget"""
+    with span("prompt_assembly"):
+        packed = pack_context(query, results, GROQ_MODEL)
+    record_context(packed)
+    return packed.text
+
+def _source_summary(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": r["id"],
+            "title": r["metadata"].get("title", ""),
+            "score": r["score"]
+        }
+        for r in results
+    ]
+
+async def precompute_answer(twin: Twin, query: str, results: List[Dict[str, Any]]):
+    """Answer and sources for the warm-up job (precomputed_answers.py), bypassing the caches"""
+    context = assemble_context(query, results)
+    with span("generate"):
+        response = await generate_response_async(groq_client, query, context)
+    return (None if response in FALLBACK_RESPONSES else response), _source_summary(results)
+
 async def handle_execute_command(params: Dict[str, Any]) -> Any:
     """Handle execute command request"""
     command = params.get("command")
-    args = params.get("arguments", [{}])[0] if params.get("arguments") else {}
+    args = _command_args(params)
     
     if command == "digitaltwin.query":
         if not redis_client:
@@ -84,60 +218,292 @@ async def handle_execute_command(params: Dict[str, Any]) -> Any:
         query = args.get("query", "")
         if not query:
             return {"error": "No query provided"}
+        try:
+            twin = await twins.get(args.get("twin_id"))
+        except UnknownTwinError as e:
+            return {"error": str(e)}
+        precomputed = precomputed_answer(twin, query, args)
+        if precomputed is not None:
+            return {"result": precomputed["answer"]}
             
-        # Search Redis for relevant chunks
-        results = search_redis(redis_client, query)
+        # Search for relevant chunks
+        try:
+            results = await retrieve(twin, query, args)
+        except StageTimeoutError as e:
+            return {"error": str(e)}
         if not results:
             return {"result": "I don't have specific information about that topic."}
             
-        # Generate response using Groq
-        context = "\n\n".join([r["metadata"].get("content", "") for r in results])
-        response = generate_response(groq_client, query, context)
+        # Serve repeat questions over the same chunks from the cache
+        chunk_ids = [r["id"] for r in results]
+        cached = await twin.answer_cache.get_async(query, chunk_ids, GROQ_MODEL)
+        if cached is not None:
+            return {"result": cached["answer"]}
+            
+        # Generate response using Groq over a context trimmed to the model's budget
+        context = assemble_context(query, results)
+        with span("generate"):
+            response = await generate_response_async(groq_client, query, context)
+        if response not in FALLBACK_RESPONSES:
+            await twin.answer_cache.set_async(query, chunk_ids, GROQ_MODEL, {"answer": response})
         return {"result": response}
         
+    if command == "digitaltwin.matchJobs":
+        return await handle_match_jobs(args)
+
     return {"error": f"Unknown command: {command}"}
 
+# Twin ID -> (twin, matcher); a reloaded twin gets a fresh matcher
+_job_matchers: Dict[str, tuple] = {}
+
+def _posting_path(name: str) -> str:
+    """Resolve a posting file name inside JOB_POSTINGS_DIR, refusing anything outside it"""
+    root = os.path.realpath(JOB_POSTINGS_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.dirname(path) != root or not path.endswith(".md"):
+        raise ValueError(f"Unknown job posting: {name}")
+    return path
+
+async def handle_match_jobs(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Score job postings against the profile (digitaltwin.matchJobs).
+
+    Arguments: "postings" (Markdown texts, or {"id", "text"} objects) and/or
+    "files" (names in the job postings folder; all of them by default), plus
+    optional "top" limit and "twin_id".
+    """
+    try:
+        twin = await twins.get(args.get("twin_id"))
+    except UnknownTwinError as e:
+        return {"error": str(e)}
+    matcher_twin, job_matcher = _job_matchers.get(twin.twin_id, (None, None))
+    if matcher_twin is not twin:
+        with span("load"):
+            store = twin.dense_store
+            if not isinstance(store, LocalVectorStore):
+                store = LocalVectorStore.from_chunks(twin.chunks)
+            job_matcher = JobMatcher(store)
+        _job_matchers[twin.twin_id] = (twin, job_matcher)
+        # Don't keep evicted twins alive through their matcher
+        for twin_id in set(_job_matchers) - set(twins.loaded()):
+            _job_matchers.pop(twin_id, None)
+
+    postings = []
+    for i, item in enumerate(args.get("postings") or []):
+        if isinstance(item, dict):
+            postings.append(parse_posting(item.get("text", ""), str(item.get("id") or f"posting_{i + 1}")))
+        else:
+            postings.append(parse_posting(str(item), f"posting_{i + 1}"))
+    try:
+        files = [_posting_path(name) for name in args.get("files") or []]
+    except ValueError as e:
+        return {"error": str(e)}
+    if not postings and not files:
+        files = find_postings([JOB_POSTINGS_DIR]) if os.path.isdir(JOB_POSTINGS_DIR) else []
+    if files:
+        postings += await asyncio.gather(*(run_blocking(load_posting, path) for path in files))
+    if not postings:
+        return {"error": "No job postings provided"}
+
+    results = await run_blocking(job_matcher.score, postings)
+    top = int(args.get("top") or 0)
+    return {"result": results[:top] if top else results}
+
+async def stream_execute_command(request_id: Optional[int], params: Dict[str, Any]):
+    """Stream digitaltwin.query as SSE: sources first, then tokens, then the final response.
+
+    Partial results are sent as "digitaltwin/partialResult" JSON-RPC
+    notifications; the last event is the normal JSON-RPC response.
+    """
+    args = _command_args(params)
+    query = args.get("query", "")
+
+    def notification(payload: Dict[str, Any]) -> str:
+        return sse_event("message", {
+            "jsonrpc": "2.0",
+            "method": "digitaltwin/partialResult",
+            "params": {"id": request_id, **payload}
+        })
+
+    def final(result: Any = None, error: Optional[Dict[str, Any]] = None) -> str:
+        response = MCPResponse(jsonrpc="2.0", result=result, error=error, id=request_id)
+        return sse_event("message", response.model_dump())
+
+    if not redis_client:
+        yield final(error={"code": -32603, "message": "Redis client not initialized"})
+        return
+    if not query:
+        yield final(result={"error": "No query provided"})
+        return
+    try:
+        twin = await twins.get(args.get("twin_id"))
+    except UnknownTwinError as e:
+        yield final(result={"error": str(e)})
+        return
+
+    precomputed = precomputed_answer(twin, query, args)
+    if precomputed is not None:
+        yield notification({"sources": precomputed["sources"]})
+        yield notification({"token": precomputed["answer"]})
+        yield final(result={"result": precomputed["answer"]})
+        return
+
+    try:
+        results = await retrieve(twin, query, args)
+    except StageTimeoutError as e:
+        yield final(result={"error": str(e)})
+        return
+
+    yield notification({"sources": _source_summary(results)})
+    if not results:
+        yield final(result={"result": "I don't have specific information about that topic."})
+        return
+
+    chunk_ids = [r["id"] for r in results]
+    cached = await twin.answer_cache.get_async(query, chunk_ids, GROQ_MODEL)
+    if cached is not None:
+        yield notification({"token": cached["answer"]})
+        yield final(result={"result": cached["answer"]})
+        return
+
+    context = assemble_context(query, results)
+    tokens = []
+    try:
+        with span("generate"):
+            async for token in generate_response_stream(groq_client, query, context):
+                tokens.append(token)
+                yield notification({"token": token})
+    except Exception as e:
+        yield final(error={"code": -32603, "message": str(e)})
+        return
+
+    response = "".join(tokens)
+    if groq_client and response not in FALLBACK_RESPONSES:
+        await twin.answer_cache.set_async(query, chunk_ids, GROQ_MODEL, {"answer": response})
+    yield final(result={"result": response})
+
+# JSON-RPC method registry
+METHOD_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+    "initialize": handle_initialize,
+    "workspace/executeCommand": handle_execute_command,
+}
+
+def _error_response(code: int, message: str, request_id: Optional[int] = None) -> MCPResponse:
+    return MCPResponse(jsonrpc="2.0", error={"code": code, "message": message}, id=request_id)
+
+async def dispatch(data: Any) -> MCPResponse:
+    """Validate and route a single JSON-RPC request object"""
+    request_id = data.get("id") if isinstance(data, dict) else None
+    try:
+        mcp_request = MCPRequest(**data)
+    except Exception as e:
+        return _error_response(-32600, f"Invalid request: {str(e)}", request_id)
+
+    handler = METHOD_HANDLERS.get(mcp_request.method)
+    try:
+        if handler is None:
+            result = {"error": f"Unsupported method: {mcp_request.method}"}
+        else:
+            result = await handler(mcp_request.params or {})
+        return MCPResponse(jsonrpc="2.0", result=result, id=mcp_request.id)
+    except Exception as e:
+        return _error_response(-32603, str(e), mcp_request.id)
+
+def _is_notification(item: Any) -> bool:
+    """A JSON-RPC request without an "id" member, which gets no response"""
+    return isinstance(item, dict) and "id" not in item
+
+async def dispatch_batch(batch: List[Any]) -> List[MCPResponse]:
+    """Run a JSON-RPC batch concurrently, returning responses in request order.
+
+    Retrieval for every digitaltwin.query in the batch is coalesced into one
+    index pass before the calls are dispatched. Notifications are run but
+    left out of the responses, so a batch of only notifications returns [].
+    """
+    by_twin: Dict[str, List[str]] = {}
+    for args in (
+        _command_args(item.get("params") or {})
+        for item in batch
+        if isinstance(item, dict)
+        and item.get("method") == "workspace/executeCommand"
+        and (item.get("params") or {}).get("command") == "digitaltwin.query"
+    ):
+        if args.get("query") and _uses_default_retrieval(args):
+            queries = by_twin.setdefault(args.get("twin_id") or DEFAULT_TWIN_ID, [])
+            if args["query"] not in queries:
+                queries.append(args["query"])
+
+    prefetched: Dict[tuple, List[Dict[str, Any]]] = {}
+    for twin_id, queries in by_twin.items():
+        try:
+            twin = await twins.get(twin_id)
+            # Warmed-up questions are answered without retrieval
+            if twin.precomputed is not None:
+                queries = [q for q in queries if q not in twin.precomputed]
+            if not queries:
+                continue
+            with span("retrieve"):
+                results = await twin.retriever.search_batch(queries, DEFAULT_TOP_K)
+        except (UnknownTwinError, StageTimeoutError):
+            continue  # reported (or retried) by the per-call path
+        prefetched.update(((twin_id, q), r) for q, r in zip(queries, results))
+    _prefetched_results.set(prefetched)
+    responses = await asyncio.gather(*(dispatch(item) for item in batch))
+    return [response for item, response in zip(batch, responses) if not _is_notification(item)]
+
 # MCP Protocol Endpoint
 @app.post("/mcp")
 async def handle_mcp(request: Request):
-    """Handle MCP protocol requests"""
+    """Handle MCP protocol requests (single objects or JSON-RPC batches)"""
     try:
-        # Parse request
         data = await request.json()
-        mcp_request = MCPRequest(**data)
-        
-        # Route request to appropriate handler
-        if mcp_request.method == "initialize":
-            result = await handle_initialize(mcp_request.params or {})
-        elif mcp_request.method == "workspace/executeCommand":
-            result = await handle_execute_command(mcp_request.params or {})
-        else:
-            result = {"error": f"Unsupported method: {mcp_request.method}"}
-        
-        # Return response
-        return MCPResponse(
-            jsonrpc="2.0",
-            result=result,
-            id=mcp_request.id
-        )
-        
     except Exception as e:
-        return MCPResponse(
-            jsonrpc="2.0",
-            error={"code": -32603, "message": str(e)},
-            id=request.get("id") if isinstance(request, dict) else None
+        return _error_response(-32700, f"Parse error: {str(e)}")
+
+    if isinstance(data, list):
+        if not data:
+            return _error_response(-32600, "Invalid request: empty batch")
+        responses = await dispatch_batch(data)
+        # Nothing to return for a batch of notifications
+        return responses if responses else Response(status_code=204)
+
+    # A lone notification is run but, like a batch of them, gets no response
+    if _is_notification(data):
+        await dispatch(data)
+        return Response(status_code=204)
+
+    # Streamed queries answer with an SSE stream instead of one response
+    params = (data.get("params") or {}) if isinstance(data, dict) else {}
+    if (isinstance(data, dict)
+            and data.get("method") == "workspace/executeCommand"
+            and params.get("command") == "digitaltwin.query"
+            and _command_args(params).get("stream")):
+        return StreamingResponse(
+            stream_execute_command(data.get("id"), params),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
         )
 
+    return await dispatch(data)
+
 # Health Check Endpoint
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (cached connectivity state, no per-probe round trip)"""
+    redis_status = await redis_probe.status() if redis_probe else {"connected": False}
     return {
         "status": "ok",
         "service": "digital-twin-mcp",
-        "redis_connected": bool(redis_client and redis_client.ping())
+        "redis_connected": bool(redis_status["connected"]),
+        "checks": {"redis": redis_status},
+        "twins": {"available": sorted(twins.profiles), "loaded": twins.loaded(), **twins.stats},
+        "llm_gateway": groq_client.metrics() if groq_client else None
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, cache hit rates, chunk and token counts"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=3000)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Stdio transport for the Digital Twin MCP server
+
+Speaks newline-delimited JSON-RPC on stdin/stdout, for editor integrations
+that launch the server as a subprocess. `initialize` is answered straight
+away. Redis, Groq and the profile index are set up by importing
+mcp_server.py, which happens in the background on the first tool call.
+Later calls reuse the same warm twins and clients.
+
+Requests are handled concurrently: a client may pipeline several calls and
+gets each response as soon as it is ready, in completion order. JSON-RPC
+batches go through mcp_server's batch path (one retrieval pass per batch).
+
+Besides the MCP tools API (tools/list, tools/call with the
+"digitaltwin_query" tool), `workspace/executeCommand` works exactly as on
+the HTTP /mcp endpoint.
+
+    python mcp_stdio.py
+"""
+
+import os
+import sys
+import json
+import asyncio
+import importlib
+from typing import Any, Dict, Optional, TextIO
+
+from async_utils import run_blocking
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SERVER_NAME = "digital-twin-mcp"
+SERVER_VERSION = "1.0.0"
+PROTOCOL_VERSION = "2024-11-05"
+
+QUERY_TOOL = {
+    "name": "digitaltwin_query",
+    "description": "Ask the Digital Twin about the person's professional background, skills, "
+                   "experience and projects. Answers in first person from the profile.",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string", "description": "The question to answer"},
+            "twin_id": {"type": "string", "description": "Which profile to answer as (default twin when omitted)"},
+            "top_k": {"type": "integer", "description": "Chunks to retrieve (default: 3)"},
+            "types": {"type": "array", "items": {"type": "string"}, "description": "Only chunks of these types"},
+            "categories": {"type": "array", "items": {"type": "string"},
+                           "description": "Only chunks in these categories"}
+        },
+        "required": ["query"]
+    }
+}
+
+
+class LazyServer:
+    """Imports mcp_server.py once, off the event loop, on first use.
+
+    Concurrent first calls share one import; a failed import is retried on
+    the next call.
+    """
+
+    def __init__(self, module: str = "mcp_server"):
+        self.module = module
+        self._future: Optional[asyncio.Future] = None
+
+    async def get(self):
+        if self._future is None or (self._future.done() and self._future.exception()):
+            self._future = asyncio.ensure_future(run_blocking(importlib.import_module, self.module))
+        return await asyncio.shield(self._future)
+
+
+def _response(request_id: Any, result: Any = None, error: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    response = {"jsonrpc": "2.0", "id": request_id}
+    if error is not None:
+        response["error"] = error
+    else:
+        response["result"] = result
+    return response
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return _response(request_id, error={"code": code, "message": message})
+
+
+class StdioServer:
+    """Routes JSON-RPC messages from stdin to mcp_server and writes responses to stdout."""
+
+    def __init__(self, output: TextIO, server: Optional[LazyServer] = None):
+        self.output = output
+        self.server = server or LazyServer()
+
+    def write(self, message: Any) -> None:
+        # One line per message; written from the event loop thread only
+        self.output.write(json.dumps(message, default=str) + "\n")
+        self.output.flush()
+
+    def handle_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Answered without touching the server, so clients connect immediately"""
+        return {
+            "protocolVersion": params.get("protocolVersion") or PROTOCOL_VERSION,
+            "capabilities": {
+                "tools": {},
+                "executeCommandProvider": {"commands": ["digitaltwin.query", "digitaltwin.matchJobs"]}
+            },
+            "serverInfo": {"name": SERVER_NAME, "version": SERVER_VERSION}
+        }
+
+    async def call_tool(self, request_id: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        """tools/call for digitaltwin_query, run as digitaltwin.query"""
+        if params.get("name") != QUERY_TOOL["name"]:
+            return _error(request_id, -32602, f"Unknown tool: {params.get('name')}")
+        response = await self.execute(request_id, {
+            "command": "digitaltwin.query",
+            "arguments": [params.get("arguments") or {}]
+        })
+        if response.get("error"):
+            return _response(request_id, error=response["error"])
+        result = response["result"] or {}
+        text = result.get("result", result.get("error", ""))
+        return _response(request_id, {"content": [{"type": "text", "text": text}], "isError": "error" in result})
+
+    async def execute(self, request_id: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        server = await self.server.get()
+        response = await server.dispatch({
+            "jsonrpc": "2.0", "id": request_id, "method": "workspace/executeCommand", "params": params
+        })
+        return response.model_dump()
+
+    async def handle(self, message: Any) -> Optional[Any]:
+        """The response to one message (None for notifications)"""
+        try:
+            if isinstance(message, list):
+                if not message:
+                    return _error(None, -32600, "Invalid request: empty batch")
+                server = await self.server.get()
+                responses = [response.model_dump() for response in await server.dispatch_batch(message)]
+                return responses or None  # only notifications
+            if not isinstance(message, dict):
+                return _error(None, -32600, "Invalid request")
+
+            request_id = message.get("id")
+            method = message.get("method")
+            params = message.get("params") or {}
+            if request_id is None:
+                return None  # notifications/initialized, notifications/cancelled, ...
+            if method == "initialize":
+                return _response(request_id, self.handle_initialize(params))
+            if method == "ping":
+                return _response(request_id, {})
+            if method == "tools/list":
+                return _response(request_id, {"tools": [QUERY_TOOL]})
+            if method == "tools/call":
+                return await self.call_tool(request_id, params)
+            if method == "workspace/executeCommand":
+                return await self.execute(request_id, params)
+            return _error(request_id, -32601, f"Unsupported method: {method}")
+        except Exception as e:
+            request_id = message.get("id") if isinstance(message, dict) else None
+            return _error(request_id, -32603, str(e))
+
+    async def respond(self, message: Any) -> None:
+        response = await self.handle(message)
+        if response is not None:
+            self.write(response)
+
+    async def serve(self, reader: asyncio.StreamReader) -> None:
+        """Read messages until EOF, handling each as its own task"""
+        pending = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                self.write(_error(None, -32700, f"Parse error: {str(e)}"))
+                continue
+            task = asyncio.ensure_future(self.respond(message))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        # Finish in-flight calls before exiting
+        if pending:
+            await asyncio.gather(*pending)
+
+
+async def _stdin_reader() -> asyncio.StreamReader:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=1 << 24)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    return reader
+
+
+async def main() -> None:
+    # stdout carries the protocol; the modules' status prints go to stderr
+    output = sys.stdout
+    sys.stdout = sys.stderr
+    # The MCP server resolves its profile files relative to the working directory
+    os.chdir(PROJECT_ROOT)
+    await StdioServer(output).serve(await _stdin_reader())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+"""
+Profile file -> vector / Redis namespace mapping
+
+Shared by the embedding script and the servers' twin registry, so both
+agree on where a profile's vectors and keys live.
+"""
+
+import os
+
+
+def namespace_for(profile_path: str) -> str:
+    """Namespace for a profile file: digitaltwin_cedric.json -> "cedric".
+
+    digitaltwin.json maps to the default namespace, which is what the
+    servers query.
+    """
+    stem = os.path.splitext(os.path.basename(profile_path))[0]
+    if stem == "digitaltwin":
+        return ""
+    return stem[len("digitaltwin_"):] if stem.startswith("digitaltwin_") else stem
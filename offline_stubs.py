@@ -0,0 +1,277 @@
+"""
+Offline stand-ins for Redis, Groq and Upstash Vector
+
+Used by the benchmark and load-test harnesses so they run without network
+access or API keys. Each stand-in can simulate per-call latency and counts
+round trips, so the cost of remote calls is still visible in the numbers.
+"""
+
+import time
+import asyncio
+import functools
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from local_vectors import LocalVectorStore
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+def _command(func):
+    """Mark a FakeRedis method as a command costing one round trip."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self._round_trip()
+            return func(self, *args, **kwargs)
+    wrapper.raw = func
+    return wrapper
+
+
+class FakeRedis:
+    """In-memory subset of the redis-py client used by this project.
+
+    Values come back as bytes, like a real client without decode_responses.
+    Every command (or pipeline execute) counts as one round trip and sleeps
+    for `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self._data: Dict[bytes, Any] = {}
+        self._expires: Dict[bytes, float] = {}
+        self._lock = threading.RLock()
+
+    def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _live(self, key: bytes) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _hash(self, name) -> Dict[bytes, bytes]:
+        name = _to_bytes(name)
+        if not self._live(name):
+            self._data[name] = {}
+        return self._data[name]
+
+    @_command
+    def ping(self) -> bool:
+        return True
+
+    @_command
+    def get(self, key) -> Optional[bytes]:
+        key = _to_bytes(key)
+        return self._data[key] if self._live(key) else None
+
+    @_command
+    def set(self, key, value, ex: Optional[int] = None) -> bool:
+        key = _to_bytes(key)
+        self._data[key] = _to_bytes(value)
+        if ex:
+            self._expires[key] = time.monotonic() + ex
+        else:
+            self._expires.pop(key, None)
+        return True
+
+    @_command
+    def incr(self, key, amount: int = 1) -> int:
+        key = _to_bytes(key)
+        value = int(self._data[key] if self._live(key) else 0) + amount
+        self._data[key] = _to_bytes(value)
+        return value
+
+    @_command
+    def exists(self, *keys) -> int:
+        return sum(1 for k in keys if self._live(_to_bytes(k)))
+
+    @_command
+    def delete(self, *keys) -> int:
+        removed = 0
+        for k in keys:
+            k = _to_bytes(k)
+            removed += self._live(k)
+            self._data.pop(k, None)
+            self._expires.pop(k, None)
+        return removed
+
+    @_command
+    def hset(self, name, key=None, value=None, mapping: Optional[Dict[Any, Any]] = None) -> int:
+        h = self._hash(name)
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        added = 0
+        for k, v in items.items():
+            k = _to_bytes(k)
+            added += k not in h
+            h[k] = _to_bytes(v)
+        return added
+
+    @_command
+    def hget(self, name, key) -> Optional[bytes]:
+        return self._hash(name).get(_to_bytes(key))
+
+    @_command
+    def hgetall(self, name) -> Dict[bytes, bytes]:
+        return dict(self._hash(name))
+
+    @_command
+    def hkeys(self, name) -> List[bytes]:
+        return list(self._hash(name))
+
+    @_command
+    def hlen(self, name) -> int:
+        return len(self._hash(name))
+
+    @_command
+    def hdel(self, name, *keys) -> int:
+        h = self._hash(name)
+        return sum(1 for k in keys if h.pop(_to_bytes(k), None) is not None)
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def close(self) -> None:
+        pass
+
+
+class FakePipeline:
+    """Queues commands and runs them in one round trip on execute()."""
+
+    def __init__(self, client: FakeRedis):
+        self._client = client
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        command = getattr(FakeRedis, name, None)
+        if not hasattr(command, "raw"):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command.raw, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        with self._client._lock:
+            self._client._round_trip()
+            results = [func(self._client, *args, **kwargs) for func, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _stub_answer(messages: List[Dict[str, str]]) -> str:
+    question = messages[-1]["content"] if messages else ""
+    if "Question:" in question:
+        question = question.rsplit("Question:", 1)[1].split("\n", 1)[0]
+    return f"Stub answer to: {question.strip()}"
+
+
+def _completion(messages: List[Dict[str, str]], model: str) -> SimpleNamespace:
+    answer = _stub_answer(messages)
+    prompt_tokens = sum(_estimate_tokens(m["content"]) for m in messages)
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=answer))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=_estimate_tokens(answer),
+            total_tokens=prompt_tokens + _estimate_tokens(answer)
+        )
+    )
+
+
+def _stream_chunks(messages: List[Dict[str, str]]) -> List[SimpleNamespace]:
+    words = _stub_answer(messages).split(" ")
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=(w if i == 0 else " " + w)))])
+        for i, w in enumerate(words)
+    ]
+
+
+class _SyncCompletions:
+    def __init__(self, owner: "StubGroq"):
+        self._owner = owner
+
+    def create(self, messages, model: str = "", stream: bool = False, **kwargs):
+        self._owner.calls += 1
+        if self._owner.latency:
+            time.sleep(self._owner.latency)
+        if stream:
+            return iter(_stream_chunks(messages))
+        return _completion(messages, model)
+
+
+class _AsyncCompletions:
+    def __init__(self, owner: "StubAsyncGroq"):
+        self._owner = owner
+
+    async def create(self, messages, model: str = "", stream: bool = False, **kwargs):
+        self._owner.calls += 1
+        if self._owner.latency:
+            await asyncio.sleep(self._owner.latency)
+        if not stream:
+            return _completion(messages, model)
+
+        async def tokens():
+            for chunk in _stream_chunks(messages):
+                if self._owner.token_latency:
+                    await asyncio.sleep(self._owner.token_latency)
+                yield chunk
+        return tokens()
+
+
+class StubGroq:
+    """Drop-in for groq.Groq that answers instantly (or after `latency`)."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_SyncCompletions(self))
+
+
+class StubAsyncGroq:
+    """Drop-in for groq.AsyncGroq with configurable first-token and per-token latency."""
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self))
+
+
+class FakeVectorIndex:
+    """Async stand-in for upstash_vector.AsyncIndex backed by a LocalVectorStore.
+
+    Filters and namespaces are checked by the store's query().
+    """
+
+    def __init__(self, store: LocalVectorStore, latency: float = 0.0):
+        self.store = store
+        self.latency = latency
+        self.calls = 0
+
+    async def query(self, data: str, top_k: int = 10, include_metadata: bool = False, filter: str = "", **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.store.query(data, top_k, filter=filter, namespace=kwargs.get("namespace", ""))
+
+    async def info(self):
+        return self.store.info()
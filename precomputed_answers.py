@@ -0,0 +1,359 @@
+"""
+Precomputed answers to the profile's expected interview questions
+
+A warm-up job, run at deploy time or on a schedule, enumerates the questions
+in professional_profile.json's interview_prep section plus a configurable
+list. It runs them through a server's query pipeline with bounded
+concurrency and writes the answers, with their sources, to a JSON store next
+to the profile's index artifacts. The servers load the store with each twin
+and answer those questions from it without retrieval or generation.
+
+Every answer records a fingerprint of the chunks it was generated from.
+Servers ignore answers whose chunks have changed since; the warm-up job
+regenerates only those, and answers whose retrieval now returns different
+chunks.
+
+    python precomputed_answers.py --pipeline api
+    python precomputed_answers.py --pipeline mcp --twins default cedric
+    python precomputed_answers.py --questions-file extra_questions.txt --every 3600
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import importlib
+import importlib.util
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from answer_cache import normalize_question
+from index_artifact import default_index_dir
+
+PRECOMPUTED_ANSWERS = os.getenv("PRECOMPUTED_ANSWERS", "true").lower() == "true"
+INTERVIEW_PROFILE = os.getenv("INTERVIEW_PROFILE", "professional_profile.json")
+# interview_prep lists holding questions put to the candidate
+WARMUP_SECTIONS = [s.strip() for s in os.getenv("WARMUP_SECTIONS", "behavioral,technical,situational").split(",") if s.strip()]
+# Extra questions: a JSON list, or one question per line
+WARMUP_QUESTIONS_FILE = os.getenv("WARMUP_QUESTIONS_FILE") or None
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# Seconds between checks for a store rewritten by the warm-up job
+PRECOMPUTED_CHECK_INTERVAL = float(os.getenv("PRECOMPUTED_CHECK_INTERVAL", "5"))
+STORE_FORMAT = 1
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+# --- questions ---------------------------------------------------------------
+
+def interview_questions(profile_path: str = INTERVIEW_PROFILE, sections: Sequence[str] = WARMUP_SECTIONS) -> List[str]:
+    """Questions from the named lists anywhere under the profile's interview_prep."""
+    try:
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            prep = json.load(f).get('interview_prep', {})
+    except (OSError, ValueError) as e:
+        print(f"⚠️  No interview questions from {profile_path}: {str(e)}")
+        return []
+
+    questions = []
+
+    def walk(node: Any) -> None:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in sections and isinstance(value, list):
+                    questions.extend(q.strip() for q in value if isinstance(q, str) and q.strip())
+                else:
+                    walk(value)
+
+    walk(prep)
+    return questions
+
+
+def read_question_file(path: str) -> List[str]:
+    """A JSON list of questions, or a text file with one per line (# comments)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return [str(q).strip() for q in json.loads(text) if str(q).strip()]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+
+
+def expected_questions(
+    profile_path: str = INTERVIEW_PROFILE,
+    questions_file: Optional[str] = WARMUP_QUESTIONS_FILE,
+    extra: Iterable[str] = ()
+) -> List[str]:
+    """interview_prep questions plus the configured ones, without (normalized) duplicates."""
+    questions = interview_questions(profile_path)
+    if questions_file:
+        questions += read_question_file(questions_file)
+    questions += list(extra)
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_question(question), question)
+    return list(unique.values())
+
+
+# --- store -------------------------------------------------------------------
+
+def store_path(profile_path: str, pipeline: str) -> str:
+    """index/<profile>.answers.<pipeline>.json; each server pipeline has its own prompts and model."""
+    stem = os.path.splitext(os.path.basename(profile_path))[0]
+    return os.path.join(default_index_dir(profile_path), f"{stem}.answers.{pipeline}.json")
+
+
+def chunk_fingerprint(chunk: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(chunk, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def result_fingerprints(results: Sequence[Dict[str, Any]]) -> Dict[str, str]:
+    """Chunk ID -> fingerprint for a retrieval result list."""
+    return {r["id"]: chunk_fingerprint(r["metadata"] or {}) for r in results}
+
+
+class PrecomputedAnswers:
+    """Warm-up answers for one twin and pipeline, keyed by normalized question.
+
+    chunk_lookup(id) returns the twin's current chunk; answers generated from
+    chunks that changed or disappeared are not served.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model: str = "",
+        chunk_lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+        check_interval: float = PRECOMPUTED_CHECK_INTERVAL
+    ):
+        self.path = path
+        self.model = model
+        self.chunk_lookup = chunk_lookup
+        self.check_interval = check_interval
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.stale: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+        self._signature = None
+        self._checked_at = float("-inf")
+        self.refresh(force=True)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def is_current(self, entry: Dict[str, Any]) -> bool:
+        """Same model, and every source chunk unchanged."""
+        if entry.get("model") != self.model:
+            return False
+        if self.chunk_lookup is None:
+            return True
+        for chunk_id, fingerprint in entry.get("chunks", {}).items():
+            chunk = self.chunk_lookup(chunk_id)
+            if chunk is None or chunk_fingerprint(chunk) != fingerprint:
+                return False
+        return True
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload the store if the warm-up job rewrote it (at most once per interval)."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self._signature = signature
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f).get("answers", {})
+        except FileNotFoundError:
+            stored = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable precomputed answers {self.path}: {str(e)}")
+            stored = {}
+        self.entries, self.stale = {}, {}
+        for key, entry in stored.items():
+            (self.entries if self.is_current(entry) else self.stale)[key] = entry
+        if stored:
+            print(f"📝 Loaded {len(self.entries)} precomputed answers from {self.path}"
+                  + (f" ({len(self.stale)} stale)" if self.stale else ""))
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """{"question", "answer", "sources", ...} for a warmed-up question, or None."""
+        self.refresh()
+        key = normalize_question(question)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+        elif key in self.stale:
+            self.stats["stale"] += 1
+        else:
+            self.stats["misses"] += 1
+        return entry
+
+    def __contains__(self, question: str) -> bool:
+        self.refresh()
+        return normalize_question(question) in self.entries
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """The stored entry, current or stale, without touching the stats."""
+        key = normalize_question(question)
+        return self.entries.get(key) or self.stale.get(key)
+
+    def put(self, question: str, answer: str, sources: List[Dict[str, Any]], chunks: Dict[str, str]) -> None:
+        key = normalize_question(question)
+        self.stale.pop(key, None)
+        self.entries[key] = {
+            "question": question,
+            "answer": answer,
+            "sources": sources,
+            "chunks": chunks,
+            "model": self.model,
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        }
+
+    def retain(self, questions: Iterable[str]) -> None:
+        """Forget answers to questions that are no longer on the list."""
+        keep = {normalize_question(q) for q in questions}
+        self.entries = {k: v for k, v in self.entries.items() if k in keep}
+        self.stale = {k: v for k, v in self.stale.items() if k in keep}
+
+    def save(self) -> None:
+        """Write the store atomically; serving processes pick it up on their next check."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"format": STORE_FORMAT, "answers": {**self.stale, **self.entries}}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._signature = self._file_signature()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# --- warm-up -----------------------------------------------------------------
+
+# (twin, question, retrieval results) -> (answer or None, sources)
+AnswerFn = Callable[[Any, str, List[Dict[str, Any]]], Awaitable[Tuple[Optional[str], List[Dict[str, Any]]]]]
+
+
+async def warm_up(
+    twin,
+    questions: Sequence[str],
+    answer_fn: AnswerFn,
+    top_k: int = 3,
+    concurrency: int = WARMUP_CONCURRENCY,
+    force: bool = False
+) -> Dict[str, int]:
+    """Answer `questions` for one twin into its store, regenerating only what changed."""
+    store: PrecomputedAnswers = twin.precomputed
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    counts = {"generated": 0, "unchanged": 0, "failed": 0}
+
+    async def answer(question: str) -> None:
+        async with semaphore:
+            try:
+                results = await twin.retriever.search(question, top_k)
+                chunks = result_fingerprints(results)
+                current = store.lookup(question)
+                if (not force and current is not None and current.get("chunks") == chunks
+                        and store.is_current(current)):
+                    counts["unchanged"] += 1
+                    return
+                text, sources = await answer_fn(twin, question, results) if results else (None, [])
+            except Exception as e:
+                print(f"❌ Warm-up failed for {question!r}: {str(e)}")
+                counts["failed"] += 1
+                return
+            if not text:
+                print(f"⚠️  No answer generated for {question!r}")
+                counts["failed"] += 1
+                return
+            store.put(question, text, sources, chunks)
+            counts["generated"] += 1
+
+    await asyncio.gather(*(answer(q) for q in questions))
+    store.retain(questions)
+    store.save()
+    return counts
+
+
+def load_pipeline(name: str):
+    """Import a server module ("api": backend/main.py, "mcp": mcp_server.py); it loads its twins on import."""
+    cwd = os.getcwd()
+    # The MCP server resolves its profile files relative to the working directory
+    os.chdir(PROJECT_ROOT)
+    try:
+        if name == "api":
+            spec = importlib.util.spec_from_file_location(
+                "backend_main", os.path.join(PROJECT_ROOT, "backend", "main.py")
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return module
+        return importlib.import_module("mcp_server")
+    finally:
+        os.chdir(cwd)
+
+
+async def run_warm_up(server, args: argparse.Namespace) -> bool:
+    """One warm-up pass over the requested twins; False if any answer failed."""
+    questions = expected_questions(args.profile, args.questions_file, args.question or [])
+    if not questions:
+        print("❌ No questions to warm up")
+        return False
+    print(f"🔎 Warming up {len(questions)} questions through the {args.pipeline} pipeline")
+
+    ok = True
+    for twin_id in args.twins or sorted(server.twins.profiles):
+        try:
+            twin = await server.twins.get(twin_id)
+        except Exception as e:
+            print(f"❌ Could not load twin {twin_id}: {str(e)}")
+            ok = False
+            continue
+        if twin.precomputed is None:
+            print("⚠️  Precomputed answers are disabled (PRECOMPUTED_ANSWERS=false)")
+            return False
+        start = time.perf_counter()
+        counts = await warm_up(
+            twin, questions, server.precompute_answer,
+            top_k=server.DEFAULT_TOP_K, concurrency=args.concurrency, force=args.force
+        )
+        ok = ok and not counts["failed"]
+        print(f"✅ Twin {twin_id}: {counts['generated']} generated, {counts['unchanged']} unchanged, "
+              f"{counts['failed']} failed in {time.perf_counter() - start:.1f}s -> {twin.precomputed.path}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute answers to expected interview questions")
+    parser.add_argument("--pipeline", choices=["api", "mcp"], default="api",
+                        help="server whose query pipeline generates the answers")
+    parser.add_argument("--twins", nargs="+", help="twin IDs to warm up (default: all)")
+    parser.add_argument("--profile", default=os.path.join(PROJECT_ROOT, INTERVIEW_PROFILE), help="profile with the interview_prep section")
+    parser.add_argument("--questions-file", default=WARMUP_QUESTIONS_FILE, help="extra questions (JSON list or lines)")
+    parser.add_argument("--question", action="append", help="an extra question (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY, help="questions answered at once")
+    parser.add_argument("--force", action="store_true", help="regenerate every answer")
+    parser.add_argument("--every", type=float, default=0, help="repeat every N seconds instead of exiting")
+    args = parser.parse_args()
+    server = load_pipeline(args.pipeline)
+
+    if args.every <= 0:
+        sys.exit(0 if asyncio.run(run_warm_up(server, args)) else 1)
+
+    async def schedule():
+        while True:
+            await run_warm_up(server, args)
+            await asyncio.sleep(args.every)
+
+    asyncio.run(schedule())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Lightweight CPU reranking of retrieval candidates
+
+Retrieval over-fetches candidates; the reranker rescores them against the
+query with cheap features computed in NumPy over the whole candidate batch:
+
+- field-weighted term coverage: which query terms appear in the title (with
+  the chunk's type and category), the tags/technologies and the content,
+  weighted by rarity within the batch
+- term proximity: how close together distinct query terms occur in content
+- the first-stage rank, so fusion evidence is kept as a prior
+
+Featurization stops when the time budget runs out; candidates that were
+not scored keep their first-stage order after the scored ones.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from bm25_index import tokenize
+
+RERANK_ENABLED = os.getenv("RERANK", "true").lower() == "true"
+# Candidates fetched and rescored per query before cutting to top_k
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "10"))
+# Content tokens considered for proximity
+RERANK_MAX_TOKENS = 400
+# Query terms considered (pairwise proximity grows quadratically)
+RERANK_MAX_TERMS = 8
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "content": 1.0}
+# Mix of the final score. Coverage dominates so a chunk *about* the query
+# (title, type, category) beats one that only mentions its terms, which is
+# what lets hybrid fusion match BM25 alone on golden_queries.json
+PRIOR_WEIGHT = 0.25
+COVERAGE_WEIGHT = 0.7
+PROXIMITY_WEIGHT = 0.05
+FEATURE_CACHE_SIZE = 50000
+
+_FAR = 1 << 20
+
+
+class Reranker:
+    """Rescores fused retrieval results for one query within a time budget."""
+
+    def __init__(
+        self,
+        candidates: int = RERANK_CANDIDATES,
+        budget_ms: float = RERANK_BUDGET_MS,
+        field_weights: Dict[str, float] = FIELD_WEIGHTS
+    ):
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+        self.field_weights = field_weights
+        # Chunk ID -> (title terms, tag terms, content tokens); chunks are immutable per index
+        self._features: "OrderedDict[str, Tuple[frozenset, frozenset, Tuple[str, ...]]]" = OrderedDict()
+        self.stats = {"queries": 0, "candidates": 0, "over_budget": 0}
+
+    @property
+    def fingerprint(self) -> str:
+        """The settings that shape its rankings, for cache keys."""
+        fields = ",".join(f"{name}={weight:g}" for name, weight in sorted(self.field_weights.items()))
+        return (
+            f"rerank:{self.candidates}:{PRIOR_WEIGHT:g}/{COVERAGE_WEIGHT:g}/{PROXIMITY_WEIGHT:g}"
+            f":{fields}:{RERANK_MAX_TOKENS}:{RERANK_MAX_TERMS}"
+        )
+
+    def _chunk_features(self, doc_id: str, chunk: Dict[str, Any]) -> Tuple[frozenset, frozenset, Tuple[str, ...]]:
+        features = self._features.get(doc_id)
+        if features is not None:
+            self._features.move_to_end(doc_id)
+            return features
+        metadata = chunk.get("metadata", {}) or {}
+        tags = [
+            str(v)
+            for field in ("tags", "technologies")
+            for v in (metadata.get(field) or [])
+            if isinstance(metadata.get(field), list)
+        ]
+        # Type and category name what the chunk is about, like its title
+        heading = " ".join((str(chunk.get("title", "")), str(chunk.get("type", "")), str(metadata.get("category", ""))))
+        features = (
+            frozenset(tokenize(heading)),
+            frozenset(tokenize(" ".join(tags))),
+            tuple(tokenize(chunk.get("content", ""))[:RERANK_MAX_TOKENS])
+        )
+        self._features[doc_id] = features
+        if len(self._features) > FEATURE_CACHE_SIZE:
+            self._features.popitem(last=False)
+        return features
+
+    def rerank(self, query: str, results: Sequence[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Return the best top_k of `results`, which arrive in first-stage order."""
+        terms = list(dict.fromkeys(tokenize(query)))[:RERANK_MAX_TERMS]
+        if not terms or len(results) <= 1:
+            return list(results[:top_k])
+
+        deadline = time.perf_counter() + self.budget_ms / 1e3
+        features = []
+        for result in results:
+            features.append(self._chunk_features(str(result["id"]), result.get("metadata") or {}))
+            if time.perf_counter() > deadline:
+                self.stats["over_budget"] += 1
+                break
+        self.stats["queries"] += 1
+        self.stats["candidates"] += len(features)
+
+        scores = self._score(terms, features, total=len(results))
+        order = np.argsort(-scores, kind="stable")
+        reranked = [dict(results[i], score=round(float(scores[i]), 6)) for i in order]
+        return (reranked + list(results[len(features):]))[:top_k]
+
+    def _score(
+        self,
+        terms: List[str],
+        features: Sequence[Tuple[frozenset, frozenset, Tuple[str, ...]]],
+        total: int
+    ) -> np.ndarray:
+        term_ids = {t: j for j, t in enumerate(terms)}
+        count, width = len(features), len(terms)
+
+        # (candidates x terms) presence per field
+        title = np.zeros((count, width), dtype=bool)
+        tags = np.zeros((count, width), dtype=bool)
+        content = np.zeros((count, width), dtype=bool)
+        length = min(RERANK_MAX_TOKENS, max((len(f[2]) for f in features), default=0)) or 1
+        # Content as query-term IDs, -1 for other words
+        positions = np.full((count, length), -1, dtype=np.int16)
+        for i, (title_terms, tag_terms, tokens) in enumerate(features):
+            for term, j in term_ids.items():
+                title[i, j] = term in title_terms
+                tags[i, j] = term in tag_terms
+            ids = [term_ids.get(t, -1) for t in tokens]
+            if ids:
+                positions[i, :len(ids)] = ids
+        for j in range(width):
+            content[:, j] = (positions == j).any(axis=1)
+
+        # Rarer terms (within this batch) count for more
+        df = (title | tags | content).sum(axis=0)
+        idf = np.log1p(count / (df + 0.5))
+        weights = idf / idf.sum() if idf.sum() else np.full(width, 1.0 / width)
+        field_total = sum(self.field_weights.values())
+        coverage = (
+            self.field_weights["title"] * (title @ weights)
+            + self.field_weights["tags"] * (tags @ weights)
+            + self.field_weights["content"] * (content @ weights)
+        ) / field_total
+
+        proximity = self._proximity(positions, width)
+        prior = 1.0 - np.arange(count) / max(total, 1)
+        return PRIOR_WEIGHT * prior + COVERAGE_WEIGHT * coverage + PROXIMITY_WEIGHT * proximity
+
+    @staticmethod
+    def _proximity(positions: np.ndarray, width: int) -> np.ndarray:
+        """Mean over query-term pairs of 1 / (closest distance in content)."""
+        count = positions.shape[0]
+        if width < 2:
+            return np.zeros(count)
+        index = np.arange(positions.shape[1])
+        # Position of the latest occurrence of each term at or before each token
+        last_seen = [
+            np.maximum.accumulate(np.where(positions == j, index, -_FAR), axis=1)
+            for j in range(width)
+        ]
+        total = np.zeros(count)
+        pairs = 0
+        for a in range(width):
+            for b in range(a + 1, width):
+                ab = np.where(positions == b, index - last_seen[a], _FAR).min(axis=1)
+                ba = np.where(positions == a, index - last_seen[b], _FAR).min(axis=1)
+                distance = np.minimum(ab, ba)
+                total += np.where(distance < _FAR, 1.0 / np.maximum(distance, 1), 0.0)
+                pairs += 1
+        return total / pairs
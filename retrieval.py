@@ -0,0 +1,370 @@
+"""
+Hybrid retrieval pipeline shared by the MCP and REST servers
+
+Lexical (BM25) and dense (local NumPy store or Upstash Vector) search run in
+parallel, and their rankings are fused with weighted reciprocal-rank fusion.
+The fused candidates are optionally rescored by the CPU reranker (see
+reranker.py) before cutting to top_k. Results can be filtered by chunk `type` and
+`metadata.category`. Query embeddings and ranked results can be cached
+across calls (see retrieval_cache.py).
+"""
+
+import os
+import asyncio
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Sequence, Set
+
+import numpy as np
+
+from async_utils import run_blocking, with_timeout, RETRIEVAL_TIMEOUT
+from bm25_index import BM25Index
+from chunk_store import ChunkStore
+from local_vectors import LocalVectorStore
+from telemetry import span
+from index_artifact import open_artifact
+from reranker import Reranker, RERANK_ENABLED
+from retrieval_cache import RetrievalCache
+
+# "hybrid", "lexical" or "dense". "lexical" skips the vector index entirely
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Reciprocal-rank fusion constant (Cormack et al. use 60)
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Weight of the BM25 ranking relative to the dense one in fusion
+RRF_LEXICAL_WEIGHT = float(os.getenv("RRF_LEXICAL_WEIGHT", "2"))
+# Candidates taken from each retriever before fusion
+FUSION_CANDIDATES = int(os.getenv("FUSION_CANDIDATES", "20"))
+# Largest top_k a client may request (the servers clamp or reject larger ones)
+MAX_TOP_K = int(os.getenv("MAX_TOP_K", "20"))
+# Remote-only vector hits (not in the loaded profile) kept for lookup by ID
+REMOTE_HITS_SIZE = int(os.getenv("REMOTE_HITS_SIZE", "1024"))
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    k: int = RRF_K,
+    weights: Optional[Sequence[float]] = None
+) -> List[tuple]:
+    """Fuse ranked ID lists into (id, score) pairs, best first.
+
+    weights scale each ranking's contribution (all 1.0 when omitted).
+    """
+    scores: Dict[str, float] = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if weights is not None else 1.0
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _upstash_filter(types: Optional[Sequence[str]], categories: Optional[Sequence[str]]) -> str:
+    def clause(field: str, values: Sequence[str]) -> str:
+        quoted = ", ".join("'" + v.replace("'", "\\'") + "'" for v in values)
+        return f"{field} IN ({quoted})"
+
+    clauses = []
+    if types:
+        clauses.append(clause("type", types))
+    if categories:
+        clauses.append(clause("category", categories))
+    return " AND ".join(clauses)
+
+
+def _chunk_from_vector_metadata(doc_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild a content chunk from the flattened metadata stored with a vector."""
+    return {
+        "id": doc_id,
+        "title": metadata.get('title', ''),
+        "content": metadata.get('content', ''),
+        "type": metadata.get('type', ''),
+        "metadata": {"category": metadata.get('category', ''), "tags": metadata.get('tags', [])}
+    }
+
+
+class HybridRetriever:
+    """Runs lexical and dense retrieval concurrently and fuses them with RRF."""
+
+    def __init__(
+        self,
+        chunks: Sequence[Dict[str, Any]],
+        lexical: Optional[BM25Index] = None,
+        dense=None,
+        rrf_k: int = RRF_K,
+        lexical_weight: float = RRF_LEXICAL_WEIGHT,
+        candidates: int = FUSION_CANDIDATES,
+        reranker: Optional[Reranker] = None,
+        cache: Optional[RetrievalCache] = None
+    ):
+        self.chunks = chunks
+        self.lexical = lexical
+        self.dense = dense
+        self.rrf_k = rrf_k
+        self.lexical_weight = lexical_weight
+        self.reranker = reranker
+        self.cache = cache
+        # Hits the remote index returned that the loaded profile doesn't hold;
+        # kept apart (LRU-bounded) so the profile's chunks never change
+        self._remote: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Over-fetch enough from each side for the reranker to choose from
+        self.candidates = max(candidates, reranker.candidates) if reranker else candidates
+
+        self._by_type: Dict[str, Set[int]] = {}
+        self._by_category: Dict[str, Set[int]] = {}
+        if isinstance(chunks, ChunkStore):
+            # Share the store's ID index; filters use its type / category positions
+            self.doc_ids: List[str] = chunks.ids
+            self._positions = chunks.positions
+        else:
+            self.doc_ids = (
+                list(lexical.doc_ids) if lexical is not None
+                else [str(c.get('id', f"chunk:{i}")) for i, c in enumerate(chunks)]
+            )
+            self._positions = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+            for i, chunk in enumerate(chunks):
+                self._by_type.setdefault(chunk.get('type', ''), set()).add(i)
+                category = (chunk.get('metadata', {}) or {}).get('category', '')
+                self._by_category.setdefault(category, set()).add(i)
+
+    @property
+    def fingerprint(self) -> str:
+        """Retrieval mode, fusion and reranker settings: what shapes a ranking besides the data."""
+        sides = []
+        if self.lexical is not None:
+            sides.append("lexical")
+        if self.dense is not None:
+            sides.append("local_dense" if isinstance(self.dense, LocalVectorStore) else "remote_dense")
+        reranker = self.reranker.fingerprint if self.reranker else "no_rerank"
+        return f"{'+'.join(sides)}:rrf={self.rrf_k}/{self.lexical_weight:g}:{self.candidates}:{reranker}"
+
+    def chunk(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """The chunk with this ID, or None."""
+        position = self._positions.get(doc_id)
+        if position is not None:
+            return self.chunks[position]
+        return self._remote.get(doc_id)
+
+    def _allowed(self, types: Optional[Sequence[str]], categories: Optional[Sequence[str]]) -> Optional[Set[int]]:
+        """Doc positions passing the filters, or None when unfiltered."""
+        allowed = None
+        store = self.chunks if isinstance(self.chunks, ChunkStore) else None
+        if types:
+            allowed = set().union(*(
+                store.with_type(t) if store is not None else self._by_type.get(t, ()) for t in types
+            ))
+        if categories:
+            by_category = set().union(*(
+                store.in_category(c) if store is not None else self._by_category.get(c, ()) for c in categories
+            ))
+            allowed = by_category if allowed is None else allowed & by_category
+        return allowed
+
+    def _lexical_rankings(self, queries: Sequence[str], allowed: Optional[Set[int]]) -> List[List[str]]:
+        if self.lexical is None:
+            return [[] for _ in queries]
+        return [
+            [self.doc_ids[doc] for doc, _ in self.lexical.search(query, self.candidates, allowed)]
+            for query in queries
+        ]
+
+    async def _dense_rankings(
+        self,
+        queries: Sequence[str],
+        allowed: Optional[Set[int]],
+        types: Optional[Sequence[str]],
+        categories: Optional[Sequence[str]]
+    ) -> List[List[str]]:
+        if self.dense is None:
+            return [[] for _ in queries]
+
+        if isinstance(self.dense, LocalVectorStore):
+            mask = None
+            if allowed is not None:
+                mask = np.zeros(len(self.dense.ids), dtype=bool)
+                mask[list(allowed)] = True
+            batches = await run_blocking(self._local_dense, queries, mask)
+            return [[r.id for r in batch] for batch in batches]
+
+        # Remote index (upstash_vector AsyncIndex): one request per uncached query, in parallel
+        filter_expr = _upstash_filter(types, categories)
+        hits = (
+            await self._cache_call(self.cache.get_dense, queries, filter_expr, self.candidates)
+            if self.cache else [None] * len(queries)
+        )
+        missing = [i for i, h in enumerate(hits) if h is None]
+        if missing:
+            responses = await asyncio.gather(*(
+                self.dense.query(data=queries[i], top_k=self.candidates, include_metadata=True, filter=filter_expr)
+                for i in missing
+            ))
+            fresh = [[[str(r.id), r.metadata or {}] for r in response] for response in responses]
+            for i, response_hits in zip(missing, fresh):
+                hits[i] = response_hits
+            if self.cache:
+                await self._cache_call(
+                    self.cache.set_dense, [queries[i] for i in missing], filter_expr, self.candidates, fresh
+                )
+
+        rankings = []
+        for query_hits in hits:
+            ranking = []
+            for doc_id, metadata in query_hits:
+                if doc_id not in self._positions:
+                    self._remember(doc_id, metadata)
+                ranking.append(doc_id)
+            rankings.append(ranking)
+        return rankings
+
+    def _local_dense(self, queries: Sequence[str], mask: Optional[np.ndarray]):
+        """Local vector search (blocking), reusing cached query embeddings."""
+        if self.cache is None:
+            return self.dense.query_batch(queries, self.candidates, mask)
+        vectors = self.cache.get_embeddings(queries)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = self.dense.embed([queries[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            self.cache.set_embeddings([queries[i] for i in missing], fresh)
+        return self.dense.query_vectors(np.vstack(vectors), self.candidates, mask)
+
+    async def _cache_call(self, func, *args):
+        """Cache calls that may hit Redis run on the blocking pool."""
+        if self.cache.redis_client is None:
+            return func(*args)
+        return await run_blocking(func, *args)
+
+    def _remember(self, doc_id: str, metadata: Dict[str, Any]) -> None:
+        """Keep remote-only hits addressable by ID."""
+        self._remote[doc_id] = _chunk_from_vector_metadata(doc_id, metadata)
+        self._remote.move_to_end(doc_id)
+        while len(self._remote) > REMOTE_HITS_SIZE:
+            self._remote.popitem(last=False)
+
+    async def search_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 3,
+        types: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Retrieve for several queries, serving repeats from the cache when set."""
+        if self.cache is None:
+            return await self._search_batch(queries, top_k, types, categories)
+
+        await self.cache.refresh_version_async()
+        pipeline = self.fingerprint
+        cached = await self._cache_call(self.cache.get_results, queries, top_k, types, categories, pipeline)
+        results = [self._from_ranking(ranking) for ranking in cached]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            fresh = await self._search_batch([queries[i] for i in missing], top_k, types, categories)
+            for i, ranked in zip(missing, fresh):
+                results[i] = ranked
+            await self._cache_call(
+                self.cache.set_results, [queries[i] for i in missing], top_k, types, categories,
+                [[[r["id"], r["score"]] for r in ranked] for ranked in fresh], pipeline
+            )
+        return results
+
+    def _from_ranking(self, ranking: Optional[List[list]]) -> Optional[List[Dict[str, Any]]]:
+        """Rebuild cached [id, score] pairs into results (None if an ID is unknown here)."""
+        if ranking is None:
+            return None
+        chunks = [self.chunk(doc_id) for doc_id, _ in ranking]
+        if any(chunk is None for chunk in chunks):
+            return None
+        return [
+            {"id": doc_id, "score": score, "metadata": chunk}
+            for (doc_id, score), chunk in zip(ranking, chunks)
+        ]
+
+    async def _search_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int,
+        types: Optional[Sequence[str]],
+        categories: Optional[Sequence[str]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Lexical and dense sides run concurrently, then fusion and reranking."""
+        allowed = self._allowed(types, categories)
+        remote = self.dense is not None and not isinstance(self.dense, LocalVectorStore)
+        if allowed is not None and not allowed and not remote:
+            return [[] for _ in queries]
+
+        # Start dense search and yield once so its thread or HTTP request is
+        # in flight, then run the (inline, sub-ms) lexical side meanwhile
+        dense = asyncio.ensure_future(with_timeout(
+            self._dense_rankings(queries, allowed, types, categories), RETRIEVAL_TIMEOUT, "dense retrieval"
+        ))
+        await asyncio.sleep(0)
+        lexical = self._lexical_rankings(queries, allowed)
+        try:
+            dense_rankings = await dense
+        except Exception as e:
+            # Degrade to keyword-only results rather than failing the query
+            if self.lexical is None:
+                raise
+            print(f"⚠️  Dense retrieval failed, using keyword results only: {str(e)}")
+            dense_rankings = [[] for _ in queries]
+
+        limit = max(top_k, self.reranker.candidates) if self.reranker else top_k
+        with span("fuse"):
+            results = []
+            for lexical_ranking, dense_ranking in zip(lexical, dense_rankings):
+                fused = reciprocal_rank_fusion(
+                    [lexical_ranking, dense_ranking], self.rrf_k, (self.lexical_weight, 1.0)
+                )
+                results.append([
+                    {
+                        "id": doc_id,
+                        "score": score,
+                        "metadata": self.chunk(doc_id)
+                    }
+                    for doc_id, score in fused[:limit]
+                ])
+        if self.reranker:
+            with span("rerank"):
+                results = [self.reranker.rerank(query, ranked, top_k) for query, ranked in zip(queries, results)]
+        results = [ranked[:top_k] for ranked in results]
+        return results
+
+    async def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        types: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve the top_k fused results for one query."""
+        return (await self.search_batch([query], top_k, types, categories))[0]
+
+
+def load_local_dense(json_path: str, chunks: Optional[Sequence[Dict[str, Any]]] = None) -> LocalVectorStore:
+    """Local vector store for json_path, from the compiled artifact if present.
+
+    chunks are json_path's already loaded content chunks, if any.
+    """
+    artifact = open_artifact(json_path)
+    if artifact is not None:
+        return artifact.vector_store()
+    return LocalVectorStore.load_or_build(json_path, chunks=chunks)
+
+
+def build_retriever(
+    chunks: Sequence[Dict[str, Any]],
+    lexical: Optional[BM25Index],
+    dense,
+    mode: str = RETRIEVAL_MODE,
+    rerank: bool = RERANK_ENABLED,
+    cache: Optional[RetrievalCache] = None
+) -> HybridRetriever:
+    """Build the retriever for the configured mode ("hybrid", "lexical" or "dense")."""
+    reranker = Reranker() if rerank else None
+    if mode == "lexical" or dense is None:
+        return HybridRetriever(
+            chunks, lexical=lexical or BM25Index.from_chunks(chunks), reranker=reranker, cache=cache
+        )
+    if mode == "dense":
+        return HybridRetriever(chunks, dense=dense, reranker=reranker, cache=cache)
+    return HybridRetriever(
+        chunks, lexical=lexical or BM25Index.from_chunks(chunks), dense=dense, reranker=reranker, cache=cache
+    )
@@ -0,0 +1,250 @@
+"""
+Two-level cache in front of the retrieval pipeline
+
+Level 1 caches the dense side of a query by its normalized text: the query
+embedding for the local vector store, or the ranked hits of a remote
+(Upstash Vector) query, which is where the remote embedding model runs.
+Level 2 caches the final ranked chunk IDs for (query, top_k, filters) and
+the retriever's pipeline fingerprint (mode, fusion and reranker settings),
+so processes sharing Redis with different settings never share rankings.
+
+Both levels are bounded in-process LRUs. Level-2 entries and remote hits are
+also written to Redis when a client is given, so restarts and other workers
+share them; local embeddings are cheaper to recompute than to fetch and stay
+in-process. Every key includes the index version: the profile's content
+version plus a generation counter that embed_profile.py bumps in Redis after
+re-embedding, so entries from an older index stop matching.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from async_utils import run_blocking
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE", "true").lower() == "true"
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+# Shared Redis tier (and index version counter); Upstash Redis when unset
+RETRIEVAL_CACHE_REDIS_URL = os.getenv("RETRIEVAL_CACHE_REDIS_URL") or None
+# Seconds between reads of the index version counter
+INDEX_VERSION_CHECK_INTERVAL = float(os.getenv("INDEX_VERSION_CHECK_INTERVAL", "5"))
+REDIS_PREFIX = "digital_twin:retrieval"
+INDEX_VERSION_PREFIX = "digital_twin:index_version"
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used in cache keys."""
+    return " ".join(query.lower().split())
+
+
+def index_version_key(namespace: str = "") -> str:
+    return f"{INDEX_VERSION_PREFIX}:{namespace or 'default'}"
+
+
+def bump_index_version(redis_client, namespace: str = "") -> int:
+    """Invalidate cached retrieval for a namespace after its vectors changed."""
+    return int(redis_client.incr(index_version_key(namespace)))
+
+
+class _LRU:
+    """Thread-safe, size-bounded LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RetrievalCache:
+    """Query-embedding (level 1) and ranked-result (level 2) cache for one index."""
+
+    def __init__(
+        self,
+        data_version: str = "",
+        redis_client=None,
+        namespace: str = "",
+        max_entries: int = RETRIEVAL_CACHE_SIZE,
+        ttl: float = RETRIEVAL_CACHE_TTL,
+        version_check_interval: float = INDEX_VERSION_CHECK_INTERVAL
+    ):
+        self.data_version = data_version
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.generation = 0
+        self._checked_at = float("-inf")
+        self._embeddings = _LRU(max_entries, ttl)
+        self._dense = _LRU(max_entries, ttl)
+        self._results = _LRU(max_entries, ttl)
+        self._stats = {
+            "embedding_hits": 0, "embedding_misses": 0,
+            "result_hits": 0, "result_misses": 0, "redis_hits": 0
+        }
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        evictions = self._embeddings.evictions + self._dense.evictions + self._results.evictions
+        return {**self._stats, "evictions": evictions}
+
+    @property
+    def version(self) -> str:
+        return f"{self.data_version}.{self.generation}"
+
+    def refresh_version(self) -> None:
+        """Pick up a re-embed announced through Redis (at most once per interval)."""
+        now = time.monotonic()
+        if self.redis_client is None or now - self._checked_at < self.version_check_interval:
+            return
+        self._checked_at = now
+        try:
+            generation = int(self.redis_client.get(index_version_key(self.namespace)) or 0)
+        except Exception as e:
+            print(f"⚠️  Index version check failed: {str(e)}")
+            return
+        if generation != self.generation:
+            self.generation = generation
+            # Old entries can no longer match; free the memory now
+            for level in (self._embeddings, self._dense, self._results):
+                level.clear()
+
+    async def refresh_version_async(self) -> None:
+        if self.redis_client is not None and time.monotonic() - self._checked_at >= self.version_check_interval:
+            await run_blocking(self.refresh_version)
+
+    # --- shared tier ---------------------------------------------------------
+
+    def _redis_key(self, key: str) -> str:
+        return f"{REDIS_PREFIX}:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    def _lookup(self, level: _LRU, keys: Sequence[str], counter: str) -> List[Any]:
+        """Local lookups, with one pipelined Redis round trip for the misses."""
+        values = [level.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and self.redis_client is not None:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for i in missing:
+                    pipe.get(self._redis_key(keys[i]))
+                for i, raw in zip(missing, pipe.execute()):
+                    if raw:
+                        values[i] = json.loads(raw)
+                        level.set(keys[i], values[i])
+                        self._stats["redis_hits"] += 1
+            except Exception as e:
+                print(f"⚠️  Retrieval cache Redis lookup failed: {str(e)}")
+        hits = sum(value is not None for value in values)
+        self._stats[f"{counter}_hits"] += hits
+        self._stats[f"{counter}_misses"] += len(values) - hits
+        return values
+
+    def _store(self, level: _LRU, keys: Sequence[str], values: Sequence[Any]) -> None:
+        for key, value in zip(keys, values):
+            level.set(key, value)
+        if self.redis_client is not None and keys:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, value in zip(keys, values):
+                    pipe.set(self._redis_key(key), json.dumps(value), ex=max(1, int(self.ttl)))
+                pipe.execute()
+            except Exception as e:
+                print(f"⚠️  Retrieval cache Redis write failed: {str(e)}")
+
+    # --- level 1: query embeddings / remote dense hits -----------------------
+
+    def get_embeddings(self, queries: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [f"{self.version}|{normalize_query(q)}" for q in queries]
+        vectors = [self._embeddings.get(key) for key in keys]
+        hits = sum(v is not None for v in vectors)
+        self._stats["embedding_hits"] += hits
+        self._stats["embedding_misses"] += len(vectors) - hits
+        return vectors
+
+    def set_embeddings(self, queries: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        for query, vector in zip(queries, vectors):
+            self._embeddings.set(f"{self.version}|{normalize_query(query)}", vector)
+
+    def _dense_key(self, query: str, filter_expr: str, top_k: int) -> str:
+        return f"dense|{self.namespace}|{self.version}|{top_k}|{filter_expr}|{normalize_query(query)}"
+
+    def get_dense(self, queries: Sequence[str], filter_expr: str, top_k: int) -> List[Optional[List[list]]]:
+        """Cached remote hits, as [id, metadata] pairs, per query."""
+        return self._lookup(self._dense, [self._dense_key(q, filter_expr, top_k) for q in queries], "embedding")
+
+    def set_dense(self, queries: Sequence[str], filter_expr: str, top_k: int, hits: Sequence[List[list]]) -> None:
+        self._store(self._dense, [self._dense_key(q, filter_expr, top_k) for q in queries], hits)
+
+    # --- level 2: ranked results ---------------------------------------------
+
+    def _result_key(
+        self,
+        query: str,
+        top_k: int,
+        types: Optional[Sequence[str]],
+        categories: Optional[Sequence[str]],
+        pipeline: str
+    ) -> str:
+        filters = f"{','.join(sorted(types or []))}|{','.join(sorted(categories or []))}"
+        return f"results|{self.namespace}|{self.version}|{pipeline}|{top_k}|{filters}|{normalize_query(query)}"
+
+    def get_results(
+        self,
+        queries: Sequence[str],
+        top_k: int,
+        types: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None,
+        pipeline: str = ""
+    ) -> List[Optional[List[list]]]:
+        """Cached rankings, as [id, score] pairs, per query.
+
+        pipeline is the retriever's fingerprint (see HybridRetriever.fingerprint).
+        """
+        keys = [self._result_key(q, top_k, types, categories, pipeline) for q in queries]
+        return self._lookup(self._results, keys, "result")
+
+    def set_results(
+        self,
+        queries: Sequence[str],
+        top_k: int,
+        types: Optional[Sequence[str]],
+        categories: Optional[Sequence[str]],
+        rankings: Sequence[List[list]],
+        pipeline: str = ""
+    ) -> None:
+        keys = [self._result_key(q, top_k, types, categories, pipeline) for q in queries]
+        self._store(self._results, keys, rankings)
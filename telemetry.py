@@ -0,0 +1,355 @@
+"""
+Request tracing and Prometheus metrics shared by the MCP and REST servers
+
+Each HTTP request gets a trace (via TracingMiddleware); `with span("retrieve"):`
+inside it times a pipeline stage, feeds the per-stage latency histogram and
+adds the stage to the request's trace log line. Metrics are rendered in the
+Prometheus text format by render_metrics() for a /metrics endpoint, and
+CachedProbe keeps connectivity state fresh in the background so health
+checks never wait on a round trip.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import inspect
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from async_utils import run_blocking, with_timeout
+
+TRACE_LOGGING = os.getenv("TRACE_LOGGING", "true").lower() == "true"
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+# Histogram buckets in seconds (stage and request latencies)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Paths that are counted but never logged
+QUIET_PATHS = {"/metrics", "/health", "/api/health"}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            # [bucket counts..., sum, count]
+            series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter read from existing state (e.g. a stats dict) at scrape time.
+
+    `read` returns a number, or a {label value: number} dict when the metric
+    has one label.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Any], kind: str = "gauge", label: str = ""):
+        super().__init__(name, help, (label,) if label else ())
+        self.kind = kind
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            rows = [(self.name + _labels(self.label_names, (k,)), v) for k, v in sorted(value.items())]
+        else:
+            rows = [(self.name, value)]
+        return self.header() + [f"{series} {_number(v)}" for series, v in rows]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "digitaltwin_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"]
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "digitaltwin_stage_errors_total", "Pipeline stages that raised", ["stage"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "digitaltwin_http_request_duration_seconds", "HTTP request latency", ["method", "path", "status"]
+))
+RETRIEVED_CHUNKS = REGISTRY.register(Histogram(
+    "digitaltwin_retrieved_chunks", "Chunks returned by retrieval per query", buckets=COUNT_BUCKETS
+))
+CONTEXT_TOKENS = REGISTRY.register(Counter(
+    "digitaltwin_context_tokens_total", "Context tokens before and after packing", ["phase"]
+))
+
+
+def register_callback(name: str, help: str, read: Callable[[], Any], kind: str = "gauge", label: str = "") -> None:
+    REGISTRY.register(CallbackMetric(name, help, read, kind, label))
+
+
+def register_cache_metrics(cache, prefix: str = "digitaltwin_answer_cache") -> None:
+    """Export a cache's stats dict (hits, misses, evictions, ...) as counters.
+
+    `cache` is anything with a `stats` dict, or a callable returning one
+    (e.g. totals across several caches).
+    """
+    read = cache if callable(cache) else (lambda: dict(cache.stats))
+    register_callback(f"{prefix}_events_total", "Cache lookups and evictions by outcome",
+                      read, kind="counter", label="event")
+
+    def hit_rate():
+        stats = read()
+        hits = sum(v for k, v in stats.items() if k.endswith("hits"))
+        total = hits + sum(v for k, v in stats.items() if k.endswith("misses"))
+        return hits / total if total else 0.0
+
+    register_callback(f"{prefix}_hit_ratio", "Share of cache lookups answered from the cache", hit_rate)
+
+
+def register_gateway_metrics(get_gateway: Callable[[], Any]) -> None:
+    """Export LLM gateway counters (tokens, retries) and gauges (queue depth)."""
+    gauges = ["queue_depth", "in_flight"]
+    wait_keys = ["wait_p50_s", "wait_p95_s", "wait_max_s"]
+
+    def read(names):
+        gateway = get_gateway()
+        if gateway is None:
+            return None
+        metrics = gateway.metrics()
+        return {k: metrics[k] for k in names if k in metrics}
+
+    register_callback("digitaltwin_llm_gateway", "LLM gateway queue state",
+                      lambda: read(gauges), label="state")
+    register_callback("digitaltwin_llm_gateway_events_total", "LLM gateway requests, retries and tokens",
+                      lambda: read(["requests", "coalesced", "retries", "rate_limited", "failures",
+                                    "prompt_tokens", "completion_tokens"]),
+                      kind="counter", label="event")
+    register_callback("digitaltwin_llm_gateway_wait_seconds", "LLM gateway queue wait over recent calls",
+                      lambda: {q: v for q, v in zip(("0.5", "0.95", "1"), (read(wait_keys) or {}).values())},
+                      label="quantile")
+
+
+def record_context(packed) -> None:
+    """Count prompt context tokens for a PackedContext."""
+    CONTEXT_TOKENS.inc(packed.tokens_before, "retrieved")
+    CONTEXT_TOKENS.inc(packed.tokens_after, "packed")
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+@dataclass
+class Trace:
+    """Spans recorded while handling one request."""
+    name: str
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started: float = field(default_factory=time.perf_counter)
+    spans: List[Tuple[str, float]] = field(default_factory=list)
+
+    def summary(self) -> str:
+        total = (time.perf_counter() - self.started) * 1e3
+        stages = ", ".join(f"{stage}={ms:.1f}" for stage, ms in self.spans)
+        return f"🔎 {self.name} [{self.request_id}] {total:.1f} ms" + (f" ({stages} ms)" if stages else "")
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage (load, retrieve, fuse, rerank, prompt_assembly, generate)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(1, stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed * 1e3))
+
+
+class TracingMiddleware:
+    """ASGI middleware: one trace per HTTP request, plus request latency metrics.
+
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app, service: str = "digitaltwin"):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope.get("path", "")
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex[:12]
+        trace = Trace(f"{self.service} {scope.get('method', '')} {path}", request_id=request_id)
+        token = _current_trace.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or ("other" if status["code"] == 404 else path)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - trace.started, scope.get("method", ""), route_path, str(status["code"])
+            )
+            if TRACE_LOGGING and path not in QUIET_PATHS:
+                print(trace.summary())
+            _current_trace.reset(token)
+
+
+class CachedProbe:
+    """Connectivity state for a dependency, refreshed in the background.
+
+    status() returns the last known state immediately and, if it is older
+    than `interval`, starts one background refresh for later callers.
+    `on_failure` runs when a probe fails (e.g. to drop pooled connections).
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Any], interval: float = HEALTH_CHECK_INTERVAL,
+                 timeout: float = HEALTH_CHECK_TIMEOUT, on_failure: Optional[Callable[[Exception], None]] = None):
+        self.name = name
+        self.probe = probe
+        self.on_failure = on_failure
+        self.interval = interval
+        self.timeout = timeout
+        self.ok: Optional[bool] = None
+        self.error: Optional[str] = None
+        self.checked_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        try:
+            if inspect.iscoroutinefunction(self.probe):
+                result = await with_timeout(self.probe(), self.timeout, f"{self.name} probe")
+            else:
+                result = await with_timeout(run_blocking(self.probe), self.timeout, f"{self.name} probe")
+            self.ok, self.error = result is not False, None
+        except Exception as e:
+            self.ok, self.error = False, str(e)
+            if self.on_failure is not None:
+                self.on_failure(e)
+        self.checked_at = time.time()
+        return self.ok
+
+    async def status(self) -> Dict[str, Any]:
+        """Last known state; only the very first call waits for a probe."""
+        if not self.checked_at:
+            await self.refresh()
+        elif time.time() - self.checked_at >= self.interval and (
+                self._refreshing is None or self._refreshing.done()):
+            self._refreshing = asyncio.get_running_loop().create_task(self.refresh())
+        return {
+            "connected": self.ok,
+            "checked_seconds_ago": round(time.time() - self.checked_at, 1) if self.checked_at else None,
+            "error": self.error
+        }
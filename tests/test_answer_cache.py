@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+import answer_cache
+from answer_cache import REDIS_PREFIX, AnswerCache, normalize_question
+
+MODEL = "llama"
+CHUNKS = ["python", "react"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() for TTL checks"""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def answer(text):
+    return {"answer": text}
+
+
+def test_normalize_question():
+    assert normalize_question("  What are   your SKILLS?! ") == "what are your skills"
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = AnswerCache(max_entries=2, similarity_threshold=0)
+    cache.set("first", CHUNKS, MODEL, answer("1"))
+    cache.set("second", CHUNKS, MODEL, answer("2"))
+    assert cache.get("first", CHUNKS, MODEL) == answer("1")
+
+    cache.set("third", CHUNKS, MODEL, answer("3"))
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    assert cache.get("second", CHUNKS, MODEL) is None
+    assert cache.get("first", CHUNKS, MODEL) == answer("1")
+    assert cache.get("third", CHUNKS, MODEL) == answer("3")
+
+
+def test_ttl_expiry(clock):
+    cache = AnswerCache(ttl=60, similarity_threshold=0)
+    cache.set("What are your skills?", CHUNKS, MODEL, answer("Python"))
+    clock.now += 59
+    # Normalisation makes punctuation and case irrelevant
+    assert cache.get("what are your skills", CHUNKS, MODEL) == answer("Python")
+    clock.now += 2
+    assert cache.get("What are your skills?", CHUNKS, MODEL) is None
+    assert len(cache) == 0
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_near_duplicate_threshold(clock):
+    question, similar = "What are your Python skills?", "What Python skills do you have?"
+    probe = AnswerCache()
+    score = float(probe._embed(question) @ probe._embed(similar))
+    assert 0 < score < 1
+
+    below = AnswerCache(similarity_threshold=score - 0.01)
+    below.set(question, CHUNKS, MODEL, answer("Python"))
+    assert below.get(similar, CHUNKS, MODEL) == answer("Python")
+    assert below.stats["near_hits"] == 1
+    # Near matches only count when the same chunks were retrieved
+    assert below.get(similar, CHUNKS[:1], MODEL) is None
+    assert below.get(similar, CHUNKS, "other-model") is None
+
+    above = AnswerCache(similarity_threshold=score + 0.01)
+    above.set(question, CHUNKS, MODEL, answer("Python"))
+    assert above.get(similar, CHUNKS, MODEL) is None
+
+    expired = AnswerCache(ttl=10, similarity_threshold=score - 0.01)
+    expired.set(question, CHUNKS, MODEL, answer("Python"))
+    clock.now += 11
+    assert expired.get(similar, CHUNKS, MODEL) is None
+
+
+def test_redis_tier_shares_answers_between_workers(clock):
+    redis_client = fakeredis.FakeRedis()
+    writer = AnswerCache(data_version="v1", ttl=120, redis_client=redis_client)
+    writer.set("What are your skills?", CHUNKS, MODEL, answer("Python"))
+    (key,) = redis_client.keys(f"{REDIS_PREFIX}:*")
+    assert 0 < redis_client.ttl(key) <= 120
+
+    reader = AnswerCache(data_version="v1", redis_client=redis_client)
+    assert reader.get("What are your skills?", CHUNKS, MODEL) == answer("Python")
+    # Copied into the local tier on the way through
+    assert reader.get("What are your skills?", CHUNKS, MODEL) == answer("Python")
+    assert reader.stats["redis_hits"] == 1 and reader.stats["hits"] == 1
+
+    # A reloaded profile's cache does not see answers for the old data
+    reloaded = AnswerCache(data_version="v2", redis_client=redis_client)
+    assert reloaded.get("What are your skills?", CHUNKS, MODEL) is None
+
+
+def test_redis_errors_degrade_to_the_local_tier(clock):
+    class BrokenRedis:
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def set(self, key, value, ex=None):
+            raise ConnectionError("down")
+
+    cache = AnswerCache(redis_client=BrokenRedis())
+    cache.set("What are your skills?", CHUNKS, MODEL, answer("Python"))
+    assert cache.get("What are your skills?", CHUNKS, MODEL) == answer("Python")
+    assert cache.get("Career goals?", CHUNKS, MODEL) is None
@@ -0,0 +1,86 @@
+import argparse
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import loadtest
+from answer_cache import AnswerCache
+
+QUESTION = "What are your technical skills?"
+
+
+@pytest.fixture(scope="module")
+def api():
+    """backend/main.py imported against the offline Redis / vector / Groq stand-ins"""
+    args = argparse.Namespace(
+        vector_backend="local", groq_rpm=100000, answer_cache=False, no_retrieval_cache=False,
+        redis_latency_ms=0.0, llm_latency_ms=0.0, token_latency_ms=0.0, vector_latency_ms=0.0,
+        groq_concurrency=8, retrieval_mode="hybrid"
+    )
+    loadtest.configure_environment(args)
+    loadtest.install_stubs(args)
+    spec = importlib.util.spec_from_file_location(
+        "backend_main", os.path.join(loadtest.PROJECT_ROOT, "backend", "main.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ScriptedStream:
+    """Async Groq client whose streams yield `tokens`, then raise `error` if set."""
+
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        async def chunks():
+            for token in self.tokens:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+            if self.error:
+                raise self.error
+        return chunks()
+
+
+@pytest.fixture
+def cache(api, monkeypatch):
+    cache = AnswerCache(max_entries=16, ttl=3600)
+    monkeypatch.setattr(api.twins.load(api.DEFAULT_TWIN_ID), "answer_cache", cache)
+    return cache
+
+
+def stream(api, monkeypatch, llm):
+    monkeypatch.setattr(api, "groq_client", llm)
+    response = TestClient(api.app).post("/api/query/stream", json={"question": QUESTION})
+    assert response.status_code == 200
+    return response.text
+
+
+@pytest.mark.parametrize("llm", [
+    ScriptedStream([]),
+    ScriptedStream([" ", "\n"]),
+    ScriptedStream(["Python", " and"], error=RuntimeError("connection reset")),
+], ids=["empty", "whitespace", "interrupted"])
+def test_unfinished_or_empty_streams_are_not_cached(api, cache, monkeypatch, llm):
+    body = stream(api, monkeypatch, llm)
+    assert ("event: error" in body) == bool(llm.error)
+    assert len(cache) == 0
+
+
+def test_finished_stream_is_cached_and_replayed(api, cache, monkeypatch):
+    stream(api, monkeypatch, ScriptedStream(["Python", " and SQL."]))
+    assert len(cache) == 1
+    replay = stream(api, monkeypatch, ScriptedStream([], error=AssertionError("cache missed")))
+    assert "Python and SQL." in replay and "event: error" not in replay
+
+
+def test_top_k_is_bounded(api):
+    client = TestClient(api.app)
+    for top_k in (0, api.MAX_TOP_K + 1):
+        response = client.post("/api/query", json={"question": QUESTION, "top_k": top_k})
+        assert response.status_code == 422
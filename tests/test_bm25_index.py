@@ -0,0 +1,57 @@
+import math
+
+import fakeredis
+import pytest
+
+import digitaltwin_rag
+from bm25_index import BM25Index, normalize_term, tokenize
+
+CHUNKS = [
+    {"id": "python", "title": "Python", "content": "Python services with FastAPI. Python scripts.", "type": "skills"},
+    {"id": "react", "title": "React", "content": "React and Next.js interfaces.", "type": "skills",
+     "metadata": {"category": "frontend_dev", "tags": ["typescript"]}},
+    {"id": "goals", "title": "Goals", "content": "Grow into a senior backend engineer.", "type": "career"},
+]
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("What are your Projects and C++ / Node.js skills?") == ["project", "c++", "node.js", "skill"]
+    assert normalize_term("classes") == "classe"
+    assert normalize_term("class") == "class"
+    assert normalize_term("libraries") == "library"
+
+
+def test_bm25_scores_match_the_formula():
+    index = BM25Index.from_chunks(CHUNKS, k1=1.5, b=0.75)
+    (doc, score), = index.search("fastapi", top_k=1)
+    assert index.doc_ids[doc] == "python"
+
+    total = len(CHUNKS)
+    idf = math.log(1 + (total - 1 + 0.5) / (1 + 0.5))
+    length = index.doc_lengths[doc]
+    norm = 1.5 * (1 - 0.75 + 0.75 * length / index.avg_doc_length)
+    assert score == pytest.approx(idf * 1 * 2.5 / (1 + norm))
+
+
+def test_term_frequency_and_metadata_are_indexed():
+    index = BM25Index.from_chunks(CHUNKS)
+    assert [index.doc_ids[d] for d, _ in index.search("python react", top_k=3)][0] == "python"
+    # Tags and categories are searchable
+    assert index.doc_ids[index.search("typescript", 1)[0][0]] == "react"
+    assert index.doc_ids[index.search("frontend dev", 1)[0][0]] == "react"
+
+
+def test_allowed_restricts_results_and_unknown_terms_match_nothing():
+    index = BM25Index.from_chunks(CHUNKS)
+    assert index.search("python react", top_k=3, allowed={1}) == [(1, pytest.approx(index.search("react", 1)[0][1]))]
+    assert index.search("kubernetes") == []
+
+
+def test_search_redis_builds_the_index_from_redis(monkeypatch):
+    redis_client = fakeredis.FakeRedis()
+    digitaltwin_rag.initialize_redis_data(redis_client, {"content_chunks": CHUNKS})
+    monkeypatch.setattr(digitaltwin_rag, "search_index", None)
+    monkeypatch.setattr(digitaltwin_rag, "indexed_chunks", [])
+    results = digitaltwin_rag.search_redis(redis_client, "senior backend engineer", top_k=1)
+    assert [r["id"] for r in results] == ["goals"]
+    assert digitaltwin_rag.search_index is not None
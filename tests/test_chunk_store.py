@@ -0,0 +1,71 @@
+import glob
+import json
+import os
+
+import pytest
+
+from chunk_store import ChunkStore
+from digitaltwin_rag import _serialize_chunk
+from precomputed_answers import chunk_fingerprint
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = sorted(glob.glob(os.path.join(ROOT, "digitaltwin*.json")))
+
+ODD_CHUNKS = [
+    # Missing title / type / metadata
+    {"id": "bare", "content": "Only content"},
+    # Empty category and tags, extra metadata
+    {"id": "empty", "title": "", "content": "", "type": "", "metadata": {"category": "", "tags": [], "level": 3}},
+    # Non-str tags and category, non-str ID, extra top-level fields
+    {"id": 42, "title": "Numbers", "content": "x", "type": "skills", "rank": 1.5,
+     "metadata": {"category": 7, "tags": ["python", 3, None], "technologies": ["FastAPI"]}},
+    # Non-dict metadata and non-str title
+    {"id": "odd", "title": None, "content": "y", "metadata": None},
+    {"id": "tags_not_list", "content": "z", "metadata": {"tags": "python, sql"}},
+    # No ID at all
+    {"title": "Anonymous", "content": "Unicode ✅ café", "metadata": {"category": "misc"}},
+]
+
+
+@pytest.mark.parametrize("path", PROFILES, ids=os.path.basename)
+def test_bundled_profiles_round_trip(path):
+    with open(path, encoding="utf-8") as f:
+        chunks = json.load(f)["content_chunks"]
+    store = ChunkStore(chunks)
+    assert len(store) == len(chunks)
+    for original, rebuilt in zip(chunks, store):
+        assert rebuilt == original
+        assert _serialize_chunk(0, rebuilt) == _serialize_chunk(0, original)
+        assert chunk_fingerprint(rebuilt) == chunk_fingerprint(original)
+
+
+@pytest.mark.parametrize("chunk", ODD_CHUNKS, ids=lambda c: str(c.get("id", "no_id")))
+def test_missing_and_odd_fields_round_trip(chunk):
+    store = ChunkStore([chunk])
+    assert store[0] == chunk
+    assert json.dumps(store[0], sort_keys=True) == json.dumps(chunk, sort_keys=True)
+
+
+def test_field_access_and_indexes():
+    store = ChunkStore(ODD_CHUNKS)
+    assert store.ids == ["bare", "empty", "42", "odd", "tags_not_list", "chunk:5"]
+    assert store.get("42")["id"] == 42
+    assert store.position("odd") == 3
+    assert store.get("missing") is None
+    assert store.title(0) == "" and store.content(5) == "Unicode ✅ café"
+    assert store.tags_of(1) == [] and store.tags_of(2) == []
+    assert list(store.with_type("skills")) == [2]
+    assert list(store.in_category("misc")) == [5]
+    assert list(store.with_type("nope")) == []
+    assert store[-1] == ODD_CHUNKS[-1]
+    assert store[1:3] == ODD_CHUNKS[1:3]
+    with pytest.raises(IndexError):
+        store[len(ODD_CHUNKS)]
+
+
+def test_from_chunks_reuses_a_store_and_append_extends_indexes():
+    store = ChunkStore.from_chunks(ODD_CHUNKS[:2])
+    assert ChunkStore.from_chunks(store) is store
+    store.append({"id": "new", "type": "skills", "content": "c"})
+    assert store.positions["new"] == 2
+    assert list(store.with_type("skills")) == [2]
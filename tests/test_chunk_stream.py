@@ -0,0 +1,106 @@
+import asyncio
+import glob
+import io
+import json
+import os
+
+import pytest
+
+from chunk_stream import _IncrementalJSONReader, batched, ingest, iter_chunks, iter_json_chunks, read_json_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = sorted(glob.glob(os.path.join(ROOT, "digitaltwin*.json")))
+
+CHUNKS = [
+    {"id": "a", "content": "x" * 300, "metadata": {"tags": ["t"], "score": 12345.678}},
+    {"id": "b", "content": "Unicode ✅ café \"quoted\" ]}", "n": 1e-7},
+    {"id": "c", "content": "", "nested": [[1, [2, {"k": None}]], True, False]},
+]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 7, 64, 65536])
+def test_block_boundaries(block_size):
+    document = json.dumps({"personal": {"name": "X", "list": [1, 2, 3]}, "content_chunks": CHUNKS, "after": 1})
+    reader = _IncrementalJSONReader(io.StringIO(document), block_size=block_size)
+    reader.expect("{")
+    assert reader.value() == "personal"
+    reader.expect(":")
+    assert reader.value() == {"name": "X", "list": [1, 2, 3]}
+    reader.expect(",")
+    assert reader.value() == "content_chunks"
+    reader.expect(":")
+    assert list(reader.array_items()) == CHUNKS
+
+
+def test_numbers_split_across_blocks():
+    reader = _IncrementalJSONReader(io.StringIO("[123456789, 0.125, -42]"), block_size=3)
+    assert list(reader.array_items()) == [123456789, 0.125, -42]
+
+
+@pytest.mark.parametrize("document", [
+    {"content_chunks": CHUNKS},
+    {"other": {"content_chunks": "nope"}, "content_chunks": CHUNKS},
+    CHUNKS,
+])
+def test_iter_json_chunks(document):
+    assert list(iter_json_chunks(io.StringIO(json.dumps(document, indent=2)))) == CHUNKS
+
+
+def test_empty_and_malformed():
+    assert list(iter_json_chunks(io.StringIO('{"content_chunks": [ ]}'))) == []
+    with pytest.raises(ValueError, match="No content_chunks"):
+        list(iter_json_chunks(io.StringIO('{"personal": {}}')))
+    with pytest.raises(ValueError):
+        list(iter_json_chunks(io.StringIO('{"content_chunks": [{"id": 1} {"id": 2}]}')))
+
+
+@pytest.mark.parametrize("path", PROFILES, ids=os.path.basename)
+def test_bundled_profiles(path):
+    with open(path, encoding="utf-8") as f:
+        expected = json.load(f)["content_chunks"]
+    assert list(iter_chunks(path)) == expected
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / "corpus.jsonl"
+    path.write_text("\n".join(json.dumps(c) for c in CHUNKS) + "\n\n", encoding="utf-8")
+    assert list(iter_chunks(str(path))) == CHUNKS
+
+    path.write_text('{"id": 1}\nnot json\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="line 2"):
+        list(iter_chunks(str(path)))
+
+
+def test_ingest_bounds_writers():
+    active = peak = 0
+    written = []
+
+    async def sink(batch):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.005)
+        written.extend(batch)
+        active -= 1
+
+    count = asyncio.run(ingest(batched(iter(range(25)), 4), sink, queue_size=2, workers=3))
+    assert count == 7
+    assert sorted(written) == list(range(25))
+    assert 1 < peak <= 3
+
+
+def test_read_json_profile_streams_chunks_through_pack():
+    document = {"name": "X", "content_chunks": CHUNKS, "nested": {"content_chunks": [1]}, "after": [1, 2]}
+    packed = []
+
+    def pack(items):
+        packed.append(type(items).__name__)
+        return list(items)
+
+    data = read_json_profile(io.StringIO(json.dumps(document)), pack=pack)
+    assert data == document and packed == ["generator"]
+    with pytest.raises(ValueError, match="No content_chunks"):
+        read_json_profile(io.StringIO('{"name": "X"}'))
+    for bad in ('{"content_chunks": []', '{"content_chunks": []} []', '[]'):
+        with pytest.raises(ValueError):
+            read_json_profile(io.StringIO(bad))
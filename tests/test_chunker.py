@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from chunker import _units, chunk_file, count_tokens, markdown_sections, split_windows
+
+# 30 lines of 5 tokens each
+TEXT = "\n".join(f"line{i} alpha beta gamma delta." for i in range(30))
+
+
+def assert_windows_cover(text, windows, max_tokens, overlap):
+    units = _units(text, max_tokens)
+    # Windows reassemble to the original units once the overlap is dropped
+    rebuilt = windows[0].split("\n")
+    for previous, window in zip(windows, windows[1:]):
+        prev_lines, lines = previous.split("\n"), window.split("\n")
+        # Longest tail of the previous window repeated at the head of this one
+        carried = next(
+            n for n in range(min(len(prev_lines) - 1, len(lines)), -1, -1)
+            if n == 0 or prev_lines[-n:] == lines[:n]
+        )
+        assert sum(count_tokens(line) for line in lines[:carried]) <= overlap
+        rebuilt.extend(lines[carried:])
+    assert rebuilt == units
+    for window in windows:
+        assert count_tokens(window) <= max_tokens
+
+
+@pytest.mark.parametrize("max_tokens,overlap", [(20, 0), (20, 5), (20, 10), (50, 15), (12, 11), (1000, 40)])
+def test_windows_bounded_and_overlapping(max_tokens, overlap):
+    windows = split_windows(TEXT, max_tokens, overlap)
+    assert_windows_cover(TEXT, windows, max_tokens, overlap)
+    if max_tokens >= count_tokens(TEXT):
+        assert windows == [TEXT]
+
+
+def test_overlap_repeats_boundary_units():
+    windows = split_windows(TEXT, 20, 10)
+    # 4 lines per window, 2 carried into the next
+    assert windows[0].split("\n")[-2:] == windows[1].split("\n")[:2]
+    assert len(windows[1].split("\n")) == 4
+    assert not set(split_windows(TEXT, 20, 0)[0].split("\n")) & set(split_windows(TEXT, 20, 0)[1].split("\n"))
+
+
+def test_windows_always_advance():
+    # Overlap as large as a whole window must not loop forever
+    windows = split_windows(TEXT, 10, 10)
+    assert len(windows) < 30
+    assert windows[-1].endswith("line29 alpha beta gamma delta.")
+
+
+def test_oversized_lines_split_into_sentences_and_word_runs():
+    text = "One two three. " + " ".join(f"w{i}" for i in range(25)) + "\nshort line"
+    windows = split_windows(text, 10, 3)
+    assert all(count_tokens(w) <= 10 for w in windows)
+    assert_windows_cover(text, windows, 10, 3)
+    assert split_windows("", 10, 3) == []
+
+
+def test_markdown_sections_and_stable_ids(tmp_path):
+    posting = tmp_path / "job-postings" / "backend.md"
+    posting.parent.mkdir()
+    posting.write_text(
+        "# Backend Engineer\nIntro text.\n## Requirements\n- Python\n```\n# not a heading\n```\n"
+        "### **Nice** to have\nRedis\n## Benefits\nRemote\n",
+        encoding="utf-8"
+    )
+    sections = list(markdown_sections(posting.read_text(encoding="utf-8")))
+    assert [[label for _, label in path] for path, _, _ in sections] == [
+        ["Backend Engineer"],
+        ["Backend Engineer", "Requirements"],
+        ["Backend Engineer", "Requirements", "Nice to have"],
+        ["Backend Engineer", "Benefits"],
+    ]
+    assert "# not a heading" in sections[1][1]
+
+    chunks = chunk_file(str(posting), 20, 5)
+    ids = [c["id"] for c in chunks]
+    assert ids == ["backend:root:0", "backend:requirements:0", "backend:requirements.nice_to_have:0", "backend:benefits:0"]
+    assert {c["type"] for c in chunks} == {"job_posting"}
+
+    # Editing one section keeps the other IDs
+    posting.write_text(posting.read_text(encoding="utf-8").replace("Remote", "Remote and hybrid"), encoding="utf-8")
+    assert [c["id"] for c in chunk_file(str(posting), 20, 5)] == ids
+
+
+def test_existing_content_chunks_split_only_when_oversized(tmp_path):
+    profile = tmp_path / "profile.json"
+    chunks = [
+        {"id": "small", "content": "fits", "metadata": {"category": "a"}},
+        {"id": "big", "content": TEXT, "metadata": {"category": "b"}},
+    ]
+    profile.write_text(json.dumps({"content_chunks": chunks}), encoding="utf-8")
+    result = chunk_file(str(profile), 50, 10)
+    assert result[0] == chunks[0]
+    parts = result[1:]
+    assert [p["id"] for p in parts] == [f"big:{n}" for n in range(len(parts))]
+    assert all(p["metadata"]["category"] == "b" for p in parts)
+    assert_windows_cover(TEXT, [p["content"] for p in parts], 50, 10)
+
+
+def test_unnamed_list_items_keep_ids_when_the_list_changes(tmp_path):
+    profile = tmp_path / "professional_profile.json"
+    items = [{"detail": "Led the migration"}, {"detail": "Mentored two juniors"}]
+
+    def ids(items):
+        profile.write_text(json.dumps({"achievements": items}), encoding="utf-8")
+        return {c["content"]: c["id"] for c in chunk_file(str(profile), 50, 10)}
+
+    before = ids(items)
+    after = ids([{"detail": "Cut p95 latency"}] + items[::-1])
+    assert len(set(after.values())) == 3
+    assert all(after[content] == chunk_id for content, chunk_id in before.items())
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+import clients
+from clients import AsyncPooledIndex, LazyClient, PooledIndex
+
+
+def _reply(request):
+    assert request.headers["authorization"] == "Bearer token"
+    if request.url.path == "/info":
+        return httpx.Response(200, json={"result": {"vectorCount": 2, "pendingVectorCount": 0, "indexSize": 1,
+                                                    "dimension": 3, "similarityFunction": "COSINE",
+                                                    "namespaces": {}}})
+    return httpx.Response(200, json={"result": [{"id": "a", "score": 0.9, "metadata": {"title": "A"}}]})
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    sessions = []
+
+    def session(asynchronous=False):
+        client = (httpx.AsyncClient if asynchronous else httpx.Client)(transport=httpx.MockTransport(_reply))
+        sessions.append(client)
+        return client
+
+    monkeypatch.setattr(clients, "_vector_session", session)
+    return sessions
+
+
+def test_pooled_index_queries_through_its_session(transport):
+    index = PooledIndex("https://vector.test", "token")
+    results = index.query(data="python", top_k=1, include_metadata=True, namespace="cedric")
+    assert [(r.id, r.metadata) for r in results] == [("a", {"title": "A"})]
+    assert index.info().vector_count == 2
+
+
+def test_reset_closes_the_replaced_session(transport):
+    holder = LazyClient("Upstash Vector", lambda: PooledIndex("https://vector.test", "token"),
+                        clients._session_open, reset=PooledIndex.reset_session)
+    index = holder.get()
+    first = index.session
+    holder.report_failure(RuntimeError("probe failed"))
+    assert first.is_closed and not index.session.is_closed
+    assert holder.get() is index and holder.stats == {"created": 1, "reconnects": 1}
+    assert index.query(data="python", top_k=1)[0].id == "a"
+
+
+def test_async_reset_closes_the_replaced_session(transport):
+    async def run():
+        index = AsyncPooledIndex("https://vector.test", "token")
+        first = index.session
+        assert (await index.query(data="python", top_k=1))[0].id == "a"
+        index.reset_session()
+        await asyncio.gather(*index._closing)
+        assert first.is_closed and not index.session.is_closed
+        assert (await index.query(data="python", top_k=1))[0].id == "a"
+        await index.close()
+
+    asyncio.run(run())
+    # Without a running loop the old session is closed right away
+    index = AsyncPooledIndex("https://vector.test", "token")
+    first = index.session
+    index.reset_session()
+    assert first.is_closed
+
+
+class Resource:
+    def __init__(self):
+        self.open = True
+        self.resets = 0
+
+
+def holder(factory, **kwargs):
+    return LazyClient("Test", factory, lambda r: r.open, reset=lambda r: setattr(r, "resets", r.resets + 1), **kwargs)
+
+
+def test_lazy_client_builds_once_under_concurrency():
+    built = []
+
+    def factory():
+        time.sleep(0.01)
+        built.append(Resource())
+        return built[-1]
+
+    lazy = holder(factory)
+    assert not built
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(lazy.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1 and all(r is built[0] for r in results)
+    assert lazy.stats == {"created": 1, "reconnects": 0}
+
+
+def test_lazy_client_rebuilds_closed_clients_and_retries_failed_builds():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("unreachable")
+        return Resource()
+
+    lazy = holder(factory)
+    with pytest.raises(ConnectionError):
+        lazy.get()
+    first = lazy.get()
+    assert lazy.get() is first
+
+    first.open = False
+    second = lazy.get()
+    assert second is not first and second.open
+    assert lazy.stats == {"created": 2, "reconnects": 1}
+
+
+def test_missing_credentials_are_not_retried_on_every_call():
+    calls = []
+    lazy = holder(lambda: calls.append(1))
+    assert lazy.get() is None and lazy.get() is None
+    assert len(calls) == 1
+    # Nothing to reset
+    lazy.report_failure(RuntimeError("down"))
+    assert lazy.stats == {"created": 1, "reconnects": 0}
+
+
+def test_report_failure_resets_in_place_and_install_overrides():
+    lazy = holder(Resource)
+    client = lazy.get()
+    lazy.report_failure(RuntimeError("probe failed"))
+    assert lazy.get() is client and client.resets == 1
+    assert lazy.stats == {"created": 1, "reconnects": 1}
+
+    # Installed stand-ins are served as-is: never rebuilt or reset
+    stand_in = Resource()
+    stand_in.open = False
+    lazy.install(stand_in)
+    assert lazy.get() is stand_in
+    lazy.report_failure()
+    assert stand_in.resets == 0 and lazy.stats["created"] == 1
+
+
+def test_redis_holders_are_shared_per_url():
+    assert clients.redis_holder("redis://cache-a") is clients.redis_holder("redis://cache-a")
+    assert clients.redis_holder("redis://cache-a") is not clients.redis_holder("redis://cache-b")
+    assert clients.redis_holder() is clients.redis_holder(None)
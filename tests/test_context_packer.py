@@ -0,0 +1,83 @@
+import pytest
+
+import context_packer
+from context_packer import FALLBACK_CONTEXT_BUDGET, context_budget, count_tokens, pack_context, select_sentences
+
+FILLER = " ".join(f"Filler sentence number {i} about nothing in particular." for i in range(20))
+
+
+def filler(seed):
+    """Unrelated sentences that differ per chunk, so they are not deduplicated"""
+    return " ".join(f"Topic {seed} detail {seed * 100 + i} with unrelated words." for i in range(20))
+
+
+def result(chunk_id, content, title=None):
+    return {"id": chunk_id, "score": 1.0, "metadata": {"title": title or chunk_id.title(), "content": content}}
+
+
+def pack(query, results, budget):
+    return pack_context(query, results, "test-model", budget=budget, log=False)
+
+
+def test_count_tokens_and_budgets(monkeypatch):
+    assert count_tokens("") == 0
+    assert count_tokens("Hello, world!") == 6  # 4 tokens * 1.3, rounded up
+    assert context_budget("llama-3.1-8b-instant") == 1500
+    assert context_budget("unknown-model") == FALLBACK_CONTEXT_BUDGET
+    monkeypatch.setattr(context_packer, "DEFAULT_CONTEXT_BUDGET", 700)
+    assert context_budget("llama-3.1-8b-instant") == 700
+
+
+def test_small_contexts_pass_through_unchanged():
+    results = [result("python", "Python backend services."), result("react", "React interfaces.")]
+    packed = pack("python", results, budget=1000)
+    assert packed.documents == ["Python: Python backend services.", "React: React interfaces."]
+    assert packed.chunk_ids == ["python", "react"]
+    assert packed.tokens_after == packed.tokens_before and packed.tokens_saved == 0
+    assert (packed.chunks_trimmed, packed.chunks_dropped, packed.duplicates_removed) == (0, 0, 0)
+
+
+@pytest.mark.parametrize("budget", [60, 150, 400])
+def test_packed_context_stays_within_budget_in_rank_order(budget):
+    results = [result(f"chunk{i}", f"Python fact {i}. {filler(i)}") for i in range(5)]
+    packed = pack("python fact", results, budget)
+    assert 0 < packed.tokens_after <= budget
+    assert sum(count_tokens(d) for d in packed.documents) == packed.tokens_after
+    # Best-ranked chunks are kept first, and in retrieval order
+    assert packed.chunk_ids == [f"chunk{i}" for i in range(len(packed.chunk_ids))]
+    assert len(packed.chunk_ids) + packed.chunks_dropped == 5
+    assert packed.tokens_saved == packed.tokens_before - packed.tokens_after
+
+
+def test_unused_share_rolls_over_to_later_chunks():
+    results = [result("short", "Python."), result("long", f"Python fact. {FILLER}")]
+    packed = pack("python", results, budget=120)
+    assert packed.documents[0] == "Short: Python."
+    # The long chunk gets more than an even half of the budget
+    assert count_tokens(packed.documents[1]) > 60
+    assert packed.tokens_after <= 120
+
+
+def test_duplicates_keep_the_better_ranked_copy():
+    content = "Built Python services that handle payments for millions of users every day"
+    results = [
+        result("first", content),
+        result("empty", ""),
+        result("copy", content + " reliably"),
+        result("other", "Mentored junior developers"),
+    ]
+    packed = pack("python", results, budget=1000)
+    assert packed.chunk_ids == ["first", "other"]
+    assert packed.duplicates_removed == 1
+
+
+def test_trimming_keeps_relevant_sentences_in_document_order():
+    text = "Intro about hobbies. Python services at scale. More about hobbies. Redis caching with Python."
+    assert select_sentences(text, {"python", "redis"}, 14) == "Python services at scale. Redis caching with Python."
+    assert select_sentences(text, {"python", "redis"}, 1000) == text
+    # A single sentence longer than the budget is cut by words
+    assert select_sentences("one two three four five six seven eight nine ten.", {"two"}, 4) == "one two three"
+
+    packed = pack("redis python", [result("notes", f"{text} {FILLER}")], budget=17)
+    assert packed.chunks_trimmed == 1
+    assert packed.documents == ["Notes: Python services at scale. Redis caching with Python."]
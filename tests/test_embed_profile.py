@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+
+import embed_profile
+from embed_profile import load_manifest, save_manifest, sync_profile
+
+
+class RecordingIndex:
+    """Async vector index that records calls and peak concurrency."""
+
+    def __init__(self):
+        self.upserted = {}
+        self.deleted = []
+        self.active = 0
+        self.peak = 0
+
+    async def _call(self):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+
+    async def upsert(self, vectors, namespace=""):
+        await self._call()
+        for doc_id, _, _ in vectors:
+            self.upserted[doc_id] = namespace
+
+    async def delete(self, ids, namespace=""):
+        await self._call()
+        self.deleted.extend(ids)
+
+    async def reset(self, namespace=""):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(embed_profile, "announce_reembed", lambda namespace: None)
+
+
+def write_profile(path, count, prefix="c"):
+    chunks = [{"id": f"{prefix}{i}", "title": f"T{i}", "content": f"content {i}"} for i in range(count)]
+    path.write_text(json.dumps({"content_chunks": chunks}), encoding="utf-8")
+
+
+def sync(index, profile, manifest, manifest_path, **kwargs):
+    return asyncio.run(sync_profile(
+        index, str(profile), manifest, batch_size=2, concurrency=2, manifest_path=str(manifest_path), **kwargs
+    ))
+
+
+def test_manifest_keyed_by_namespace(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest = load_manifest(str(manifest_path))
+    write_profile(tmp_path / "digitaltwin.json", 3)
+    write_profile(tmp_path / "digitaltwin_default.json", 2, prefix="d")
+
+    sync(RecordingIndex(), tmp_path / "digitaltwin.json", manifest, manifest_path)
+    sync(RecordingIndex(), tmp_path / "digitaltwin_default.json", manifest, manifest_path)
+
+    saved = load_manifest(str(manifest_path))
+    assert set(saved["namespaces"]) == {"", "default"}
+    assert set(saved["namespaces"][""]["chunks"]) == {"c0", "c1", "c2"}
+    assert set(saved["namespaces"]["default"]["chunks"]) == {"d0", "d1"}
+
+
+def test_legacy_default_key_is_migrated(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    save_manifest({"namespaces": {
+        "default": {"index": "", "source": "digitaltwin.json", "chunks": {"a": "x"}},
+        "cedric": {"index": "", "source": "digitaltwin_cedric.json", "chunks": {}},
+    }}, str(manifest_path))
+    assert set(load_manifest(str(manifest_path))["namespaces"]) == {"", "cedric"}
+
+
+def test_incremental_sync_and_worker_limit(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest = load_manifest(str(manifest_path))
+    profile = tmp_path / "digitaltwin_cedric.json"
+    write_profile(profile, 12)
+
+    index = RecordingIndex()
+    assert sync(index, profile, manifest, manifest_path) == {"upserted": 12, "deleted": 0, "unchanged": 0}
+    assert set(index.upserted.values()) == {"cedric"}
+    assert index.peak <= 2
+
+    write_profile(profile, 3)
+    index = RecordingIndex()
+    assert sync(index, profile, manifest, manifest_path) == {"upserted": 0, "deleted": 9, "unchanged": 3}
+    assert sorted(index.deleted) == sorted(f"c{i}" for i in range(3, 12))
+    assert index.peak <= 2
+    assert set(load_manifest(str(manifest_path))["namespaces"]["cedric"]["chunks"]) == {"c0", "c1", "c2"}
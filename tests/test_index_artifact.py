@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from bm25_index import BM25Index
+from index_artifact import IndexArtifact, compile_artifact, open_artifact
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def profile(tmp_path):
+    path = tmp_path / "digitaltwin.json"
+    shutil.copy(os.path.join(ROOT, "digitaltwin.json"), path)
+    compile_artifact(str(path), str(tmp_path / "index"))
+    return path
+
+
+def _open(profile):
+    return open_artifact(str(profile), str(profile.parent / "index"))
+
+
+def test_artifact_matches_the_profile(profile):
+    artifact = _open(profile)
+    chunks = json.loads(profile.read_text())["content_chunks"]
+    assert list(artifact.chunks) == chunks
+    bm25 = BM25Index.from_chunks(chunks)
+    query = "python backend projects"
+    assert artifact.search_index().search(query, 5) == pytest.approx(bm25.search(query, 5))
+
+
+def test_touched_profile_keeps_the_artifact(profile):
+    os.utime(profile, ns=(1, 1))
+    artifact = _open(profile)
+    assert artifact is not None
+    assert artifact.is_fresh(str(profile))
+
+
+def test_changed_profile_disables_the_artifact(profile):
+    raw = profile.read_bytes()
+    # Same size, different content
+    profile.write_bytes(raw.replace(b"Python", b"Pythom", 1))
+    assert len(profile.read_bytes()) == len(raw)
+    assert _open(profile) is None
+
+    profile.write_bytes(raw + b"\n")
+    assert _open(profile) is None
+
+
+def test_metadata_and_idf_are_read_from_the_mapping(profile):
+    artifact = _open(profile)
+    chunks = json.loads(profile.read_text())["content_chunks"]
+    assert artifact.chunk(len(chunks) - 1) == chunks[-1]
+    bm25 = BM25Index.from_chunks(chunks)
+    idf = artifact.search_index().idf
+    assert len(idf) == len(bm25.idf)
+    assert {term: idf[term] for term in idf} == pytest.approx(bm25.idf)
+    assert idf.get("no-such-term") is None
+
+
+def test_close_unmaps_the_file(profile):
+    with _open(profile) as artifact:
+        artifact.search_index().search("python", 3)
+        artifact.vector_store()
+    assert artifact._mmap.closed
+    artifact.close()
+
+
+def test_stale_artifact_is_closed(profile, monkeypatch):
+    opened = []
+    original = IndexArtifact.__init__
+
+    def tracking_init(self, path):
+        original(self, path)
+        opened.append(self)
+
+    monkeypatch.setattr(IndexArtifact, "__init__", tracking_init)
+    profile.write_bytes(profile.read_bytes() + b"\n")
+    assert _open(profile) is None
+    assert opened and opened[0]._mmap.closed
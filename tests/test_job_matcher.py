@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+
+from job_matcher import JobMatcher, JobPosting, find_postings, match_postings, parse_posting
+from local_vectors import LocalVectorStore
+
+CHUNKS = [
+    {"id": "python", "title": "Python", "content": "python backend services with fastapi and redis",
+     "type": "skills"},
+    {"id": "react", "title": "React", "content": "react typescript frontend interfaces", "type": "skills"},
+    {"id": "mentoring", "title": "Mentoring", "content": "mentoring junior developers and code review",
+     "type": "experience"},
+]
+
+POSTING = """# **Backend** Engineer
+Intro paragraph with - no bullets counted.
+
+## Essential requirements
+- Python backend services
+* `FastAPI` and Redis
+
+## About us
+- Free snacks
+
+## Nice to have
+1. Mentoring junior developers
+"""
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return JobMatcher(LocalVectorStore.from_chunks(CHUNKS, dim=512))
+
+
+def test_parse_posting():
+    posting = parse_posting(POSTING, "backend")
+    assert posting.title == "Backend Engineer"
+    assert posting.essential == ["Python backend services", "FastAPI and Redis"]
+    assert posting.desirable == ["Mentoring junior developers"]
+
+
+def test_score_finds_evidence_and_ranks_by_fit(matcher):
+    backend = parse_posting(POSTING, "backend")
+    unrelated = JobPosting(id="chef", title="Chef", essential=["Pastry lamination"])
+    results = matcher.score([unrelated, backend])
+
+    assert [r["id"] for r in results] == ["backend", "chef"]
+    best = results[0]
+    assert best["essential_met"] == "2/2" and best["desirable_met"] == "1/1"
+    assert [c["evidence"][0]["id"] for c in best["criteria"]] == ["python", "python", "mentoring"]
+    assert all("coverage" not in c for c in best["criteria"])
+    assert results[1]["essential_met"] == "0/1"
+    assert results[1]["fit_score"] < best["fit_score"]
+
+
+def test_fit_weights_essential_criteria(matcher):
+    essential_only = JobPosting(id="e", title="E", essential=["Python backend services"], desirable=["Pastry"])
+    desirable_only = JobPosting(id="d", title="D", essential=["Pastry"], desirable=["Python backend services"])
+    results = {r["id"]: r["fit_score"] for r in matcher.score([essential_only, desirable_only])}
+    assert results["e"] > results["d"]
+
+
+def test_postings_without_criteria_score_zero(matcher):
+    (result,) = matcher.score([parse_posting("# Empty posting\nNo lists here.", "empty")])
+    assert result["criteria"] == []
+    assert (result["fit_score"], result["essential_met"], result["desirable_met"]) == (0.0, "0/0", "0/0")
+
+
+def test_find_and_match_posting_files(matcher, tmp_path):
+    (tmp_path / "b.md").write_text(POSTING, encoding="utf-8")
+    (tmp_path / "a.MD").write_text("# Frontend\n## Requirements\n- React interfaces\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+    files = find_postings([str(tmp_path)])
+    assert [os.path.basename(f) for f in files] == ["a.MD", "b.md"]
+
+    results = asyncio.run(match_postings(matcher, files))
+    assert {r["title"] for r in results} == {"Frontend", "Backend Engineer"}
+    assert {r["source"] for r in results} == set(files)
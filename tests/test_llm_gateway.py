@@ -0,0 +1,163 @@
+import asyncio
+import gc
+from types import SimpleNamespace
+
+import pytest
+
+from llm_gateway import AsyncLLMGateway, TokenBucketLimiter
+
+MESSAGES = [{"role": "user", "content": "What do you work on?"}]
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class SlowCompletions:
+    """AsyncGroq-shaped stub whose create() takes `delay` seconds."""
+
+    def __init__(self, delay=0.0, tokens=("Hello", " world")):
+        self.delay = delay
+        self.tokens = tokens
+        self.calls = 0
+
+    async def create(self, model, messages, stream=False, **params):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if not stream:
+            usage = SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7)
+            return SimpleNamespace(choices=[], usage=usage)
+
+        async def chunks():
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield _chunk(token)
+        return chunks()
+
+
+def _gateway(completions, max_concurrency=2):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return AsyncLLMGateway(client, max_concurrency=max_concurrency, rate_limits={"m": (6000, 10**7)})
+
+
+def _assert_idle(gateway, max_concurrency=2):
+    assert gateway.stats["in_flight"] == 0
+    assert gateway.stats["queue_depth"] == 0
+    assert gateway._semaphore._value == max_concurrency
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_cancelled_create_releases_slot(stream):
+    async def run():
+        gateway = _gateway(SlowCompletions(delay=10))
+        for _ in range(4):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(gateway.create("m", MESSAGES, stream=stream), 0.01)
+        await asyncio.sleep(0)
+        _assert_idle(gateway)
+
+        gateway.client.chat.completions.delay = 0
+        response = await asyncio.wait_for(gateway.create("m", MESSAGES, stream=stream), 1)
+        if stream:
+            assert [c.choices[0].delta.content async for c in response] == ["Hello", " world"]
+        _assert_idle(gateway)
+
+    asyncio.run(run())
+
+
+def test_cancelled_create_refunds_tokens():
+    async def run():
+        gateway = _gateway(SlowCompletions(delay=10))
+        limiter = gateway.limiter("m")
+        before = limiter._tokens
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gateway.create("m", MESSAGES, stream=True), 0.01)
+        assert limiter._tokens == pytest.approx(before, abs=1000)
+        assert limiter._tokens > before - gateway._estimate_tokens(MESSAGES, {})
+
+    asyncio.run(run())
+
+
+def test_cancelled_while_queued_returns_reservation():
+    async def run():
+        gateway = _gateway(SlowCompletions(delay=10), max_concurrency=1)
+        first = asyncio.ensure_future(gateway.create("m", MESSAGES, stream=True))
+        await asyncio.sleep(0.01)
+        assert gateway.stats["in_flight"] == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gateway.create("m", [{"role": "user", "content": "other"}], stream=True), 0.01)
+        assert gateway.stats["queue_depth"] == 0
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        _assert_idle(gateway, max_concurrency=1)
+
+    asyncio.run(run())
+
+
+def test_stream_slot_released_when_never_iterated():
+    async def run():
+        gateway = _gateway(SlowCompletions())
+        stream = await gateway.create("m", MESSAGES, stream=True)
+        assert gateway.stats["in_flight"] == 1
+        del stream
+        gc.collect()
+        _assert_idle(gateway)
+
+    asyncio.run(run())
+
+
+def test_stream_slot_released_on_close_and_exhaustion():
+    async def run():
+        gateway = _gateway(SlowCompletions())
+        stream = await gateway.create("m", MESSAGES, stream=True)
+        await stream.__anext__()
+        await stream.aclose()
+        _assert_idle(gateway)
+
+        stream = await gateway.create("m", MESSAGES, stream=True)
+        assert len([chunk async for chunk in stream]) == 2
+        _assert_idle(gateway)
+        assert gateway.stats["completion_tokens"] == 3
+
+    asyncio.run(run())
+
+
+def test_identical_requests_share_one_call():
+    async def run():
+        completions = SlowCompletions(delay=0.02)
+        gateway = _gateway(completions)
+        results = await asyncio.gather(*(gateway.create("m", MESSAGES) for _ in range(5)))
+        assert completions.calls == 1
+        assert all(result is results[0] for result in results)
+        assert gateway.stats["coalesced"] == 4
+        _assert_idle(gateway)
+
+    asyncio.run(run())
+
+
+def test_concurrency_is_capped():
+    async def run():
+        peak = 0
+        gateway = _gateway(SlowCompletions(delay=0.01), max_concurrency=2)
+
+        async def call(i):
+            nonlocal peak
+            task = asyncio.ensure_future(gateway.create("m", [{"role": "user", "content": str(i)}]))
+            await asyncio.sleep(0.005)
+            peak = max(peak, gateway.stats["in_flight"])
+            return await task
+
+        await asyncio.gather(*(call(i) for i in range(6)))
+        assert peak == 2
+        _assert_idle(gateway)
+
+    asyncio.run(run())
+
+
+def test_token_bucket_waits_once_quota_is_spent():
+    limiter = TokenBucketLimiter(requests_per_minute=60, tokens_per_minute=600)
+    assert limiter.reserve(600) == 0
+    # 600 tokens/minute refill at 10/s, so 100 more tokens need ~10s
+    assert limiter.reserve(100) == pytest.approx(10, abs=0.1)
+    limiter.cancel(100)
+    assert limiter.reserve(0) == 0
@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from local_vectors import LocalVectorStore, parse_filter
+
+CHUNKS = [
+    {"id": "py", "title": "Python", "content": "python backend services", "type": "skills",
+     "metadata": {"category": "technical", "tags": ["python", "backend"]}},
+    {"id": "sql", "title": "SQL", "content": "python sql databases", "type": "skills",
+     "metadata": {"category": "data", "tags": ["sql"]}},
+    {"id": "job", "title": "Job", "content": "python developer role", "type": "experience",
+     "metadata": {"category": "technical", "tags": ["career"]}},
+]
+
+
+@pytest.fixture
+def store():
+    return LocalVectorStore.from_chunks(CHUNKS, dim=256)
+
+
+def test_parse_filter():
+    assert parse_filter("category IN ('a', 'R and D') AND type = 'x'") == [
+        ("category", {"a", "R and D"}), ("type", {"x"})
+    ]
+    for bad in ("category LIKE 'a%'", "category = 'a' OR type = 'b'", "tags[0] = 'a'"):
+        with pytest.raises(ValueError):
+            parse_filter(bad)
+
+
+def test_query_applies_filter(store):
+    assert {r.id for r in store.query("python", top_k=3)} == {"py", "sql", "job"}
+    assert [r.id for r in store.query("python", top_k=3, filter="type = 'experience'")] == ["job"]
+    results = store.query("python", top_k=3, filter="category IN ('technical') AND type = 'skills'")
+    assert [r.id for r in results] == ["py"]
+    # List metadata matches when any element does
+    assert [r.id for r in store.query("python", top_k=3, filter="tags = 'sql'")] == ["sql"]
+    assert store.query("python", top_k=3, filter="category = 'missing'") == []
+
+
+def test_query_rejects_unsupported_filter(store):
+    with pytest.raises(ValueError):
+        store.query("python", filter="category != 'data'")
+
+
+def test_query_rejects_foreign_namespace(store):
+    assert store.query("python", namespace="")
+    with pytest.raises(ValueError):
+        store.query("python", namespace="cedric")
+
+
+def test_query_batch_mask(store):
+    mask = store.filter_mask("category = 'data'")
+    assert mask.tolist() == [False, True, False]
+    assert store.filter_mask("category = 'data'") is mask
+    assert [[r.id for r in rs] for rs in store.query_batch(["python", "sql"], 3, mask)] == [["sql"], ["sql"]]
+
+
+def test_load_or_build_detects_same_size_edits_regardless_of_mtime(tmp_path):
+    profile = tmp_path / "digitaltwin.json"
+    profile.write_text(json.dumps({"content_chunks": CHUNKS}), encoding="utf-8")
+    first = LocalVectorStore.load_or_build(str(profile), dim=256)
+    stat = os.stat(profile)
+
+    # Reloading unchanged content reuses the saved vectors
+    assert np.array_equal(LocalVectorStore.load_or_build(str(profile), dim=256).matrix, first.matrix)
+
+    # Same chunk count, mtime rewound (git checkout, cp -p): still re-embedded
+    edited = [dict(CHUNKS[0], content="kubernetes clusters")] + CHUNKS[1:]
+    profile.write_text(json.dumps({"content_chunks": edited}), encoding="utf-8")
+    os.utime(profile, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+    store = LocalVectorStore.load_or_build(str(profile), dim=256)
+    assert [r.id for r in store.query("kubernetes")] == ["py"]
+    assert not np.array_equal(store.matrix, first.matrix)
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import loadtest
+
+
+@pytest.fixture(scope="module")
+def mcp():
+    """mcp_server imported against the offline Redis / vector / Groq stand-ins"""
+    args = argparse.Namespace(
+        vector_backend="local", groq_rpm=100000, answer_cache=False, no_retrieval_cache=False,
+        redis_latency_ms=0.0, llm_latency_ms=0.0, token_latency_ms=0.0, vector_latency_ms=0.0,
+        groq_concurrency=8, retrieval_mode="hybrid"
+    )
+    loadtest.configure_environment(args)
+    loadtest.install_stubs(args)
+    loadtest.load_apps(["mcp"])
+    import mcp_server
+    return mcp_server
+
+
+def _query(query, request_id=None):
+    item = {"jsonrpc": "2.0", "method": "workspace/executeCommand",
+            "params": {"command": "digitaltwin.query", "arguments": [{"query": query}]}}
+    if request_id is not None:
+        item["id"] = request_id
+    return item
+
+
+def test_batch_answers_requests_in_order(mcp):
+    client = TestClient(mcp.app)
+    responses = client.post("/mcp", json=[_query("What are your skills?", 1), _query("Career goals?", 2)]).json()
+    assert [r["id"] for r in responses] == [1, 2]
+    assert all(r["result"]["result"] for r in responses)
+
+
+def test_batch_drops_notification_responses(mcp):
+    client = TestClient(mcp.app)
+    batch = [_query("What are your skills?"), _query("Career goals?", 7), "not a request"]
+    responses = client.post("/mcp", json=batch).json()
+    assert [r["id"] for r in responses] == [7, None]
+    assert responses[1]["error"]["code"] == -32600
+
+
+def test_batch_of_notifications_returns_nothing(mcp):
+    client = TestClient(mcp.app)
+    response = client.post("/mcp", json=[_query("What are your skills?"), _query("Career goals?")])
+    assert response.status_code == 204
+    assert response.content == b""
+
+
+def test_single_notification_returns_nothing(mcp):
+    client = TestClient(mcp.app)
+    for notification in (_query("What are your skills?"), {"jsonrpc": "2.0", "method": "notifications/initialized"}):
+        response = client.post("/mcp", json=notification)
+        assert response.status_code == 204
+        assert response.content == b""
+    # Requests with an id (even a falsy one) are still answered
+    assert client.post("/mcp", json=_query("Career goals?", 0)).json()["id"] == 0
+
+
+def test_top_k_is_clamped(mcp):
+    assert mcp._retrieval_options({"top_k": 10**6})["top_k"] == mcp.MAX_TOP_K
+    assert mcp._retrieval_options({"top_k": -5})["top_k"] == 1
+    assert mcp._retrieval_options({})["top_k"] == mcp.DEFAULT_TOP_K
+
+    item = _query("What are your skills?", 1)
+    item["params"]["arguments"][0]["top_k"] = 10**6
+    response = TestClient(mcp.app).post("/mcp", json=item).json()
+    assert response["result"]["result"]
+
+
+def test_empty_batch_is_invalid(mcp):
+    response = TestClient(mcp.app).post("/mcp", json=[]).json()
+    assert response["error"]["code"] == -32600
+
+
+@pytest.fixture
+def postings_dir(mcp, tmp_path, monkeypatch):
+    root = tmp_path / "job-postings"
+    root.mkdir()
+    (root / "backend.md").write_text("# Backend\n## Requirements\n- Python services\n", encoding="utf-8")
+    (tmp_path / "secret.md").write_text("# Secret\n", encoding="utf-8")
+    monkeypatch.setattr(mcp, "JOB_POSTINGS_DIR", str(root))
+    return root
+
+
+def test_posting_path_stays_inside_the_postings_dir(mcp, postings_dir):
+    assert mcp._posting_path("backend.md") == os.path.realpath(postings_dir / "backend.md")
+    (postings_dir / "link.md").symlink_to(postings_dir.parent / "secret.md")
+    (postings_dir / "nested").mkdir()
+    for name in ("../secret.md", str(postings_dir.parent / "secret.md"), "link.md", "nested/../../secret.md",
+                 "nested/backend.md", "backend.txt", "..", ""):
+        with pytest.raises(ValueError, match="Unknown job posting"):
+            mcp._posting_path(name)
+
+
+def test_match_jobs_rejects_traversal(mcp, postings_dir):
+    result = asyncio.run(mcp.handle_match_jobs({"files": ["backend.md", "../secret.md"]}))
+    assert result == {"error": "Unknown job posting: ../secret.md"}
+
+    result = asyncio.run(mcp.handle_match_jobs({"files": ["backend.md"]}))
+    assert [r["title"] for r in result["result"]] == ["Backend"]
@@ -0,0 +1,149 @@
+import asyncio
+import io
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import mcp_stdio
+from mcp_stdio import LazyServer, StdioServer
+
+
+class Dumped(dict):
+    def model_dump(self):
+        return dict(self)
+
+
+class FakeMCPServer:
+    """mcp_server stand-in: answers executeCommand queries after `delay` seconds."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def dispatch(self, request):
+        args = request["params"]["arguments"][0]
+        await asyncio.sleep(args.get("delay", 0))
+        if args.get("fail"):
+            return Dumped(jsonrpc="2.0", id=request["id"], result={"error": "no profile"})
+        return Dumped(jsonrpc="2.0", id=request["id"], result={"result": f"answer: {args['query']}"})
+
+    async def dispatch_batch(self, items):
+        self.batches.append(items)
+        return [Dumped(jsonrpc="2.0", id=item["id"], result={"result": "ok"}) for item in items if "id" in item]
+
+
+class FixedServer:
+    def __init__(self, server):
+        self.server = server
+        self.calls = 0
+
+    async def get(self):
+        self.calls += 1
+        return self.server
+
+
+def serve(lines):
+    """Run a StdioServer over the given input lines; returns (responses, server holder)."""
+    output = io.StringIO()
+    holder = FixedServer(FakeMCPServer())
+
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data("".join(line if isinstance(line, str) else json.dumps(line) + "\n" for line in lines).encode())
+        reader.feed_eof()
+        await StdioServer(output, holder).serve(reader)
+
+    asyncio.run(main())
+    text = output.getvalue()
+    assert text == "" or text.endswith("\n")
+    return [json.loads(line) for line in text.splitlines()], holder
+
+
+def query(request_id, text, **args):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "workspace/executeCommand",
+            "params": {"command": "digitaltwin.query", "arguments": [{"query": text, **args}]}}
+
+
+def test_one_line_per_response_and_errors_in_place():
+    responses, holder = serve([
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+        "\n",
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        "{not json\n",
+        {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+        {"jsonrpc": "2.0", "id": 3, "method": "resources/list"},
+        '"just a string"\n',
+    ])
+    by_id = {r["id"]: r for r in responses if r["id"] is not None}
+    assert by_id[1]["result"]["protocolVersion"] == mcp_stdio.PROTOCOL_VERSION
+    assert by_id[2]["result"] == {}
+    assert by_id[3]["error"]["code"] == -32601
+    assert sorted(r["error"]["code"] for r in responses if r["id"] is None) == [-32700, -32600]
+    assert len(responses) == 5
+    # initialize and ping never import the server
+    assert holder.calls == 0
+
+
+def test_pipelined_calls_answer_in_completion_order():
+    responses, _ = serve([
+        query(1, "slow", delay=0.05),
+        query(2, "multi\nline", delay=0),
+    ])
+    # Both finish before EOF ends the loop; the fast one is written first
+    assert [r["id"] for r in responses] == [2, 1]
+    assert responses[0]["result"]["result"] == "answer: multi\nline"
+
+
+def test_batches_are_written_as_one_line():
+    notification = {k: v for k, v in query(None, "x").items() if k != "id"}
+    responses, holder = serve([[query(1, "a"), notification, query(2, "b")], [notification], []])
+    assert responses[0] == [
+        {"jsonrpc": "2.0", "id": 1, "result": {"result": "ok"}},
+        {"jsonrpc": "2.0", "id": 2, "result": {"result": "ok"}},
+    ]
+    assert responses[1]["error"]["code"] == -32600
+    assert len(responses) == 2  # the notification-only batch gets no reply
+    assert len(holder.server.batches) == 2
+
+
+def test_tools_call_wraps_the_query_result():
+    call = {"jsonrpc": "2.0", "method": "tools/call"}
+    responses, _ = serve([
+        {**call, "id": 1, "params": {"name": "digitaltwin_query", "arguments": {"query": "skills"}}},
+        {**call, "id": 2, "params": {"name": "digitaltwin_query", "arguments": {"query": "x", "fail": True}}},
+        {**call, "id": 3, "params": {"name": "other_tool"}},
+        {"jsonrpc": "2.0", "id": 4, "method": "tools/list"},
+    ])
+    by_id = {r["id"]: r for r in responses}
+    assert by_id[1]["result"] == {"content": [{"type": "text", "text": "answer: skills"}], "isError": False}
+    assert by_id[2]["result"] == {"content": [{"type": "text", "text": "no profile"}], "isError": True}
+    assert by_id[3]["error"]["code"] == -32602
+    assert [t["name"] for t in by_id[4]["result"]["tools"]] == ["digitaltwin_query"]
+
+
+def test_lazy_server_imports_once_and_retries_failures(monkeypatch):
+    imports = []
+    ready = threading.Event()
+
+    def import_module(name):
+        imports.append(name)
+        if len(imports) == 1:
+            raise ImportError("redis down")
+        ready.wait(1)
+        return SimpleNamespace(name=name)
+
+    monkeypatch.setattr(mcp_stdio, "importlib", SimpleNamespace(import_module=import_module))
+
+    async def main():
+        lazy = LazyServer("fake_server")
+        with pytest.raises(ImportError):
+            await lazy.get()
+        first = [asyncio.ensure_future(lazy.get()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        ready.set()
+        return await asyncio.gather(*first), await lazy.get()
+
+    modules, again = asyncio.run(main())
+    assert imports == ["fake_server", "fake_server"]
+    assert all(m is again for m in modules)
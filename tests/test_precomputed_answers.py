@@ -0,0 +1,137 @@
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from precomputed_answers import PrecomputedAnswers, expected_questions, warm_up
+
+QUESTIONS = ["Tell me about yourself.", "What are your Python skills?", "Why this role?"]
+
+
+class KeywordRetriever:
+    """Returns the chunks whose ID appears in the question, or the "about" chunk."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def search(self, question, top_k):
+        await asyncio.sleep(0)
+        words = re.findall(r"\w+", question.lower())
+        ids = [cid for cid in self.chunks if cid in words] or ["about"]
+        return [{"id": cid, "score": 1.0, "metadata": self.chunks[cid]} for cid in ids[:top_k]]
+
+
+class Generator:
+    """answer_fn that records calls and peak concurrency."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.asked = []
+        self.active = self.peak = 0
+
+    async def __call__(self, twin, question, results):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.005)
+        self.active -= 1
+        self.asked.append(question)
+        if question in self.fail:
+            return None, []
+        return f"Answer to {question}", [{"id": r["id"]} for r in results]
+
+
+@pytest.fixture
+def chunks():
+    return {
+        "about": {"id": "about", "content": "Backend engineer"},
+        "python": {"id": "python", "content": "Python services"},
+        "role": {"id": "role", "content": "Looking for platform work"},
+    }
+
+
+@pytest.fixture
+def twin(tmp_path, chunks):
+    store = PrecomputedAnswers(str(tmp_path / "index" / "digitaltwin.answers.api.json"), model="m",
+                               chunk_lookup=chunks.get)
+    return SimpleNamespace(precomputed=store, retriever=KeywordRetriever(chunks))
+
+
+def run(twin, generator, questions=QUESTIONS, **kwargs):
+    return asyncio.run(warm_up(twin, questions, generator, concurrency=2, **kwargs))
+
+
+def server_store(twin, chunks):
+    return PrecomputedAnswers(twin.precomputed.path, model="m", chunk_lookup=chunks.get, check_interval=0)
+
+
+def test_warm_up_writes_a_store_the_servers_serve(twin, chunks):
+    generator = Generator()
+    assert run(twin, generator) == {"generated": 3, "unchanged": 0, "failed": 0}
+    assert 1 < generator.peak <= 2
+
+    served = server_store(twin, chunks)
+    entry = served.get("what are your python skills")
+    assert entry["answer"] == "Answer to What are your Python skills?"
+    assert entry["sources"] == [{"id": "python"}]
+    assert served.get("Unrelated question?") is None
+    assert served.stats == {"hits": 1, "misses": 1, "stale": 0}
+    # Answers for another model are not served
+    assert PrecomputedAnswers(twin.precomputed.path, model="other").get(QUESTIONS[0]) is None
+
+    # Nothing changed: nothing is regenerated
+    generator = Generator()
+    assert run(twin, generator) == {"generated": 0, "unchanged": 3, "failed": 0}
+    assert generator.asked == []
+
+
+def test_changed_chunks_are_not_served_and_only_they_are_regenerated(twin, chunks):
+    run(twin, Generator())
+    chunks["python"] = {"id": "python", "content": "Python and Go services"}
+
+    served = server_store(twin, chunks)
+    assert served.get(QUESTIONS[1]) is None and served.stats["stale"] == 1
+    assert served.get(QUESTIONS[0]) is not None
+
+    generator = Generator()
+    assert run(twin, generator) == {"generated": 1, "unchanged": 2, "failed": 0}
+    assert generator.asked == [QUESTIONS[1]]
+    # Serving processes pick up the rewritten store
+    assert served.get(QUESTIONS[1])["answer"] == "Answer to What are your Python skills?"
+
+
+def test_different_retrieval_results_regenerate_and_dropped_questions_are_forgotten(twin, chunks):
+    run(twin, Generator())
+    # "Tell me about yourself" now also retrieves a new chunk
+    chunks["yourself"] = {"id": "yourself", "content": "Ten years of backend work"}
+    generator = Generator()
+    assert run(twin, generator, questions=QUESTIONS[:2]) == {"generated": 1, "unchanged": 1, "failed": 0}
+    assert generator.asked == [QUESTIONS[0]]
+
+    with open(twin.precomputed.path, encoding="utf-8") as f:
+        stored = json.load(f)["answers"]
+    assert set(stored) == {"tell me about yourself", "what are your python skills"}
+    assert stored["tell me about yourself"]["chunks"].keys() == {"about", "yourself"}
+
+
+def test_failures_are_counted_and_force_regenerates(twin, chunks):
+    assert run(twin, Generator(fail={QUESTIONS[2]})) == {"generated": 2, "unchanged": 0, "failed": 1}
+    assert QUESTIONS[2] not in twin.precomputed
+
+    generator = Generator()
+    assert run(twin, generator, force=True) == {"generated": 3, "unchanged": 0, "failed": 0}
+    assert sorted(generator.asked) == sorted(QUESTIONS)
+
+
+def test_expected_questions(tmp_path):
+    profile = tmp_path / "professional_profile.json"
+    profile.write_text(json.dumps({"interview_prep": {
+        "common_questions": {"behavioral": ["Tell me about yourself.", " "], "notes": ["Not a question"]},
+        "technical": ["What are your Python skills?"],
+    }}), encoding="utf-8")
+    extra = tmp_path / "extra.txt"
+    extra.write_text("# comment\nWhy this role?\nwhat are your python skills\n", encoding="utf-8")
+
+    assert expected_questions(str(profile), str(extra), ["Tell me about yourself"]) == QUESTIONS
+    assert expected_questions(str(tmp_path / "missing.json"), None, ["Why?"]) == ["Why?"]
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+import digitaltwin_rag
+from digitaltwin_rag import redis_keys, stream_redis_data
+
+CHUNKS = [
+    {"id": "python", "title": "Python", "content": "Python services", "type": "skills"},
+    {"id": "react", "title": "React", "content": "React interfaces", "type": "skills"},
+    {"id": "goals", "title": "Goals", "content": "Senior backend engineer", "type": "career"},
+]
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def write_profile(path, chunks):
+    path.write_text(json.dumps({"name": "Test", "content_chunks": chunks}), encoding="utf-8")
+
+
+def stored_ids(redis_client, namespace=""):
+    return sorted(k.decode() for k in redis_client.hkeys(redis_keys(namespace)["chunks"]))
+
+
+def test_stream_uses_namespaced_keys(redis_client, tmp_path):
+    default_profile, other_profile = tmp_path / "digitaltwin.json", tmp_path / "digitaltwin_cedric.json"
+    write_profile(default_profile, CHUNKS)
+    write_profile(other_profile, CHUNKS[:1])
+
+    asyncio.run(stream_redis_data(redis_client, str(default_profile), batch_size=2))
+    stats = asyncio.run(stream_redis_data(redis_client, str(other_profile), batch_size=2, namespace="cedric"))
+
+    assert stats == {"written": 1, "removed": 0, "unchanged": 0}
+    # The other twin's sync leaves the default twin's keys alone
+    assert stored_ids(redis_client) == ["goals", "python", "react"]
+    assert stored_ids(redis_client, "cedric") == ["python"]
+    assert redis_client.get(redis_keys("cedric")["initialized"]) == b"true"
+    assert redis_client.get(redis_keys("cedric")["manifest"]) != redis_client.get(redis_keys()["manifest"])
+
+
+def test_stream_matches_initialize_redis_data(redis_client, tmp_path):
+    profile = tmp_path / "digitaltwin.json"
+    write_profile(profile, CHUNKS)
+    asyncio.run(stream_redis_data(redis_client, str(profile), namespace="alice"))
+    # Same keys and hashes: the bulk loader finds nothing to do
+    stats = digitaltwin_rag.initialize_redis_data(redis_client, {"content_chunks": CHUNKS}, namespace="alice")
+    assert stats == {"written": 0, "removed": 0, "unchanged": 3}
+
+
+def sync(redis_client, chunks, namespace=""):
+    return digitaltwin_rag.initialize_redis_data(redis_client, {"content_chunks": chunks}, namespace=namespace)
+
+
+def count_pipelines(redis_client, monkeypatch):
+    executed = []
+    pipeline = redis_client.pipeline
+
+    def counting_pipeline(transaction=True, **kwargs):
+        pipe = pipeline(transaction=transaction, **kwargs)
+        execute = pipe.execute
+
+        def counting_execute(*args, **kwargs):
+            executed.append(transaction)
+            return execute(*args, **kwargs)
+
+        pipe.execute = counting_execute
+        return pipe
+
+    monkeypatch.setattr(redis_client, "pipeline", counting_pipeline)
+    return executed
+
+
+def test_initialize_rewrites_only_changed_chunks(redis_client, monkeypatch):
+    assert sync(redis_client, CHUNKS) == {"written": 3, "removed": 0, "unchanged": 0}
+    before = redis_client.hgetall(redis_keys()["chunks"])
+
+    executed = count_pipelines(redis_client, monkeypatch)
+    assert sync(redis_client, CHUNKS) == {"written": 0, "removed": 0, "unchanged": 3}
+    # Matching manifest: one non-transactional read, nothing written
+    assert executed == [False]
+
+    edited = [dict(CHUNKS[0], content="Python and Go services")] + CHUNKS[1:]
+    assert sync(redis_client, edited) == {"written": 1, "removed": 0, "unchanged": 2}
+    # One read plus one transaction for the writes
+    assert executed == [False, False, True]
+    after = redis_client.hgetall(redis_keys()["chunks"])
+    assert after[b"python"] != before[b"python"]
+    assert {k: v for k, v in after.items() if k != b"python"} == {k: v for k, v in before.items() if k != b"python"}
+    assert set(redis_client.hkeys(redis_keys()["hashes"])) == set(after)
+
+
+def test_initialize_removes_deleted_chunks(redis_client):
+    sync(redis_client, CHUNKS)
+    # A chunk written without a hash (older loader) is removed too
+    redis_client.hset(redis_keys()["chunks"], "legacy", "{}")
+
+    assert sync(redis_client, CHUNKS[:2]) == {"written": 0, "removed": 2, "unchanged": 2}
+    assert stored_ids(redis_client) == ["python", "react"]
+    assert sorted(k.decode() for k in redis_client.hkeys(redis_keys()["hashes"])) == ["python", "react"]
+
+
+def test_initialize_uses_namespaced_keys(redis_client):
+    sync(redis_client, CHUNKS)
+    default_state = {key: redis_client.dump(key) for key in redis_keys().values()}
+
+    assert sync(redis_client, CHUNKS[:1], namespace="cedric") == {"written": 1, "removed": 0, "unchanged": 0}
+    assert redis_keys("cedric")["chunks"] == "digital_twin:cedric:chunks"
+    assert stored_ids(redis_client, "cedric") == ["python"]
+    assert redis_client.get(redis_keys("cedric")["initialized"]) == b"true"
+    # The default twin's keys are untouched
+    assert {key: redis_client.dump(key) for key in redis_keys().values()} == default_state
+    assert stored_ids(redis_client) == ["goals", "python", "react"]
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from benchmark import recall_at_k
+from bm25_index import BM25Index
+from local_vectors import LocalVectorStore
+from retrieval import HybridRetriever, build_retriever
+from reranker import Reranker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = ["digitaltwin.json", "digitaltwin_cedric.json", "digitaltwin_backup.json"]
+
+
+def _result(doc_id, title, content, tags=()):
+    return {"id": doc_id, "score": 0.0,
+            "metadata": {"id": doc_id, "title": title, "content": content, "metadata": {"tags": list(tags)}}}
+
+
+def test_title_match_moves_up():
+    results = [_result(f"other{i}", f"Hobby {i}", "I like hiking and cooking on weekends.") for i in range(20)]
+    results.insert(3, _result("docker", "Docker and Kubernetes", "I deploy services with Docker.", tags=["docker"]))
+    ranked = Reranker().rerank("Docker experience", results, top_k=3)
+    assert ranked[0]["id"] == "docker"
+    assert len(ranked) == 3
+
+
+def test_zero_budget_keeps_first_stage_order():
+    results = [_result(str(i), f"Title {i}", "words " * 10) for i in range(5)]
+    reranker = Reranker(budget_ms=0)
+    assert [r["id"] for r in reranker.rerank("title", results, top_k=3)] == ["0", "1", "2"]
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_rerank_and_hybrid_keep_bm25_recall_on_golden_set(profile):
+    with open(os.path.join(ROOT, "golden_queries.json"), encoding="utf-8") as f:
+        queries = [q for q in json.load(f)["queries"] if profile in q.get("profiles", [profile])]
+    with open(os.path.join(ROOT, profile), encoding="utf-8") as f:
+        chunks = json.load(f)["content_chunks"]
+
+    def recall(retriever):
+        total = 0.0
+        for q in queries:
+            ids = [r["id"] for r in asyncio.run(retriever.search(q["query"], 3))]
+            total += recall_at_k(ids, q["expected"], 3)
+        return total / len(queries)
+
+    lexical = BM25Index.from_chunks(chunks)
+    bm25 = recall(HybridRetriever(chunks, lexical))
+    reranked = recall(HybridRetriever(chunks, lexical, reranker=Reranker(budget_ms=1000)))
+    assert reranked >= bm25
+    # The default pipeline: BM25 and dense fused, then reranked
+    hybrid = build_retriever(chunks, lexical, LocalVectorStore.from_chunks(chunks), mode="hybrid", rerank=True)
+    hybrid.reranker.budget_ms = 1000
+    assert recall(hybrid) >= bm25
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bm25_index import BM25Index
+from chunk_store import ChunkStore
+from local_vectors import LocalVectorStore
+from retrieval import HybridRetriever, build_retriever, reciprocal_rank_fusion
+
+CHUNKS = [
+    {"id": "python", "title": "Python", "content": "I write Python services with FastAPI and asyncio.",
+     "type": "skills", "metadata": {"category": "technical", "tags": ["python"]}},
+    {"id": "frontend", "title": "Frontend", "content": "I build React and Next.js interfaces in TypeScript.",
+     "type": "skills", "metadata": {"category": "technical", "tags": ["react"]}},
+    {"id": "goals", "title": "Career goals", "content": "I want to grow into a senior backend engineer.",
+     "type": "career", "metadata": {"category": "personal", "tags": []}},
+    {"id": "contact", "title": "Contact", "content": "Reach me on GitHub or LinkedIn.",
+     "type": "contact", "metadata": {"category": "personal", "tags": []}},
+]
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["c"] == pytest.approx(1 / 62)
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)][0] == "b"
+
+
+def test_rrf_weights_favour_a_ranking():
+    rankings = [["lexical_top", "shared"], ["dense_top", "shared"]]
+    assert reciprocal_rank_fusion(rankings, k=1)[0][0] == "shared"
+    fused = reciprocal_rank_fusion([["lexical_top"], ["dense_top"]], k=1, weights=(2.0, 1.0))
+    assert [doc_id for doc_id, _ in fused] == ["lexical_top", "dense_top"]
+    assert fused[0][1] == pytest.approx(2.0 / 2)
+
+
+def test_rrf_empty():
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+@pytest.mark.parametrize("as_store", [False, True])
+def test_hybrid_search_and_filters(as_store):
+    chunks = ChunkStore(CHUNKS) if as_store else CHUNKS
+    retriever = HybridRetriever(chunks, BM25Index.from_chunks(chunks), LocalVectorStore.from_chunks(chunks))
+
+    async def run():
+        top = await retriever.search("Python FastAPI services", top_k=2)
+        assert top[0]["id"] == "python"
+        assert top[0]["metadata"]["title"] == "Python"
+        personal = await retriever.search("Python FastAPI services", top_k=4, categories=["personal"])
+        assert {r["id"] for r in personal} <= {"goals", "contact"}
+        assert await retriever.search("Python", top_k=3, types=["nonexistent"]) == []
+
+    asyncio.run(run())
+
+
+def test_lexical_mode_has_no_dense_side():
+    retriever = build_retriever(CHUNKS, None, LocalVectorStore.from_chunks(CHUNKS), mode="lexical", rerank=False)
+    assert retriever.dense is None
+    results = asyncio.run(retriever.search("GitHub LinkedIn", top_k=1))
+    assert results[0]["id"] == "contact"
+
+
+class RemoteIndex:
+    """upstash_vector-shaped index returning one hit the profile doesn't hold."""
+
+    async def query(self, data, top_k=10, include_metadata=False, filter=""):
+        return [
+            SimpleNamespace(id="remote_only", metadata={"title": "Remote", "content": "Python elsewhere",
+                                                        "type": "skills", "category": "technical"}),
+            SimpleNamespace(id="python", metadata={}),
+        ]
+
+
+def test_remote_only_hits_do_not_change_the_profile():
+    chunks = ChunkStore(CHUNKS)
+    retriever = HybridRetriever(chunks, BM25Index.from_chunks(chunks), RemoteIndex())
+
+    async def run():
+        for query in ("Python", "FastAPI", "asyncio"):
+            results = await retriever.search(query, top_k=4)
+            assert "remote_only" in {r["id"] for r in results}
+
+    asyncio.run(run())
+    assert len(chunks) == len(CHUNKS)
+    assert "remote_only" not in chunks.positions
+    assert retriever.chunk("remote_only")["title"] == "Remote"
+    assert retriever.chunk("python")["title"] == "Python"
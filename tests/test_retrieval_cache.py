@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+
+import fakeredis
+import numpy as np
+import pytest
+
+import retrieval_cache
+
+from local_vectors import LocalVectorStore
+from reranker import Reranker
+from retrieval import build_retriever
+from retrieval_cache import RetrievalCache, bump_index_version, index_version_key
+
+CHUNKS = [
+    {"id": "python", "title": "Python", "content": "Python services and scripts", "type": "skills"},
+    {"id": "react", "title": "React", "content": "React interfaces in TypeScript", "type": "skills"},
+    {"id": "goals", "title": "Goals", "content": "Grow into a senior backend engineer", "type": "career"},
+]
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def retriever(redis_client, mode, rerank):
+    cache = RetrievalCache(data_version="v1", redis_client=redis_client)
+    dense = LocalVectorStore.from_chunks(CHUNKS, dim=256)
+    return build_retriever(CHUNKS, None, dense, mode=mode, rerank=rerank, cache=cache)
+
+
+def test_fingerprint_covers_mode_and_reranker():
+    dense = LocalVectorStore.from_chunks(CHUNKS, dim=256)
+    prints = {
+        build_retriever(CHUNKS, None, dense, mode=mode, rerank=rerank).fingerprint
+        for mode in ("hybrid", "lexical", "dense") for rerank in (False, True)
+    }
+    assert len(prints) == 6
+    assert Reranker(candidates=10).fingerprint != Reranker(candidates=20).fingerprint
+
+
+def test_processes_with_different_settings_do_not_share_rankings(redis_client):
+    lexical = retriever(redis_client, "lexical", rerank=False)
+    asyncio.run(lexical.search("python", 2))
+    assert lexical.cache.stats["result_misses"] == 1
+
+    # Same Redis, same data version: only an identically configured retriever hits
+    same = retriever(redis_client, "lexical", rerank=False)
+    asyncio.run(same.search("python", 2))
+    assert same.cache.stats["redis_hits"] == 1
+
+    for mode, rerank in (("dense", False), ("hybrid", False), ("lexical", True)):
+        other = retriever(redis_client, mode, rerank)
+        asyncio.run(other.search("python", 2))
+        assert other.cache.stats["redis_hits"] == 0
+        assert other.cache.stats["result_misses"] == 1
+
+
+RANKING = [["python", 1.5], ["react", 0.5]]
+
+
+def test_bumped_index_version_invalidates_both_tiers(redis_client):
+    writer = RetrievalCache(data_version="v1", redis_client=redis_client, version_check_interval=0)
+    writer.set_results(["python"], 2, None, None, [RANKING])
+    writer.set_embeddings(["python"], [np.ones(4, dtype=np.float32)])
+    assert writer.get_results(["Python "], 2) == [RANKING]
+    assert writer.version == "v1.0"
+
+    assert bump_index_version(redis_client) == 1
+    assert redis_client.get(index_version_key()) == b"1"
+    writer.refresh_version()
+    assert writer.version == "v1.1"
+    # Local levels are dropped and the shared entries no longer match
+    assert len(writer._results) == 0 and len(writer._embeddings) == 0
+    assert writer.get_results(["python"], 2) == [None]
+    assert writer.get_embeddings(["python"]) == [None]
+
+    # A worker that starts after the bump agrees on the version
+    reader = RetrievalCache(data_version="v1", redis_client=redis_client, version_check_interval=0)
+    reader.refresh_version()
+    assert reader.version == "v1.1"
+    writer.set_results(["python"], 2, None, None, [RANKING])
+    assert reader.get_results(["python"], 2) == [RANKING]
+    assert reader.stats["redis_hits"] == 1
+
+
+def test_bumps_are_per_namespace_and_reloads_change_the_data_version(redis_client):
+    default = RetrievalCache(data_version="v1", redis_client=redis_client, version_check_interval=0)
+    cedric = RetrievalCache(data_version="v1", redis_client=redis_client, namespace="cedric", version_check_interval=0)
+    for cache in (default, cedric):
+        cache.set_results(["python"], 2, None, None, [RANKING])
+
+    bump_index_version(redis_client, "cedric")
+    for cache in (default, cedric):
+        cache.refresh_version()
+    assert default.get_results(["python"], 2) == [RANKING]
+    assert cedric.get_results(["python"], 2) == [None]
+
+    # A reloaded profile gets a new content version, and so new keys
+    reloaded = RetrievalCache(data_version="v2", redis_client=redis_client, version_check_interval=0)
+    assert reloaded.get_results(["python"], 2) == [None]
+
+
+def test_version_checks_are_throttled(redis_client, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(retrieval_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    cache = RetrievalCache(data_version="v1", redis_client=redis_client, version_check_interval=5)
+    cache.refresh_version()
+    bump_index_version(redis_client)
+
+    clock.now += 4
+    asyncio.run(cache.refresh_version_async())
+    assert cache.generation == 0
+    clock.now += 1
+    asyncio.run(cache.refresh_version_async())
+    assert cache.generation == 1
+
+
+def test_retriever_recomputes_after_a_reembed(redis_client):
+    search = retriever(redis_client, "lexical", rerank=False)
+    search.cache.version_check_interval = 0
+    first = asyncio.run(search.search("python", 2))
+    asyncio.run(search.search("python", 2))
+    assert search.cache.stats["result_hits"] == 1
+
+    bump_index_version(redis_client)
+    assert asyncio.run(search.search("python", 2)) == first
+    assert search.cache.stats["result_misses"] == 2
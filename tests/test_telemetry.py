@@ -0,0 +1,37 @@
+import asyncio
+
+from bm25_index import BM25Index
+from reranker import Reranker
+from retrieval import HybridRetriever
+from telemetry import Trace, _current_trace, render_metrics, span
+
+CHUNKS = [
+    {"id": "python", "title": "Python", "content": "I write Python services.", "type": "skills"},
+    {"id": "react", "title": "React", "content": "I build React interfaces.", "type": "skills"},
+]
+
+
+def _traced(coroutine):
+    async def run():
+        trace = Trace("test")
+        _current_trace.set(trace)
+        await coroutine
+        return [stage for stage, _ in trace.spans]
+    return asyncio.run(run())
+
+
+def test_span_records_stage_in_trace_and_histogram():
+    async def work():
+        with span("generate"):
+            pass
+
+    assert _traced(work()) == ["generate"]
+    assert 'digitaltwin_stage_duration_seconds_count{stage="generate"}' in render_metrics()
+
+
+def test_fusion_and_reranking_have_their_own_spans():
+    retriever = HybridRetriever(CHUNKS, BM25Index.from_chunks(CHUNKS), reranker=Reranker())
+    assert _traced(retriever.search("Python", top_k=1)) == ["fuse", "rerank"]
+
+    plain = HybridRetriever(CHUNKS, BM25Index.from_chunks(CHUNKS))
+    assert _traced(plain.search("Python", top_k=1)) == ["fuse"]
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from answer_cache import AnswerCache
+from twin_registry import Twin, TwinRegistry, UnknownTwinError, source_signature, twin_id_for
+
+
+def _profiles(tmp_path, *names):
+    profiles = {}
+    for name in names:
+        path = tmp_path / f"digitaltwin_{name}.json"
+        path.write_text("{}")
+        profiles[name] = str(path)
+    return profiles
+
+
+class Loader:
+    """Builds minimal twins and records which thread each load ran on."""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.threads = []
+
+    def __call__(self, twin_id, path):
+        self.calls.append(twin_id)
+        self.threads.append(threading.get_ident())
+        time.sleep(self.delay)
+        if twin_id in self.fail:
+            raise ValueError(f"bad profile {twin_id}")
+        return Twin(
+            twin_id=twin_id, path=path, version=str(len(self.calls)), chunks=[{"id": "a"}],
+            retriever=None, answer_cache=AnswerCache(data_version="v"), signature=source_signature(path)
+        )
+
+
+def test_twin_ids_come_from_file_names():
+    assert twin_id_for("/x/digitaltwin.json") == "default"
+    assert twin_id_for("/x/digitaltwin_cedric.json") == "cedric"
+
+
+def test_unknown_twin(tmp_path):
+    registry = TwinRegistry(_profiles(tmp_path, "a"), loader=Loader())
+    with pytest.raises(UnknownTwinError):
+        asyncio.run(registry.get("nobody"))
+
+
+def test_least_recently_used_twin_is_evicted(tmp_path):
+    loader = Loader()
+    registry = TwinRegistry(_profiles(tmp_path, "a", "b", "c"), loader=loader, max_loaded=2)
+
+    async def run():
+        await registry.get("a")
+        await registry.get("b")
+        await registry.get("a")
+        await registry.get("c")
+
+    asyncio.run(run())
+    assert registry.loaded() == ["a", "c"]
+    assert registry.stats["evictions"] == 1
+    assert loader.calls == ["a", "b", "c"]
+
+
+def test_evicted_cache_counters_are_kept(tmp_path):
+    registry = TwinRegistry(_profiles(tmp_path, "a", "b"), loader=Loader(), max_loaded=1)
+
+    async def run():
+        twin = await registry.get("a")
+        twin.answer_cache.stats["hits"] += 3
+        await registry.get("b")
+
+    asyncio.run(run())
+    assert registry.cache_stats()["hits"] == 3
+
+
+def test_concurrent_gets_share_one_load(tmp_path):
+    loader = Loader(delay=0.05)
+    registry = TwinRegistry(_profiles(tmp_path, "a"), loader=loader)
+
+    async def run():
+        return await asyncio.gather(*(registry.get("a") for _ in range(5)))
+
+    twins = asyncio.run(run())
+    assert loader.calls == ["a"]
+    assert all(twin is twins[0] for twin in twins)
+
+
+def test_registry_is_updated_on_the_event_loop(tmp_path):
+    loader = Loader()
+    registry = TwinRegistry(_profiles(tmp_path, "a", "b"), loader=loader, max_loaded=1)
+    stores = []
+    original = registry._store
+
+    def store(twin):
+        stores.append(threading.get_ident())
+        original(twin)
+
+    registry._store = store
+
+    async def run():
+        await registry.get("a")
+        await registry.get("b")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert stores == [loop_thread, loop_thread]
+    assert loop_thread not in loader.threads
+
+
+def test_changed_profile_is_reloaded(tmp_path):
+    profiles = _profiles(tmp_path, "a")
+    loader = Loader()
+    registry = TwinRegistry(profiles, loader=loader, reload_interval=0)
+
+    async def run():
+        first = await registry.get("a")
+        assert await registry.get("a") is first
+        with open(profiles["a"], "w") as f:
+            f.write('{"changed": true}')
+        os.utime(profiles["a"], ns=(time.time_ns(), time.time_ns() + 10**9))
+        second = await registry.get("a")
+        assert second is not first
+        assert registry.stats["reloads"] == 1
+
+    asyncio.run(run())
+
+
+def test_failed_reload_keeps_serving_last_version(tmp_path):
+    profiles = _profiles(tmp_path, "a")
+    loader = Loader()
+    registry = TwinRegistry(profiles, loader=loader, reload_interval=0)
+
+    async def run():
+        first = await registry.get("a")
+        loader.fail.add("a")
+        os.utime(profiles["a"], ns=(time.time_ns(), time.time_ns() + 10**9))
+        assert await registry.get("a") is first
+        assert registry.stats["load_errors"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,298 @@
+"""
+Registry of Digital Twin profiles served from one process
+
+Each twin (one profile file) gets its own retriever, retrieval and answer
+caches, precomputed answers (see precomputed_answers.py) and, in the MCP
+server, its own namespaced Redis keys. Twins are loaded on first
+request, the least recently used ones are evicted once more than
+TWIN_CACHE_SIZE are resident, and a twin whose source file (or compiled
+artifact) changed is reloaded on its next request.
+
+Twin IDs come from file names: digitaltwin.json is "default",
+digitaltwin_cedric.json is "cedric". TWIN_PROFILES="alice=/data/alice.json,..."
+adds or overrides profiles.
+"""
+
+import os
+import glob
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from async_utils import run_blocking
+from answer_cache import AnswerCache
+from index_artifact import pointer_path
+from namespaces import namespace_for
+from precomputed_answers import PrecomputedAnswers, PRECOMPUTED_ANSWERS, store_path
+from retrieval import HybridRetriever, RETRIEVAL_MODE, build_retriever, load_local_dense
+from retrieval_cache import RetrievalCache, RETRIEVAL_CACHE_ENABLED
+from telemetry import span
+
+DEFAULT_TWIN_ID = "default"
+TWIN_CACHE_SIZE = int(os.getenv("TWIN_CACHE_SIZE", "4"))
+# Seconds between source-file checks for a loaded twin
+TWIN_RELOAD_INTERVAL = float(os.getenv("TWIN_RELOAD_INTERVAL", "2"))
+
+
+class UnknownTwinError(KeyError):
+    """Raised for a twin_id with no registered profile."""
+
+    def __init__(self, twin_id: str):
+        super().__init__(twin_id)
+        self.twin_id = twin_id
+
+    def __str__(self) -> str:
+        return f"Unknown twin: {self.twin_id}"
+
+
+def twin_id_for(profile_path: str) -> str:
+    """digitaltwin.json -> "default", digitaltwin_cedric.json -> "cedric"."""
+    return namespace_for(profile_path) or DEFAULT_TWIN_ID
+
+
+def twin_namespace(twin_id: str) -> str:
+    """Vector / Redis namespace of a twin; the default twin uses the default namespace."""
+    return "" if twin_id == DEFAULT_TWIN_ID else twin_id
+
+
+def discover_profiles(directory: str = ".") -> Dict[str, str]:
+    """twin_id -> profile path for digitaltwin*.json in directory, plus TWIN_PROFILES."""
+    # Absolute, so reload checks don't depend on the working directory
+    profiles = {
+        twin_id_for(path): os.path.abspath(path)
+        for path in sorted(glob.glob(os.path.join(directory, "digitaltwin*.json")))
+    }
+    for entry in filter(None, (e.strip() for e in os.getenv("TWIN_PROFILES", "").split(","))):
+        twin_id, _, path = entry.partition("=")
+        if path:
+            profiles[twin_id.strip()] = os.path.abspath(path.strip())
+    return profiles
+
+
+def source_signature(path: str) -> Tuple:
+    """Changes whenever the profile file or its published artifact changes."""
+    signature = []
+    for candidate in (path, pointer_path(path)):
+        try:
+            stat = os.stat(candidate)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class NamespacedIndex:
+    """An upstash_vector AsyncIndex pinned to one twin's namespace."""
+
+    def __init__(self, index, namespace: str):
+        self.index = index
+        self.namespace = namespace
+
+    async def query(self, **kwargs):
+        return await self.index.query(namespace=self.namespace, **kwargs)
+
+    async def info(self):
+        return await self.index.info()
+
+
+@dataclass
+class Twin:
+    """Everything needed to answer queries for one profile."""
+    twin_id: str
+    path: str
+    version: str
+    chunks: Sequence[Dict[str, Any]]
+    retriever: HybridRetriever
+    answer_cache: AnswerCache
+    retrieval_cache: Optional[RetrievalCache] = None
+    precomputed: Optional[PrecomputedAnswers] = None
+    dense_store: Any = None
+    signature: Tuple = ()
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+def load_twin(
+    twin_id: str,
+    path: str,
+    dense_factory: Optional[Callable[[str, str], Any]] = None,
+    cache_redis=None,
+    on_load: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    retrieval_redis=None,
+    answers_pipeline: Optional[str] = None,
+    answers_model: str = ""
+) -> Twin:
+    """Load one profile into its own retriever and caches (blocking).
+
+    dense_factory(twin_id, path) supplies the dense index (the local vector
+    store by default); on_load(twin_id, data) runs extra per-twin setup such
+    as syncing Redis. cache_redis and retrieval_redis are the shared tiers of
+    the answer and retrieval caches. answers_pipeline names the warm-up
+    store to serve precomputed answers from, generated with answers_model.
+    """
+    # Imported here: digitaltwin_rag pulls in the client layer
+    from digitaltwin_rag import read_profile
+
+    signature = source_signature(path)
+    data, lexical, version = read_profile(path)
+    chunks = data['content_chunks']
+    if on_load is not None:
+        on_load(twin_id, data)
+    dense = None
+    if RETRIEVAL_MODE != "lexical":
+        try:
+            dense = dense_factory(twin_id, path) if dense_factory else load_local_dense(path, chunks)
+        except Exception as e:
+            print(f"⚠️  Dense retrieval unavailable for twin {twin_id}, using keyword search only: {str(e)}")
+    retrieval_cache = (
+        RetrievalCache(data_version=version, redis_client=retrieval_redis, namespace=twin_namespace(twin_id))
+        if RETRIEVAL_CACHE_ENABLED else None
+    )
+    retriever = build_retriever(chunks, lexical, dense, cache=retrieval_cache)
+    precomputed = (
+        PrecomputedAnswers(store_path(path, answers_pipeline), model=answers_model, chunk_lookup=retriever.chunk)
+        if answers_pipeline and PRECOMPUTED_ANSWERS else None
+    )
+    return Twin(
+        twin_id=twin_id,
+        path=path,
+        version=version,
+        chunks=chunks,
+        retriever=retriever,
+        answer_cache=AnswerCache(data_version=version, redis_client=cache_redis),
+        retrieval_cache=retrieval_cache,
+        precomputed=precomputed,
+        dense_store=dense,
+        signature=signature
+    )
+
+
+class TwinRegistry:
+    """Lazily loaded, LRU-bounded, hot-reloading set of twins."""
+
+    # Per-twin stores whose counters cache_stats() totals
+    CACHES = ("answer_cache", "retrieval_cache", "precomputed")
+
+    def __init__(
+        self,
+        profiles: Dict[str, str],
+        loader: Callable[[str, str], Twin] = load_twin,
+        max_loaded: int = TWIN_CACHE_SIZE,
+        reload_interval: float = TWIN_RELOAD_INTERVAL
+    ):
+        self.profiles = dict(profiles)
+        self.loader = loader
+        self.max_loaded = max(1, max_loaded)
+        self.reload_interval = reload_interval
+        self._twins: "OrderedDict[str, Twin]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.stats = {"loads": 0, "reloads": 0, "evictions": 0, "load_errors": 0}
+        # Cache counters of evicted twins by cache, so exported totals never go down
+        self._retired_cache_stats: Dict[str, Dict[str, int]] = {}
+
+    def resolve(self, twin_id: Optional[str]) -> str:
+        twin_id = twin_id or DEFAULT_TWIN_ID
+        if twin_id not in self.profiles:
+            raise UnknownTwinError(twin_id)
+        return twin_id
+
+    def loaded(self) -> List[str]:
+        return list(self._twins)
+
+    def _stale(self, twin: Twin) -> bool:
+        now = time.monotonic()
+        if now - twin.checked_at < self.reload_interval:
+            return False
+        twin.checked_at = now
+        return source_signature(twin.path) != twin.signature
+
+    def _store(self, twin: Twin) -> None:
+        self._twins[twin.twin_id] = twin
+        self._twins.move_to_end(twin.twin_id)
+        while len(self._twins) > self.max_loaded:
+            evicted_id, evicted = self._twins.popitem(last=False)
+            for name in self.CACHES:
+                retired = self._retired_cache_stats.setdefault(name, {})
+                for key, value in self._twin_cache_stats(evicted, name).items():
+                    retired[key] = retired.get(key, 0) + value
+            self.stats["evictions"] += 1
+            print(f"📦 Evicted idle twin {evicted_id}")
+
+    def load(self, twin_id: Optional[str] = None) -> Twin:
+        """Load (or return) a twin synchronously, e.g. to warm it at startup."""
+        twin_id = self.resolve(twin_id)
+        twin = self._twins.get(twin_id)
+        if twin is None or self._stale(twin):
+            reload = twin is not None
+            try:
+                twin = self._read(twin_id)
+            except Exception:
+                self.stats["load_errors"] += 1
+                raise
+            return self._loaded(twin, reload)
+        self._twins.move_to_end(twin_id)
+        return twin
+
+    def _read(self, twin_id: str) -> Twin:
+        """Run the loader (blocking); touches no registry state, so it can run on a worker thread."""
+        with span("load"):
+            return self.loader(twin_id, self.profiles[twin_id])
+
+    def _loaded(self, twin: Twin, reload: bool) -> Twin:
+        """Record a finished load and make the twin resident."""
+        self.stats["reloads" if reload else "loads"] += 1
+        print(f"✅ {'Reloaded' if reload else 'Loaded'} twin {twin.twin_id} from {twin.path} ({len(twin.chunks)} chunks)")
+        self._store(twin)
+        return twin
+
+    async def _load(self, twin_id: str, reload: bool) -> Twin:
+        # Only the loader runs off the loop; the registry is updated on the loop
+        try:
+            twin = await run_blocking(self._read, twin_id)
+        except Exception:
+            self.stats["load_errors"] += 1
+            raise
+        return self._loaded(twin, reload)
+
+    async def get(self, twin_id: Optional[str] = None) -> Twin:
+        """The twin for twin_id (default when empty), loading or reloading it off the event loop.
+
+        Concurrent requests for a twin that is loading share one load.
+        """
+        twin_id = self.resolve(twin_id)
+        twin = self._twins.get(twin_id)
+        if twin is not None and not self._stale(twin):
+            self._twins.move_to_end(twin_id)
+            return twin
+
+        future = self._loading.get(twin_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load(twin_id, twin is not None))
+            self._loading[twin_id] = future
+            future.add_done_callback(lambda _: self._loading.pop(twin_id, None))
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if twin is not None:
+                # Keep serving the last good version if a reload fails
+                print(f"⚠️  Reload of twin {twin_id} failed; serving version {twin.version}")
+                twin.signature = source_signature(twin.path)
+                return twin
+            raise
+
+    @staticmethod
+    def _twin_cache_stats(twin: Twin, name: str) -> Dict[str, int]:
+        cache = getattr(twin, name)
+        return cache.stats if cache is not None else {}
+
+    def cache_stats(self, name: str = "answer_cache") -> Dict[str, int]:
+        """Counters of one of CACHES over current and evicted twins."""
+        totals = dict(self._retired_cache_stats.get(name, {}))
+        for twin in list(self._twins.values()):
+            for key, value in self._twin_cache_stats(twin, name).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def indexed_chunks(self) -> int:
+        return sum(len(twin.chunks) for twin in list(self._twins.values()))